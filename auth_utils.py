@@ -1,31 +1,49 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import random
+import os
+import re
 import string
+import threading
 import time
 import hashlib
 import hmac
 import base64
 import urllib.parse
 
+NONCE_CHARS = string.ascii_lowercase + string.digits
+SIGNED_HEADERS = "x-ai-gateway-app-id;x-ai-gateway-timestamp;x-ai-gateway-nonce"
+
+# 随机字节到随机字符的映射表：252 = 36 * 7，不小于252的字节丢弃，保证每个字符等概率
+_NONCE_TABLE = bytes(ord(NONCE_CHARS[i % len(NONCE_CHARS)]) for i in range(256))
+_NONCE_DISCARD = bytes(range(len(NONCE_CHARS) * (256 // len(NONCE_CHARS)), 256))
+
+# urllib.parse.quote 默认不转义的字符，只含这些字符的参数无需编码
+_is_unreserved = re.compile(r"[A-Za-z0-9_.\-~/]*").fullmatch
+
+# HMAC-SHA256 的分组长度和内外填充
+_HMAC_BLOCK_SIZE = 64
+_HMAC_INNER_PAD = bytes(x ^ 0x36 for x in range(256))
+_HMAC_OUTER_PAD = bytes(x ^ 0x5C for x in range(256))
+
 # 随机字符串生成
 def gen_nonce(length=8):
-    """生成指定长度的随机字符串"""
-    chars = string.ascii_lowercase + string.digits
-    return ''.join([random.choice(chars) for _ in range(length)])
+    """生成指定长度的随机字符串，随机源为操作系统的密码学安全随机数"""
+    nonce = b""
+    while len(nonce) < length:
+        # 多取一半字节，被丢弃的字节约占1.6%，几乎总能一次取够
+        nonce += os.urandom(length + length // 2).translate(_NONCE_TABLE, _NONCE_DISCARD)
+    return nonce[:length].decode("ascii")
+
+def _escape_uri(value):
+    """按 urllib.parse.quote 编码，无需编码时直接返回"""
+    return value if _is_unreserved(value) else urllib.parse.quote(value)
 
 # URL参数编码
 def gen_canonical_query_string(params):
     """生成规范化的查询字符串"""
     if params:
-        escape_uri = urllib.parse.quote
-        raw = []
-        for k in sorted(params.keys()):
-            tmp_tuple = (escape_uri(k), escape_uri(str(params[k])))
-            raw.append(tmp_tuple)
-        s = "&".join("=".join(kv) for kv in raw)
-        return s
+        return "&".join([f"{_escape_uri(k)}={_escape_uri(str(params[k]))}" for k in sorted(params)])
     else:
         return ''
 
@@ -38,30 +56,94 @@ def gen_signature(app_secret, signing_string):
     signature = str(bytes_sig, encoding='utf-8')
     return signature
 
+class Signer:
+    """绑定一组 app_id/app_key 的请求签名器
+
+    创建时完成密钥编码，并预先计算HMAC内外两层已吸收密钥填充的SHA256状态，
+    每次签名只复制这两个状态；时间戳字符串按秒缓存，签名串中与请求无关的部分预先拼好。
+    可在多个线程和协程中共用。
+    """
+
+    def __init__(self, app_id, app_key):
+        """初始化签名器
+
+        Args:
+            app_id: 应用ID
+            app_key: 应用密钥
+        """
+        self.app_id = app_id
+        key = app_key.encode('utf-8')
+        if len(key) > _HMAC_BLOCK_SIZE:
+            key = hashlib.sha256(key).digest()
+        key = key.ljust(_HMAC_BLOCK_SIZE, b"\0")
+        self._inner = hashlib.sha256(key.translate(_HMAC_INNER_PAD))
+        self._outer = hashlib.sha256(key.translate(_HMAC_OUTER_PAD))
+        self._timestamp = (0, "0")
+        self._app_id_line = f"x-ai-gateway-app-id:{app_id}\nx-ai-gateway-timestamp:"
+
+    def _current_timestamp(self):
+        """返回当前秒的时间戳字符串，同一秒内不重复格式化"""
+        now = int(time.time())
+        cached = self._timestamp
+        if cached[0] == now:
+            return cached[1]
+        timestamp = str(now)
+        self._timestamp = (now, timestamp)
+        return timestamp
+
+    def sign(self, method, uri, query):
+        """生成蓝心大模型API鉴权请求头
+
+        Args:
+            method: 请求方法
+            uri: 请求路径
+            query: 查询参数字典
+
+        Returns:
+            鉴权请求头字典
+        """
+        timestamp = self._current_timestamp()
+        nonce = gen_nonce()
+        return {
+            'X-AI-GATEWAY-APP-ID': self.app_id,
+            'X-AI-GATEWAY-TIMESTAMP': timestamp,
+            'X-AI-GATEWAY-NONCE': nonce,
+            'X-AI-GATEWAY-SIGNED-HEADERS': SIGNED_HEADERS,
+            'X-AI-GATEWAY-SIGNATURE': self.signature(method, uri, query, timestamp, nonce)
+        }
+
+    def signature(self, method, uri, query, timestamp, nonce):
+        """按给定的时间戳和随机串计算签名，服务端校验签名时使用
+
+        Returns:
+            Base64编码的签名字符串
+        """
+        signing_string = (
+            f"{str(method).upper()}\n{uri}\n{gen_canonical_query_string(query)}\n{self.app_id}\n{timestamp}\n"
+            f"{self._app_id_line}{timestamp}\nx-ai-gateway-nonce:{nonce}"
+        )
+        inner = self._inner.copy()
+        inner.update(signing_string.encode('utf-8'))
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return base64.b64encode(outer.digest()).decode('ascii')
+
+# 按凭据缓存的签名器，凭据数量有限，不做淘汰
+_signers = {}
+_signers_lock = threading.Lock()
+
+def get_signer(app_id, app_key):
+    """获取凭据对应的签名器，首次调用时创建"""
+    key = (app_id, app_key)
+    signer = _signers.get(key)
+    if signer is None:
+        with _signers_lock:
+            signer = _signers.get(key)
+            if signer is None:
+                signer = _signers[key] = Signer(app_id, app_key)
+    return signer
+
 # 生成鉴权头部
 def gen_sign_headers(app_id, app_key, method, uri, query):
-    """生成蓝心大模型API鉴权请求头"""
-    method = str(method).upper()
-    uri = uri
-    timestamp = str(int(time.time()))
-    app_id = app_id
-    app_key = app_key
-    nonce = gen_nonce()
-    canonical_query_string = gen_canonical_query_string(query)
-    signed_headers_string = 'x-ai-gateway-app-id:{}\nx-ai-gateway-timestamp:{}\n' \
-                            'x-ai-gateway-nonce:{}'.format(app_id, timestamp, nonce)
-    signing_string = '{}\n{}\n{}\n{}\n{}\n{}'.format(method,
-                                                     uri,
-                                                     canonical_query_string,
-                                                     app_id,
-                                                     timestamp,
-                                                     signed_headers_string)
-    signing_string = signing_string.encode('utf-8')
-    signature = gen_signature(app_key, signing_string)
-    return {
-        'X-AI-GATEWAY-APP-ID': app_id,
-        'X-AI-GATEWAY-TIMESTAMP': timestamp,
-        'X-AI-GATEWAY-NONCE': nonce,
-        'X-AI-GATEWAY-SIGNED-HEADERS': "x-ai-gateway-app-id;x-ai-gateway-timestamp;x-ai-gateway-nonce",
-        'X-AI-GATEWAY-SIGNATURE': signature
-    } 
\ No newline at end of file
+    """生成蓝心大模型API鉴权请求头，复用凭据对应的 Signer"""
+    return get_signer(app_id, app_key).sign(method, uri, query)
@@ -0,0 +1,573 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""并发负载基准
+
+同时运行多个合成会话压测指定服务地址，会话类型包括流式对话、带递增历史的同步对话、
+绘画提交并轮询、图片分析和语音文件识别。结束后按会话类型统计延迟和首个token耗时的
+p50/p95/p99、吞吐量和错误率，输出JSON报告，并可与保存的基线报告对比，发现性能回退。
+
+配合本地模拟网关 mock_gateway.py 可以在不消耗配额的情况下比较连接池、异步客户端和
+响应缓存等改动的效果:
+
+    python mock_gateway.py --port 8100 &
+    python bench.py --sessions 8 --duration 20 --out baseline.json
+    python bench.py --sessions 8 --duration 20 --async --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from vivogpt_api import VivoGPT, process_stream_response
+from http_transport import HttpTransport
+from chat_history import estimate_tokens
+from deadline import Deadline
+from metrics import MetricsRegistry
+
+DEFAULT_BASE_URL = "http://127.0.0.1:8100"
+DEFAULT_APP_ID = "2025827557"
+DEFAULT_APP_KEY = "kIFmdMYqpZHhbgap"
+DEFAULT_SESSIONS = 4
+DEFAULT_DURATION = 10.0
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_HISTORY_TURNS = 6
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_TOLERANCE = 0.1          # 延迟和吞吐量允许的相对变化
+DEFAULT_ERROR_TOLERANCE = 0.01   # 错误率允许的绝对增加
+ERROR_BACKOFF = 0.1              # 操作抛出异常后，同一会话再次执行前的等待(秒)
+
+SCENARIOS = ("chat_stream", "chat_history", "draw", "vision", "asr")
+
+PROMPTS = [
+    "用一句话介绍你自己",
+    "写一首关于秋天的五言绝句",
+    "解释一下什么是HTTP长连接",
+    "给出三个提高睡眠质量的建议",
+    "把“今天天气很好”翻译成英文"
+]
+DRAW_PROMPTS = ["山间日出，水彩风格", "城市夜景，赛博朋克", "一只在窗台上晒太阳的猫"]
+VISION_PROMPT = "描述图片的内容"
+
+# recognize_wav_file 以文本返回错误，按前缀区分识别结果和错误信息
+ASR_ERROR_PREFIXES = ("文件不存在", "不支持的文件格式", "连接语音识别服务失败", "音频格式不符合要求",
+                      "文件识别过程出错", "识别出错", "识别已取消", "识别超时")
+
+def write_test_image(path, size=64):
+    """生成纯色PNG测试图片"""
+    import struct
+    import zlib
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    row = b"\x00" + b"\x40\x80\xc0" * size
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(row * size))
+                + chunk(b"IEND", b""))
+
+def write_test_wav(path, seconds=2.0, sample_rate=16000):
+    """生成16k/16bit单声道的静音WAV测试文件"""
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+
+def error_kind(result):
+    """把失败的响应字典归类为错误码字符串"""
+    if isinstance(result, dict):
+        return str(result.get("code", "unknown"))
+    return "unknown"
+
+class SessionState:
+    """单个合成会话的状态"""
+
+    def __init__(self, index):
+        self.index = index
+        self.turn = 0
+        self.messages = []
+        self.speech = None
+
+    def next_prompt(self, prompts):
+        """按会话编号错开，依次轮换提示词"""
+        prompt = prompts[(self.index + self.turn) % len(prompts)]
+        self.turn += 1
+        return prompt
+
+    def history_messages(self, max_turns):
+        """追加一轮用户消息，历史超过 max_turns 轮后重新开始"""
+        if len(self.messages) >= max_turns * 2:
+            self.messages = []
+        self.messages.append({"role": "user", "content": self.next_prompt(PROMPTS)})
+        return self.messages
+
+class SyncRunner:
+    """同步客户端：所有会话线程共用一个传输层和各HTTP客户端，语音识别每个会话一个连接"""
+
+    def __init__(self, args, metrics):
+        self.args = args
+        self.metrics = metrics
+        self.transport = HttpTransport(pool_maxsize=max(args.sessions, 1), keep_alive=not args.no_keep_alive,
+                                       metrics=metrics)
+        self._lock = threading.Lock()
+        self._clients = {}
+
+    def client(self, name):
+        """按需创建客户端，只用到的会话类型才导入对应模块"""
+        with self._lock:
+            if name not in self._clients:
+                args = self.args
+                if name == "gpt":
+                    self._clients[name] = VivoGPT(args.app_id, args.app_key, self.transport, args.response_cache,
+                                                  metrics=self.metrics, base_url=args.base_url)
+                elif name == "art":
+                    from vivogpt_draw import VivoArtAPI
+                    self._clients[name] = VivoArtAPI(args.app_id, args.app_key, self.transport,
+                                                     metrics=self.metrics, base_url=args.base_url)
+                else:
+                    from vivogpt_vision import VivoVisionAPI
+                    self._clients[name] = VivoVisionAPI(args.app_id, args.app_key, self.transport,
+                                                        metrics=self.metrics, base_url=args.base_url)
+            return self._clients[name]
+
+    def chat_stream(self, state, sample):
+        response = self.client("gpt").chat(state.next_prompt(PROMPTS), stream=True,
+                                           deadline=Deadline(self.args.timeout))
+        for delta in process_stream_response(response):
+            sample.token(estimate_tokens(delta))
+        if not sample.tokens:
+            sample.fail("empty_stream")
+
+    def chat_history(self, state, sample):
+        messages = state.history_messages(self.args.history_turns)
+        result = self.client("gpt").chat_with_history(messages, deadline=Deadline(self.args.timeout))
+        record_chat_result(state, sample, result)
+
+    def draw(self, state, sample):
+        finished, result = self.client("art").submit_and_wait(
+            state.next_prompt(DRAW_PROMPTS), poll_interval=self.args.poll_interval,
+            deadline=Deadline(self.args.timeout))
+        if not finished:
+            sample.fail(error_kind(result))
+
+    def vision(self, state, sample):
+        result, _ = self.client("vision").analyze_image(self.args.image, VISION_PROMPT,
+                                                        deadline=Deadline(self.args.timeout))
+        record_content(sample, result)
+
+    def asr(self, state, sample):
+        if state.speech is None:
+            from vivogpt_speech import VivoSpeechAPI
+            state.speech = VivoSpeechAPI(self.args.app_id, self.args.app_key, metrics=self.metrics,
+                                         base_url=self.args.base_url)
+        record_asr_text(sample, state.speech.recognize_wav_file(self.args.wav, deadline=Deadline(self.args.timeout)))
+
+    def session(self, index, scenario, stop_at):
+        """在截止时间前循环执行一种会话，返回全部样本"""
+        state = SessionState(index)
+        operation = getattr(self, scenario)
+        samples = []
+        try:
+            while time.perf_counter() < stop_at and not self.args.enough(samples):
+                sample = Sample()
+                raised = False
+                try:
+                    operation(state, sample)
+                except ImportError as e:
+                    # 缺少依赖(如语音识别需要的 pyaudio)，重试没有意义，记一次失败后结束会话
+                    sample.fail(type(e).__name__)
+                    samples.append(sample.finish())
+                    break
+                except Exception as e:
+                    sample.fail(type(e).__name__)
+                    raised = True
+                samples.append(sample.finish())
+                if raised:
+                    # 立即失败的操作不空转，稍等后再执行
+                    time.sleep(min(ERROR_BACKOFF, max(0.0, stop_at - time.perf_counter())))
+        finally:
+            if state.speech is not None:
+                state.speech.disconnect()
+        return samples
+
+    def run(self, assignments):
+        """每个会话一个线程并发运行
+
+        Returns:
+            与 assignments 对应的样本列表
+        """
+        stop_at = time.perf_counter() + self.args.duration
+        try:
+            with ThreadPoolExecutor(max_workers=len(assignments)) as pool:
+                futures = [pool.submit(self.session, index, scenario, stop_at)
+                           for index, scenario in enumerate(assignments)]
+                return [future.result() for future in futures]
+        finally:
+            self.transport.close()
+
+class AsyncRunner:
+    """异步客户端：所有会话在同一事件循环中运行，共用一个 aiohttp 连接池
+
+    语音识别没有异步客户端，在线程中调用同步客户端。
+    """
+
+    def __init__(self, args, metrics):
+        self.args = args
+        self.metrics = metrics
+        self.transport = None
+        self._clients = {}
+
+    def client(self, name):
+        """按需创建客户端"""
+        if name not in self._clients:
+            from vivogpt_async import AsyncVivoGPT, AsyncVivoArtAPI, AsyncVivoVisionAPI
+            cls = {"gpt": AsyncVivoGPT, "art": AsyncVivoArtAPI, "vision": AsyncVivoVisionAPI}[name]
+            self._clients[name] = cls(self.args.app_id, self.args.app_key, self.transport, metrics=self.metrics,
+                                      base_url=self.args.base_url)
+        return self._clients[name]
+
+    async def chat_stream(self, state, sample):
+        stream = self.client("gpt").chat_stream(state.next_prompt(PROMPTS), deadline=Deadline(self.args.timeout))
+        async for delta in stream:
+            sample.token(estimate_tokens(delta))
+        if not sample.tokens:
+            sample.fail("empty_stream")
+
+    async def chat_history(self, state, sample):
+        messages = state.history_messages(self.args.history_turns)
+        result = await self.client("gpt").chat_with_history(messages, deadline=Deadline(self.args.timeout))
+        record_chat_result(state, sample, result)
+
+    async def draw(self, state, sample):
+        finished, result = await self.client("art").submit_and_wait(
+            state.next_prompt(DRAW_PROMPTS), poll_interval=self.args.poll_interval,
+            deadline=Deadline(self.args.timeout))
+        if not finished:
+            sample.fail(error_kind(result))
+
+    async def vision(self, state, sample):
+        result, _ = await self.client("vision").analyze_image(self.args.image, VISION_PROMPT,
+                                                              deadline=Deadline(self.args.timeout))
+        record_content(sample, result)
+
+    async def asr(self, state, sample):
+        if state.speech is None:
+            from vivogpt_speech import VivoSpeechAPI
+            state.speech = VivoSpeechAPI(self.args.app_id, self.args.app_key, metrics=self.metrics,
+                                         base_url=self.args.base_url)
+        text = await asyncio.to_thread(state.speech.recognize_wav_file, self.args.wav,
+                                       deadline=Deadline(self.args.timeout))
+        record_asr_text(sample, text)
+
+    async def session(self, index, scenario, stop_at):
+        """在截止时间前循环执行一种会话，返回全部样本"""
+        state = SessionState(index)
+        operation = getattr(self, scenario)
+        samples = []
+        try:
+            while time.perf_counter() < stop_at and not self.args.enough(samples):
+                sample = Sample()
+                raised = False
+                try:
+                    await operation(state, sample)
+                except ImportError as e:
+                    # 缺少依赖(如语音识别需要的 pyaudio)，重试没有意义，记一次失败后结束会话
+                    sample.fail(type(e).__name__)
+                    samples.append(sample.finish())
+                    break
+                except Exception as e:
+                    sample.fail(type(e).__name__)
+                    raised = True
+                samples.append(sample.finish())
+                if raised:
+                    # 立即失败的操作不空转，稍等后再执行
+                    await asyncio.sleep(min(ERROR_BACKOFF, max(0.0, stop_at - time.perf_counter())))
+        finally:
+            if state.speech is not None:
+                await asyncio.to_thread(state.speech.disconnect)
+        return samples
+
+    async def _run(self, assignments):
+        from vivogpt_async import AsyncHttpTransport
+        self.transport = AsyncHttpTransport(pool_maxsize=max(len(assignments), 1), metrics=self.metrics)
+        stop_at = time.perf_counter() + self.args.duration
+        try:
+            return await asyncio.gather(*[self.session(index, scenario, stop_at)
+                                          for index, scenario in enumerate(assignments)])
+        finally:
+            await self.transport.close()
+
+    def run(self, assignments):
+        """在新的事件循环中并发运行全部会话"""
+        return asyncio.run(self._run(assignments))
+
+class Sample:
+    """一次操作的计时结果"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.latency = None
+        self.ttft = None
+        self.tokens = 0
+        self.error = None
+
+    def token(self, count):
+        """记录流式输出的一段增量，第一段的到达时间即首个token耗时"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+        self.tokens += count
+
+    def fail(self, kind):
+        """标记失败及错误类型"""
+        self.error = kind
+
+    def finish(self):
+        self.latency = time.perf_counter() - self.start
+        return self
+
+def record_content(sample, result):
+    """按 {"code": 0, "data": {"content": ...}} 格式的响应记录结果"""
+    if isinstance(result, dict) and result.get("code") == 0 and result.get("data"):
+        sample.tokens += estimate_tokens(result["data"].get("content", ""))
+        return result["data"].get("content", "")
+    sample.fail(error_kind(result))
+    return None
+
+def record_chat_result(state, sample, result):
+    """记录多轮对话结果，成功时把回复加入历史，失败时撤回本轮提问"""
+    content = record_content(sample, result)
+    if content is None:
+        state.messages.pop()
+    else:
+        state.messages.append({"role": "assistant", "content": content})
+
+def record_asr_text(sample, text):
+    """语音识别以文本返回错误，按错误前缀判断"""
+    for prefix in ASR_ERROR_PREFIXES:
+        if text.startswith(prefix):
+            sample.fail(prefix)
+            return
+    sample.tokens += estimate_tokens(text)
+
+def percentile(values, q):
+    """按最近秩法计算分位数，values 需已排序"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+    return values[index]
+
+def distribution(values):
+    """汇总耗时分布，单位毫秒"""
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * 1000, 2),
+        "p50": round(percentile(values, 0.50) * 1000, 2),
+        "p95": round(percentile(values, 0.95) * 1000, 2),
+        "p99": round(percentile(values, 0.99) * 1000, 2),
+        "max": round(values[-1] * 1000, 2)
+    }
+
+def summarize(samples, sessions, elapsed):
+    """汇总一组样本
+
+    延迟只统计成功的操作，失败的操作计入错误率。
+    """
+    succeeded = [sample for sample in samples if sample.error is None]
+    errors = Counter(sample.error for sample in samples if sample.error is not None)
+    tokens = sum(sample.tokens for sample in succeeded)
+    return {
+        "sessions": sessions,
+        "requests": len(samples),
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / len(samples), 4) if samples else 0.0,
+        "errors_by_kind": dict(errors),
+        "throughput": round(len(succeeded) / elapsed, 3) if elapsed else 0.0,
+        "tokens_per_second": round(tokens / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": distribution([sample.latency for sample in succeeded]),
+        "ttft_ms": distribution([sample.ttft for sample in succeeded if sample.ttft is not None])
+    }
+
+def build_report(args, assignments, results, elapsed, metrics):
+    """生成JSON报告"""
+    by_scenario = {}
+    for scenario, samples in zip(assignments, results):
+        entry = by_scenario.setdefault(scenario, {"sessions": 0, "samples": []})
+        entry["sessions"] += 1
+        entry["samples"].extend(samples)
+
+    all_samples = [sample for samples in results for sample in samples]
+    return {
+        "config": {
+            "base_url": args.base_url,
+            "mode": "async" if args.use_async else "sync",
+            "sessions": args.sessions,
+            "duration": args.duration,
+            "scenarios": list(args.scenarios),
+            "keep_alive": not args.no_keep_alive,
+            "cache": args.cache
+        },
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - elapsed)),
+        "elapsed": round(elapsed, 3),
+        "scenarios": {scenario: summarize(entry["samples"], entry["sessions"], elapsed)
+                      for scenario, entry in by_scenario.items()},
+        "total": summarize(all_samples, len(assignments), elapsed),
+        "client_metrics": metrics.snapshot()
+    }
+
+def compare_reports(report, baseline, tolerance, error_tolerance):
+    """逐项对比当前报告和基线
+
+    延迟和首个token耗时增加超过 tolerance 比例、吞吐量下降超过 tolerance 比例、
+    错误率增加超过 error_tolerance 时视为回退。
+
+    Returns:
+        [(会话类型, 指标, 基线值, 当前值, 是否回退), ...]
+    """
+    rows = []
+    for scenario, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if not base:
+            continue
+        for group in ("latency_ms", "ttft_ms"):
+            for key in ("p50", "p95", "p99"):
+                old = (base.get(group) or {}).get(key)
+                new = (current.get(group) or {}).get(key)
+                if old is None or new is None:
+                    continue
+                rows.append((scenario, f"{group[:-3]}.{key}", old, new, new > old * (1 + tolerance)))
+        for key in ("throughput", "tokens_per_second"):
+            old, new = base.get(key), current.get(key)
+            if old:
+                rows.append((scenario, key, old, new, new < old * (1 - tolerance)))
+        old, new = base.get("error_rate", 0.0), current.get("error_rate", 0.0)
+        rows.append((scenario, "error_rate", old, new, new - old > error_tolerance))
+    return rows
+
+def format_report(report):
+    """把报告格式化为便于阅读的表格"""
+    header = f"{'会话类型':<14}{'请求':>7}{'错误率':>8}{'吞吐/秒':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'首token p50':>13}"
+    lines = [f"{report['config']['mode']} 模式，{report['config']['sessions']} 个会话，"
+             f"运行 {report['elapsed']:.1f} 秒，延迟单位毫秒", header]
+
+    def fmt(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    for name, entry in list(report["scenarios"].items()) + [("total", report["total"])]:
+        latency = entry["latency_ms"] or {}
+        ttft = entry["ttft_ms"] or {}
+        lines.append(f"{name:<14}{entry['requests']:>7}{entry['error_rate']:>8.1%}{entry['throughput']:>9.2f}"
+                     f"{fmt(latency.get('p50')):>9}{fmt(latency.get('p95')):>9}{fmt(latency.get('p99')):>9}"
+                     f"{fmt(ttft.get('p50')):>13}")
+        if entry["errors_by_kind"]:
+            kinds = ", ".join(f"{kind} x{count}" for kind, count in sorted(entry["errors_by_kind"].items()))
+            lines.append(f"{'':<14}错误: {kinds}")
+    return "\n".join(lines)
+
+def format_comparison(rows):
+    """把对比结果格式化为表格"""
+    lines = [f"{'会话类型':<14}{'指标':<20}{'基线':>10}{'当前':>10}{'变化':>9}"]
+    for scenario, name, old, new, regressed in rows:
+        change = f"{(new - old) / old:+.1%}" if old else "-"
+        mark = "  回退" if regressed else ""
+        lines.append(f"{scenario:<14}{name:<20}{old:>10.2f}{new:>10.2f}{change:>9}{mark}")
+    return "\n".join(lines)
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='蓝心大模型客户端并发负载基准')
+    parser.add_argument('--base_url', type=str, default=DEFAULT_BASE_URL, help='服务地址，默认指向本地模拟网关')
+    parser.add_argument('--app_id', type=str, default=DEFAULT_APP_ID, help='应用ID')
+    parser.add_argument('--app_key', type=str, default=DEFAULT_APP_KEY, help='应用密钥')
+    parser.add_argument('--sessions', type=int, default=DEFAULT_SESSIONS, help='并发会话数')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='运行时长(秒)')
+    parser.add_argument('--requests', type=int, help='每个会话最多执行的操作数，先到先停')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                        help='会话类型，可重复指定，会话按顺序轮流分配；默认只运行 chat_stream 和 chat_history')
+    parser.add_argument('--async', action='store_true', dest='use_async', help='使用异步客户端')
+    parser.add_argument('--no_keep_alive', action='store_true', help='不复用HTTP连接(仅同步模式)')
+    parser.add_argument('--cache', action='store_true', help='对话启用响应缓存，每次运行使用新的缓存文件(仅同步模式)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='单次操作的总时限(秒)')
+    parser.add_argument('--history_turns', type=int, default=DEFAULT_HISTORY_TURNS, help='多轮对话会话的历史轮数上限')
+    parser.add_argument('--poll_interval', type=float, default=DEFAULT_POLL_INTERVAL, help='绘画任务轮询间隔(秒)')
+    parser.add_argument('--image', type=str, help='图片分析使用的图片，默认生成测试图片')
+    parser.add_argument('--wav', type=str, help='语音识别使用的16k/16bit单声道WAV文件，默认生成2秒静音')
+    parser.add_argument('--out', type=str, metavar='REPORT_JSON', help='报告输出文件，可作为之后运行的基线')
+    parser.add_argument('--baseline', type=str, metavar='REPORT_JSON', help='基线报告，存在回退时以状态码1退出')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='延迟和吞吐量允许的相对变化')
+    parser.add_argument('--error_tolerance', type=float, default=DEFAULT_ERROR_TOLERANCE, help='错误率允许的绝对增加')
+    args = parser.parse_args()
+    if args.sessions < 1:
+        parser.error("--sessions 至少为1")
+    if not args.scenarios:
+        args.scenarios = ["chat_stream", "chat_history"]
+    return args
+
+def main():
+    args = parse_arguments()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    workdir = tempfile.TemporaryDirectory(prefix="vivo_bench_")
+    if args.image is None:
+        args.image = os.path.join(workdir.name, "bench.png")
+        write_test_image(args.image)
+    if args.wav is None:
+        args.wav = os.path.join(workdir.name, "bench.wav")
+        write_test_wav(args.wav)
+    args.response_cache = None
+    if args.cache:
+        from response_cache import ResponseCache
+        args.response_cache = ResponseCache(path=os.path.join(workdir.name, "cache.db"))
+    args.enough = lambda samples: args.requests is not None and len(samples) >= args.requests
+
+    metrics = MetricsRegistry()
+    assignments = [args.scenarios[i % len(args.scenarios)] for i in range(args.sessions)]
+    runner = AsyncRunner(args, metrics) if args.use_async else SyncRunner(args, metrics)
+    print(f"压测 {args.base_url}: {args.sessions} 个会话 ({', '.join(args.scenarios)})，最长 {args.duration:g} 秒")
+
+    start = time.perf_counter()
+    try:
+        results = runner.run(assignments)
+    finally:
+        if args.response_cache is not None:
+            args.response_cache.close()
+    elapsed = time.perf_counter() - start
+    workdir.cleanup()
+
+    report = build_report(args, assignments, results, elapsed, metrics)
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.out}")
+
+    if baseline is not None:
+        rows = compare_reports(report, baseline, args.tolerance, args.error_tolerance)
+        if not rows:
+            print("基线中没有相同的会话类型，无法对比")
+            return 0
+        print(format_comparison(rows))
+        regressions = [row for row in rows if row[-1]]
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回退")
+            return 1
+        print("未发现性能回退")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""请求签名吞吐量微基准
+
+对比旧的逐次签名实现(每次重新编码密钥、新建HMAC、用 random 模块生成随机串)
+和 auth_utils.Signer 每秒能生成的签名数，并校验两者对相同输入的签名一致。
+
+用法: python benchmarks/sign_bench.py [--count 200000] [--repeat 3]
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import random
+import string
+import sys
+import time
+import urllib.parse
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_utils import Signer, gen_sign_headers
+
+APP_ID = "2025000000"
+APP_KEY = "benchmark-app-key-0123456789"
+URI = "/vivogpt/completions"
+
+def legacy_sign(app_id, app_key, method, uri, query, timestamp=None, nonce=None):
+    """旧实现：每次签名都重新准备全部状态"""
+    method = str(method).upper()
+    timestamp = timestamp or str(int(time.time()))
+    nonce = nonce or ''.join([random.choice(string.ascii_lowercase + string.digits) for _ in range(8)])
+    raw = []
+    for k in sorted(query.keys()):
+        raw.append((urllib.parse.quote(k), urllib.parse.quote(str(query[k]))))
+    canonical_query_string = "&".join("=".join(kv) for kv in raw)
+    signed_headers_string = 'x-ai-gateway-app-id:{}\nx-ai-gateway-timestamp:{}\n' \
+                            'x-ai-gateway-nonce:{}'.format(app_id, timestamp, nonce)
+    signing_string = '{}\n{}\n{}\n{}\n{}\n{}'.format(method, uri, canonical_query_string, app_id, timestamp,
+                                                     signed_headers_string).encode('utf-8')
+    hash_obj = hmac.new(app_key.encode('utf-8'), signing_string, hashlib.sha256)
+    return {
+        'X-AI-GATEWAY-APP-ID': app_id,
+        'X-AI-GATEWAY-TIMESTAMP': timestamp,
+        'X-AI-GATEWAY-NONCE': nonce,
+        'X-AI-GATEWAY-SIGNED-HEADERS': "x-ai-gateway-app-id;x-ai-gateway-timestamp;x-ai-gateway-nonce",
+        'X-AI-GATEWAY-SIGNATURE': str(base64.b64encode(hash_obj.digest()), encoding='utf-8')
+    }
+
+def check_consistent(signer, queries):
+    """用 Signer 生成的时间戳和随机串重算旧实现，签名应完全一致"""
+    for query in queries:
+        headers = signer.sign("POST", URI, query)
+        expected = legacy_sign(APP_ID, APP_KEY, "POST", URI, query,
+                               headers['X-AI-GATEWAY-TIMESTAMP'], headers['X-AI-GATEWAY-NONCE'])
+        if headers != expected:
+            return False
+    return True
+
+def measure(sign, queries, repeat):
+    """多次运行取最快一次，返回 (签名数/秒, 单次微秒)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            sign("POST", URI, query)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(queries) / best, best / len(queries) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='请求签名吞吐量微基准')
+    parser.add_argument('--count', type=int, default=200000, help='每轮签名次数')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    args = parser.parse_args()
+
+    # 与客户端一致，每个请求的查询参数带不同的 requestId
+    queries = [{"requestId": str(uuid.uuid4())} for _ in range(args.count)]
+    signer = Signer(APP_ID, APP_KEY)
+    print(f"签名次数: {args.count}，签名结果{'一致' if check_consistent(signer, queries[:1000]) else '不一致'}")
+
+    cases = [
+        ("逐次签名(旧)", lambda method, uri, query: legacy_sign(APP_ID, APP_KEY, method, uri, query)),
+        ("gen_sign_headers", lambda method, uri, query: gen_sign_headers(APP_ID, APP_KEY, method, uri, query)),
+        ("Signer.sign", signer.sign)
+    ]
+    for name, sign in cases:
+        rate, micros = measure(sign, queries, args.repeat)
+        print(f"{name:<20} {rate:10.0f} 次/秒  {micros:6.2f} us/次")
+
+if __name__ == "__main__":
+    main()
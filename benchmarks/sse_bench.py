@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""SSE解析吞吐量微基准
+
+构造数MB的流式响应，按固定大小切块模拟网络到达，
+对比旧的逐行解析方式和 sse_parser 增量解析器的吞吐量。
+
+用法: python benchmarks/sse_bench.py [--size_mb 8] [--chunk_size 4096] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sse_parser
+from sse_parser import SSEParser, to_stream_events, DELTA
+
+def build_stream(size_mb):
+    """构造指定大小的SSE响应体"""
+    pieces = []
+    size = 0
+    target = size_mb * 1024 * 1024
+    index = 0
+    while size < target:
+        text = "蓝心大模型流式输出第%d段，" % index
+        piece = ("data:" + json.dumps({"message": text}, ensure_ascii=False) + "\n\n").encode("utf-8")
+        pieces.append(piece)
+        size += len(piece)
+        index += 1
+    pieces.append(b"event:close\ndata:[DONE]\n\n")
+    return b"".join(pieces)
+
+def split_chunks(body, chunk_size):
+    """按固定大小切块，块边界会落在行和多字节字符中间"""
+    return [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+def legacy_parse(chunks):
+    """旧实现：先按行切分（等价于 iter_lines），再逐行解码和解析JSON"""
+    parts = []
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+        if lines and chunk and lines[-1] and chunk[-1] == lines[-1][-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+        for line in lines:
+            if not line:
+                continue
+            line_text = line.decode("utf-8")
+            if line_text.startswith("data:"):
+                data_text = line_text[5:].strip()
+                if data_text == "[DONE]":
+                    continue
+                data_json = json.loads(data_text)
+                if data_json.get("message"):
+                    parts.append(data_json["message"])
+    return "".join(parts)
+
+def parser_parse(chunks):
+    """新实现：增量字节解析 + 类型化事件"""
+    parts = []
+    parser = SSEParser()
+    for chunk in chunks:
+        for sse_event in parser.feed(chunk):
+            for event in to_stream_events(sse_event):
+                if event.type == DELTA:
+                    parts.append(event.text)
+    for sse_event in parser.flush():
+        for event in to_stream_events(sse_event):
+            if event.type == DELTA:
+                parts.append(event.text)
+    return "".join(parts)
+
+def measure(func, chunks, size_bytes, repeat):
+    """多次运行取最快一次，返回 (MB/s, 秒, 结果)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(chunks)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size_bytes / 1024 / 1024 / best, best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE解析吞吐量微基准')
+    parser.add_argument('--size_mb', type=int, default=8, help='流式响应大小(MB)')
+    parser.add_argument('--chunk_size', type=int, default=4096, help='网络块大小(字节)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    args = parser.parse_args()
+
+    body = build_stream(args.size_mb)
+    chunks = split_chunks(body, args.chunk_size)
+    print(f"流大小: {len(body) / 1024 / 1024:.1f}MB，块大小: {args.chunk_size}字节，块数: {len(chunks)}")
+
+    cases = [("逐行解析(旧)", legacy_parse), ("增量解析", parser_parse)]
+    if sse_parser._loads is not sse_parser._stdlib_loads:
+        # 安装了 orjson 时额外对比标准库 json
+        def parser_parse_stdlib(chunks):
+            sse_parser._loads, fast_loads = sse_parser._stdlib_loads, sse_parser._loads
+            try:
+                return parser_parse(chunks)
+            finally:
+                sse_parser._loads = fast_loads
+        cases.append(("增量解析(标准库json)", parser_parse_stdlib))
+
+    expected = None
+    for name, func in cases:
+        throughput, elapsed, result = measure(func, chunks, len(body), args.repeat)
+        if expected is None:
+            expected = result
+        status = "一致" if result == expected else "不一致"
+        print(f"{name:<20} {throughput:8.1f} MB/s  {elapsed * 1000:8.1f} ms  结果{status}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""命令行启动耗时基准
+
+分别测量 `python chat_app.py --help` 的耗时和聊天模式从启动到出现输入提示符的耗时，
+并用 python -X importtime 列出导入耗时最多的模块，用于跟踪延迟加载的效果。
+
+用法: python benchmarks/startup_bench.py [--repeat 5] [--top 10]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_APP = os.path.join(ROOT, "chat_app.py")
+PROMPT = b">>> "
+
+def time_help():
+    """运行一次 chat_app.py --help，返回耗时(秒)"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, CHAT_APP, "--help"], cwd=ROOT, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+def time_to_prompt(timeout=30.0):
+    """启动聊天模式，返回输出输入提示符前的耗时(秒)"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, CHAT_APP], cwd=ROOT, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        output = b""
+        while PROMPT not in output:
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError("聊天模式在出现提示符前退出")
+            output += chunk
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("等待提示符超时")
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+def import_profile(top):
+    """用 -X importtime 统计 --help 路径上累计导入耗时最多的顶层模块
+
+    Returns:
+        [(累计耗时微秒, 模块名), ...]
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", CHAT_APP, "--help"], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 只统计顶层导入，缩进表示被其它模块间接导入
+        if name.startswith(" ") and not name.startswith("  "):
+            modules.append((int(cumulative), name.strip()))
+    modules.sort(reverse=True)
+    return modules[:top]
+
+def summarize(samples):
+    """返回 (最快, 中位数) 毫秒"""
+    samples = sorted(samples)
+    return samples[0] * 1000, samples[len(samples) // 2] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='命令行启动耗时基准')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    parser.add_argument('--top', type=int, default=10, help='列出导入耗时最多的模块数')
+    args = parser.parse_args()
+
+    # 先运行一次，生成字节码缓存
+    time_help()
+
+    fastest, median = summarize([time_help() for _ in range(args.repeat)])
+    print(f"{'chat_app.py --help':<20} 最快 {fastest:8.1f} ms  中位数 {median:8.1f} ms")
+
+    try:
+        fastest, median = summarize([time_to_prompt() for _ in range(args.repeat)])
+        print(f"{'聊天模式到提示符':<20} 最快 {fastest:8.1f} ms  中位数 {median:8.1f} ms")
+    except RuntimeError as e:
+        print(f"{'聊天模式到提示符':<20} 测量失败: {e}")
+
+    print(f"\n导入耗时最多的 {args.top} 个顶层模块(累计):")
+    for cumulative, name in import_profile(args.top):
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
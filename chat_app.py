@@ -2,46 +2,31 @@
 # encoding: utf-8
 
 import json
-import time
 import sys
 import argparse
 import re
 import os
 import shutil
 
-from vivogpt_api import VivoGPT, process_stream_response
-from vivogpt_draw import VivoArtAPI
-from vivogpt_vision import VivoVisionAPI
-from vivogpt_speech import VivoSpeechAPI
+# 绘画、图片分析和语音识别的客户端与界面模块在首次使用时才导入，
+# 纯聊天会话不需要加载 pyaudio、websocket 等依赖
+from vivogpt_api import VivoGPT, process_stream_response, DEFAULT_BASE_URL
+from http_transport import HttpTransport
+from retry_policy import RetryPolicy, DEFAULT_MAX_ATTEMPTS, DEFAULT_DEADLINE as DEFAULT_RETRY_DEADLINE
+from rate_limiter import RateLimiter, parse_rate_limits, DEFAULT_MAX_LIMIT
+from hedging import HedgePolicy, DEFAULT_HEDGE_PERCENTILE, DEFAULT_HEDGE_BUDGET
+from credential_pool import CredentialPool, load_credentials, ROUND_ROBIN, LEAST_LOADED, DEFAULT_COOLDOWN
+from deadline import Deadline
+from chat_batch import run_batch
+from response_cache import ResponseCache, DEFAULT_TTL as DEFAULT_CACHE_TTL
+from draw_catalog import DEFAULT_TTL as DEFAULT_CATALOG_TTL
+from chat_history import ConversationHistory, make_vivogpt_summarizer, DEFAULT_TOKEN_BUDGET
+from metrics import get_default_registry, format_stats_table
 from chat_ui import (
     Color, clear_screen, print_welcome, 
     print_user_message, print_ai_message, 
-    print_thinking, print_streaming_ai_message
-)
-from draw_ui import (
-    print_drawing_welcome, print_drawing_header,
-    print_drawing_prompt, print_styles, print_prompts,
-    print_task_submitted, print_task_progress,
-    print_task_canceled, print_image_saved,
-    print_drawing_animation, print_drawing_settings,
-    print_help_drawing
-)
-from vision_ui import (
-    print_vision_welcome, print_vision_header,
-    print_vision_prompt, print_models, print_examples,
-    print_browse_images, print_analyzing_animation,
-    print_image_info, print_analysis_result,
-    print_streaming_analysis_result, print_help_vision,
-    parse_analyze_command, parse_browse_command,
-    parse_set_model_command
-)
-from speech_ui import (
-    print_speech_welcome, print_speech_header,
-    print_speech_prompt, print_recording_animation,
-    print_recognizing_animation, print_speech_result,
-    print_audio_files, print_save_result, print_help_speech,
-    parse_record_command, parse_recognize_command,
-    parse_save_command, ensure_audio_dir
+    thinking_spinner, prefetch_first_chunk, print_streaming_ai_message,
+    print_history_compacted
 )
 
 # 默认配置
@@ -50,6 +35,12 @@ DEFAULT_APP_KEY = "kIFmdMYqpZHhbgap"
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_MAX_TOKENS = 2048
 DEFAULT_STREAM = True
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_CONCURRENCY = 4
+DEFAULT_PREWARM_CONNECTIONS = 2
+DEFAULT_DRAW_QUEUE_LIMIT = 8
 
 # 默认绘画设置
 DEFAULT_DRAWING_SETTINGS = {
@@ -82,6 +73,7 @@ def parse_arguments():
     parser = argparse.ArgumentParser(description='蓝心大模型聊天助手')
     parser.add_argument('--app_id', type=str, default=DEFAULT_APP_ID, help='应用ID')
     parser.add_argument('--app_key', type=str, default=DEFAULT_APP_KEY, help='应用密钥')
+    parser.add_argument('--base_url', type=str, default=DEFAULT_BASE_URL, help='服务地址，可指向本地模拟网关 mock_gateway.py')
     parser.add_argument('--temperature', type=float, default=DEFAULT_TEMPERATURE, help='温度参数(0.1-1.0)')
     parser.add_argument('--max_tokens', type=int, default=DEFAULT_MAX_TOKENS, help='最大生成长度')
     parser.add_argument('--no_stream', action='store_true', help='不使用流式输出')
@@ -89,13 +81,78 @@ def parse_arguments():
     parser.add_argument('--draw', action='store_true', help='直接进入绘画模式')
     parser.add_argument('--vision', action='store_true', help='直接进入图片分析模式')
     parser.add_argument('--speech', action='store_true', help='直接进入语音识别模式')
-    return parser.parse_args()
+    parser.add_argument('--pool_size', type=int, default=DEFAULT_POOL_SIZE, help='HTTP连接池大小')
+    parser.add_argument('--connect_timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT, help='建立连接超时(秒)')
+    parser.add_argument('--read_timeout', type=float, default=DEFAULT_READ_TIMEOUT, help='读取超时(秒)')
+    parser.add_argument('--no_keep_alive', action='store_true', help='不复用HTTP连接')
+    parser.add_argument('--prewarm', action='store_true', help='启动时在后台预先建立连接并在空闲时保活，减少首个请求的延迟')
+    parser.add_argument('--prewarm_connections', type=int, default=DEFAULT_PREWARM_CONNECTIONS, help='预热的HTTP连接数')
+    parser.add_argument('--max_retries', type=int, default=DEFAULT_MAX_ATTEMPTS - 1, help='限流或出错时的最大重试次数')
+    parser.add_argument('--retry_deadline', type=float, default=DEFAULT_RETRY_DEADLINE, help='含重试在内单次请求的总时限(秒)')
+    parser.add_argument('--max_concurrency', type=int, default=DEFAULT_MAX_LIMIT, help='自适应并发上限的最大值')
+    parser.add_argument('--rate_limit', action='append', metavar='ENDPOINT=QPS[:BURST]', help='按接口限制每秒请求数，可重复指定')
+    parser.add_argument('--hedge', action='store_true', help='非流式请求超过历史耗时分位仍未返回时发出对冲请求')
+    parser.add_argument('--hedge_percentile', type=float, default=DEFAULT_HEDGE_PERCENTILE, help='发出对冲请求的耗时分位(0-1)')
+    parser.add_argument('--hedge_budget', type=float, default=DEFAULT_HEDGE_BUDGET, help='对冲请求占请求总数的比例上限')
+    parser.add_argument('--credentials', type=str, metavar='FILE', help='凭据文件，每行一组 app_id:app_key 或JSON数组，请求在多组凭据间分摊')
+    parser.add_argument('--credential_strategy', choices=[ROUND_ROBIN, LEAST_LOADED], default=ROUND_ROBIN, help='凭据选择策略')
+    parser.add_argument('--credential_cooldown', type=float, default=DEFAULT_COOLDOWN, help='凭据被限流后暂停使用的时间(秒)')
+    parser.add_argument('--history_budget', type=int, default=DEFAULT_TOKEN_BUDGET, help='对话历史的token预算')
+    parser.add_argument('--history_turns', type=int, default=None, help='最多保留的历史轮数')
+    parser.add_argument('--summarize', action='store_true', help='压缩历史时用大模型生成旧对话摘要')
+    parser.add_argument('--cache', action='store_true', help='启用磁盘响应缓存，相同请求直接返回缓存结果')
+    parser.add_argument('--cache_ttl', type=int, default=DEFAULT_CACHE_TTL, help='响应缓存有效期(秒)')
+    parser.add_argument('--no_draw_cache', action='store_true', help='不使用绘画结果索引，种子固定的相同请求也重新生成')
+    parser.add_argument('--catalog_ttl', type=int, default=DEFAULT_CATALOG_TTL, help='绘画风格和推荐提示词目录的有效期(秒)，过期后在后台刷新')
+    parser.add_argument('--batch', type=str, metavar='PROMPTS_JSONL', help='批量模式：从JSONL文件读取提示词')
+    parser.add_argument('--out', type=str, metavar='RESULTS_JSONL', help='批量模式的结果输出文件')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='批量模式并发数')
+    parser.add_argument('--draw_batch', type=str, metavar='PROMPTS', help='批量绘画：从文件读取提示词(每行一个或JSONL)，清单写入 --out')
+    parser.add_argument('--sweep', action='append', metavar='PARAM=V1,V2', help='批量绘画的参数扫描，可重复指定，按笛卡尔积展开，'
+                        '参数为 seed、cfg_scale、steps、style_config、width、height 或 size(宽x高)')
+    parser.add_argument('--queue_limit', type=int, default=DEFAULT_DRAW_QUEUE_LIMIT, help='批量绘画中任务排队位置达到该值时暂缓提交')
+    parser.add_argument('--metrics_out', type=str, metavar='PATH', help='退出时导出性能指标，.prom 结尾为Prometheus文本，否则为JSON')
+    args = parser.parse_args()
+    if args.batch and not args.out:
+        parser.error('--batch 需要同时指定 --out')
+    if args.draw_batch and not args.out:
+        parser.error('--draw_batch 需要同时指定 --out')
+    args.sweep_params = []
+    if args.sweep:
+        from draw_batch import parse_sweep
+        try:
+            args.sweep_params = parse_sweep(args.sweep)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        args.endpoint_rates = parse_rate_limits(args.rate_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    args.credential_pool = None
+    args.art_client = None
+    args.draw_scheduler = None
+    args.draw_catalog = None
+    if args.credentials:
+        try:
+            args.credential_pool = CredentialPool(
+                load_credentials(args.credentials), args.credential_strategy, args.credential_cooldown
+            )
+        except (OSError, ValueError) as e:
+            parser.error(f"读取凭据文件失败: {e}")
+    return args
 
 def parse_draw_command(command):
-    """解析绘图命令及参数"""
-    # 解析主命令和参数
+    """解析绘图命令及参数
+
+    示例:
+        >>> parse_draw_command("/draw 山间日出 --style 水彩 --seed 42 --steps 30")
+        ('山间日出', {'style': '水彩', 'seed': '42', 'steps': '30'})
+        >>> parse_draw_command("/draw 一只猫")
+        ('一只猫', {})
+    """
+    # 解析主命令和参数，参数值之后的 "--" 只向前查看，不被消耗，相邻的参数都能匹配
     command_pattern = r'^/draw\s+(.+?)(?:\s+--\w+|$)'
-    param_pattern = r'--(\w+)\s+([^-][^-]*?)(?:\s+--|$)'
+    param_pattern = r'--(\w+)\s+([^-][^-]*?)(?=\s+--|$)'
     
     command_match = re.search(command_pattern, command, re.DOTALL)
     if not command_match:
@@ -112,11 +169,142 @@ def parse_draw_command(command):
     
     return prompt, params
 
-def run_drawing_mode(args):
-    """运行绘画模式"""
-    # 初始化API客户端
-    vivo_art = VivoArtAPI(args.app_id, args.app_key)
+def create_transport(args):
+    """根据命令行参数创建共享的HTTP传输层"""
+    # 批量模式下连接池至少要容纳所有并发请求
+    pool_size = max(args.pool_size, args.concurrency) if args.batch or args.draw_batch else args.pool_size
+    return HttpTransport(
+        pool_maxsize=pool_size,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        keep_alive=not args.no_keep_alive,
+        retry_policy=RetryPolicy(
+            max_attempts=args.max_retries + 1,
+            deadline=args.retry_deadline,
+            limiter=RateLimiter(max_limit=args.max_concurrency, endpoint_rates=args.endpoint_rates)
+        ),
+        hedge_policy=HedgePolicy(args.hedge_percentile, args.hedge_budget) if args.hedge else None
+    )
+
+def create_cache(args):
+    """根据命令行参数创建响应缓存，未启用时返回None"""
+    if not args.cache:
+        return None
+    return ResponseCache(ttl=args.cache_ttl)
+
+def print_stats(command):
+    """处理 /stats 命令，显示或导出进程内的性能指标
+
+    Args:
+        command: 完整命令，支持 /stats、/stats json、/stats prometheus
+    """
+    registry = get_default_registry()
+    parts = command.split()
+    fmt = parts[1].lower() if len(parts) > 1 else ""
+    if fmt == "json":
+        print(registry.to_json())
+    elif fmt in ("prom", "prometheus"):
+        print(registry.to_prometheus(), end="")
+    elif fmt == "reset":
+        registry.reset()
+        print(f"{Color.YELLOW}已清空性能指标{Color.RESET}")
+    else:
+        print(f"{Color.CYAN}{format_stats_table(registry.snapshot())}{Color.RESET}")
+
+def write_metrics(path):
+    """把性能指标写入文件，.prom 结尾写Prometheus文本，否则写JSON"""
+    if not path:
+        return
+    registry = get_default_registry()
+    content = registry.to_prometheus() if path.endswith(".prom") else registry.to_json()
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    except OSError as e:
+        print(f"{Color.RED}导出性能指标失败: {e}{Color.RESET}")
+
+def create_draw_cache(args):
+    """创建绘画结果索引，--no_draw_cache 时返回None"""
+    if args.no_draw_cache:
+        return None
+    from draw_cache import DrawCache
+    return DrawCache()
+
+def create_art_client(args, transport=None):
+    """创建绘画API客户端，首次调用时导入绘画模块"""
+    from vivogpt_draw import VivoArtAPI
+    vivo_art = VivoArtAPI(args.app_id, args.app_key, transport, credentials=args.credential_pool, base_url=args.base_url,
+                          cache=create_draw_cache(args))
     vivo_art.set_debug_mode(args.debug)
+    return vivo_art
+
+def get_art_client(args, transport=None):
+    """返回绘画任务调度器和绘画目录共用的绘画API客户端，首次调用时创建"""
+    if args.art_client is None:
+        args.art_client = create_art_client(args, transport)
+    return args.art_client
+
+def get_draw_scheduler(args, transport=None):
+    """返回绘画模式和聊天模式共用的后台任务调度器，首次调用时创建"""
+    if args.draw_scheduler is None:
+        from draw_scheduler import DrawScheduler
+        from draw_ui import print_job_finished
+        args.draw_scheduler = DrawScheduler(get_art_client(args, transport), DEFAULT_DRAWING_SETTINGS['output_dir'],
+                                            on_finish=print_job_finished)
+    return args.draw_scheduler
+
+def get_draw_catalog(args, transport=None):
+    """返回绘画风格和推荐提示词目录，首次调用时从磁盘加载，过期的目录在后台刷新"""
+    if args.draw_catalog is None:
+        from draw_catalog import DrawCatalog
+        args.draw_catalog = DrawCatalog(get_art_client(args, transport), ttl=args.catalog_ttl)
+        args.draw_catalog.refresh_async()
+    return args.draw_catalog
+
+def create_vision_client(args, transport=None):
+    """创建图片分析API客户端，首次调用时导入图片分析模块"""
+    from vivogpt_vision import VivoVisionAPI
+    vivo_vision = VivoVisionAPI(args.app_id, args.app_key, transport, credentials=args.credential_pool,
+                                base_url=args.base_url)
+    vivo_vision.set_debug_mode(args.debug)
+    return vivo_vision
+
+def create_speech_client(args):
+    """创建语音识别API客户端，首次调用时导入语音模块(含 pyaudio 和 websocket)"""
+    from vivogpt_speech import VivoSpeechAPI
+    vivo_speech = VivoSpeechAPI(args.app_id, args.app_key, credentials=args.credential_pool, base_url=args.base_url)
+    vivo_speech.set_debug_mode(args.debug)
+    return vivo_speech
+
+def retry_draw_downloads(scheduler, command):
+    """处理 /download [任务ID] 命令
+
+    未指定任务ID时重新下载调度器中所有图片未下载完的任务；指定的任务不在调度器中时
+    (例如之前运行时提交的任务)交给调度器跟踪，查询到已完成后自动下载。
+
+    Returns:
+        重新开始下载或开始跟踪的任务列表
+    """
+    parts = command.split(" ", 1)
+    task_id = parts[1].strip() if len(parts) > 1 and parts[1].strip() else None
+    if task_id is not None and scheduler.get(task_id) is None:
+        return [scheduler.track(task_id)]
+    return scheduler.retry_downloads(task_id)
+
+def run_drawing_mode(args, transport=None):
+    """运行绘画模式"""
+    from draw_ui import (
+        print_drawing_welcome, print_drawing_prompt, print_styles, print_prompts,
+        print_task_submitted, print_task_progress, print_task_canceled, print_image_saved,
+        print_drawing_settings, print_help_drawing, print_jobs, print_download_retry,
+        print_draw_history
+    )
+    
+    # 提交的任务交给后台调度器查询进度和下载图片
+    scheduler = get_draw_scheduler(args, transport)
+    vivo_art = scheduler.vivo_art
+    # 风格和推荐提示词从本地目录读取
+    catalog = get_draw_catalog(args, transport)
     
     # 初始化绘画设置
     drawing_settings = DEFAULT_DRAWING_SETTINGS.copy()
@@ -130,8 +318,6 @@ def run_drawing_mode(args):
     print_drawing_welcome()
     
     # 绘画模式主循环
-    active_tasks = {}  # 记录活跃任务，键为任务ID，值为任务信息
-    
     try:
         while True:
             command = print_drawing_prompt()
@@ -156,21 +342,24 @@ def run_drawing_mode(args):
             
             # 查看风格列表
             if command.lower() in ['styles', '/styles']:
-                styles = vivo_art.get_styles()
-                print_styles(styles)
+                print_styles(catalog.get_styles())
                 
                 # 更新可用风格到设置中
-                if styles and styles.get("code") == 200 and styles.get("result"):
-                    for style in styles["result"]:
-                        if style.get("style_id") == drawing_settings["style_id"]:
-                            drawing_settings["style_name"] = style.get("style_name", "默认")
+                style = catalog.find_style(drawing_settings["style_id"])
+                if style is not None:
+                    drawing_settings["style_name"] = style.get("style_name", "默认")
                 
                 continue
             
-            # 查看推荐提示词
-            if command.lower() in ['prompts', '/prompts']:
-                prompts = vivo_art.get_prompts()
-                print_prompts(prompts)
+            # 查看或搜索推荐提示词
+            if command.lower() in ['prompts', '/prompts'] or command.lower().startswith(("prompts ", "/prompts ")):
+                query = command.split(" ", 1)[1].strip() if " " in command else ""
+                print_prompts(catalog.get_prompts(query), query)
+                continue
+            
+            # 查看后台任务
+            if command.lower() in ['jobs', '/jobs']:
+                print_jobs(scheduler.jobs())
                 continue
             
             # 查询任务状态
@@ -179,23 +368,38 @@ def run_drawing_mode(args):
                 response = vivo_art.query_task_progress(task_id)
                 finished, image_urls = print_task_progress(response)
                 
-                # 如果任务完成，保存图片
-                if finished and image_urls:
+                # 如果任务完成且不在后台调度器中，并行保存图片
+                if finished and image_urls and scheduler.get(task_id) is None:
                     print(f"\n{Color.CYAN}正在下载图片...{Color.RESET}")
-                    for i, url in enumerate(image_urls):
-                        filepath = vivo_art.download_image(
-                            url, 
-                            drawing_settings['output_dir'], 
-                            f"drawing_{task_id}_{i}.jpg"
-                        )
+                    results = vivo_art.download_images(
+                        image_urls,
+                        drawing_settings['output_dir'],
+                        [f"drawing_{task_id}_{i}.jpg" for i in range(len(image_urls))]
+                    )
+                    files = vivo_art.remember_result(
+                        task_id, "", {}, image_urls, [result.filepath if result.ok else None for result in results],
+                        {result.filepath: result.sha256 for result in results if result.ok}
+                    )
+                    for filepath in files:
                         print_image_saved(filepath)
                 
                 continue
             
+            # 搜索绘画历史
+            if command.lower() in ['history', '/history'] or command.lower().startswith(("history ", "/history ")):
+                keyword = command.split(" ", 1)[1].strip() if " " in command else ""
+                print_draw_history(vivo_art.cache.search(keyword) if vivo_art.cache is not None else None, keyword)
+                continue
+            
+            # 重新下载已完成任务中未下载的图片
+            if command.lower() in ['download', '/download'] or command.lower().startswith(("download ", "/download ")):
+                print_download_retry(retry_draw_downloads(scheduler, command))
+                continue
+            
             # 取消任务
             if command.lower().startswith("cancel ") or command.lower().startswith("/cancel "):
                 task_id = command.split(" ", 1)[1].strip()
-                response = vivo_art.cancel_task(task_id)
+                response = scheduler.cancel(task_id)
                 print_task_canceled(response)
                 continue
             
@@ -240,8 +444,8 @@ def run_drawing_mode(args):
                     print(f"{Color.YELLOW}正确格式: /draw <提示词> [--参数 值]{Color.RESET}")
                     continue
                 
-                # 处理参数
-                style = params.get('style', drawing_settings['style_id'])
+                # 处理参数，风格可以是ID或名称
+                style = catalog.resolve_style(params.get('style', drawing_settings['style_id']))
                 width = int(params.get('width', drawing_settings['width']))
                 height = int(params.get('height', drawing_settings['height']))
                 cfg_scale = float(params.get('cfg', drawing_settings['cfg_scale']))
@@ -251,7 +455,7 @@ def run_drawing_mode(args):
                 
                 # 提交绘画任务
                 print(f"\n{Color.CYAN}正在提交绘画任务...{Color.RESET}")
-                response = vivo_art.submit_drawing_task(
+                response, _ = scheduler.submit(
                     prompt=prompt,
                     style_config=style,
                     height=height,
@@ -263,13 +467,7 @@ def run_drawing_mode(args):
                 )
                 
                 # 打印提交结果
-                task_id = print_task_submitted(response)
-                if task_id:
-                    active_tasks[task_id] = {
-                        'prompt': prompt,
-                        'time': time.time()
-                    }
-                
+                print_task_submitted(response)
                 continue
             
             # 直接作为提示词处理
@@ -277,7 +475,7 @@ def run_drawing_mode(args):
                 # 使用默认设置进行绘图
                 print(f"\n{Color.CYAN}使用提示词: '{command}' 创建绘图任务...{Color.RESET}")
                 
-                response = vivo_art.submit_drawing_task(
+                response, _ = scheduler.submit(
                     prompt=command,
                     style_config=drawing_settings['style_id'],
                     height=drawing_settings['height'],
@@ -287,13 +485,7 @@ def run_drawing_mode(args):
                 )
                 
                 # 打印提交结果
-                task_id = print_task_submitted(response)
-                if task_id:
-                    active_tasks[task_id] = {
-                        'prompt': command,
-                        'time': time.time()
-                    }
-                
+                print_task_submitted(response)
                 continue
             
             # 未识别的命令
@@ -304,11 +496,40 @@ def run_drawing_mode(args):
         print(f"{Color.YELLOW}\n返回聊天模式...{Color.RESET}")
         return
 
-def run_vision_mode(args):
+def run_draw_batch_mode(args, transport=None):
+    """批量绘画：按提示词文件和参数扫描提交任务，结果清单写入 --out"""
+    from draw_batch import read_draw_prompts, expand_items, run_draw_batch
+    settings = DEFAULT_DRAWING_SETTINGS
+    defaults = {
+        'style_config': settings['style_id'],
+        'width': settings['width'],
+        'height': settings['height'],
+        'cfg_scale': settings['cfg_scale'],
+        'steps': settings['steps']
+    }
+    items = expand_items(read_draw_prompts(args.draw_batch), args.sweep_params, defaults)
+    # 风格可以写名称，按本地目录解析为ID
+    catalog = get_draw_catalog(args, transport)
+    items = ((key, prompt, dict(params, style_config=catalog.resolve_style(params.get('style_config'))))
+             for key, prompt, params in items)
+    try:
+        run_draw_batch(get_art_client(args, transport), items, args.out, args.concurrency, args.queue_limit,
+                       settings['output_dir'])
+    finally:
+        transport.close()
+        write_metrics(args.metrics_out)
+
+def run_vision_mode(args, transport=None):
     """运行图片分析模式"""
+    from vision_ui import (
+        print_vision_welcome, print_vision_prompt, print_models, print_examples,
+        print_browse_images, analyzing_spinner, print_image_info, print_analysis_result,
+        print_streaming_analysis_result, print_help_vision,
+        parse_analyze_command, parse_browse_command, parse_set_model_command
+    )
+    
     # 初始化API客户端
-    vivo_vision = VivoVisionAPI(args.app_id, args.app_key)
-    vivo_vision.set_debug_mode(args.debug)
+    vivo_vision = create_vision_client(args, transport)
     
     # 初始化图片分析设置
     vision_settings = DEFAULT_VISION_SETTINGS.copy()
@@ -387,22 +608,28 @@ def run_vision_mode(args):
                 # 分析图片
                 print(f"{Color.CYAN}使用提示词: '{prompt}' 分析图片...{Color.RESET}")
                 
-                # 显示分析动画
-                print_analyzing_animation(3)
-                
-                # 根据设置决定是否使用流式输出
+                # 根据设置决定是否使用流式输出，请求进行期间显示分析动画
+                deadline = Deadline()
                 if vision_settings['use_stream']:
                     # 流式输出
                     try:
-                        chunks = vivo_vision.analyze_image_stream(image_path, prompt)
+                        with analyzing_spinner():
+                            chunks = prefetch_first_chunk(vivo_vision.analyze_image_stream(image_path, prompt, deadline))
                         result = print_streaming_analysis_result(chunks)
+                    except KeyboardInterrupt:
+                        deadline.cancel()
+                        print(f"{Color.YELLOW}\n中断当前分析{Color.RESET}")
                     except Exception as e:
                         print(f"{Color.RED}图片分析失败: {str(e)}{Color.RESET}")
                 else:
                     # 同步输出
                     try:
-                        result = vivo_vision.analyze_image_sync(image_path, prompt)
+                        with analyzing_spinner():
+                            result = vivo_vision.analyze_image_sync(image_path, prompt, deadline)
                         print_analysis_result(result)
+                    except KeyboardInterrupt:
+                        deadline.cancel()
+                        print(f"{Color.YELLOW}\n中断当前分析{Color.RESET}")
                     except Exception as e:
                         print(f"{Color.RED}图片分析失败: {str(e)}{Color.RESET}")
                 
@@ -418,22 +645,28 @@ def run_vision_mode(args):
                 prompt = vision_settings['default_prompt']
                 print(f"{Color.CYAN}使用默认提示词: '{prompt}' 分析图片...{Color.RESET}")
                 
-                # 显示分析动画
-                print_analyzing_animation(3)
-                
-                # 根据设置决定是否使用流式输出
+                # 根据设置决定是否使用流式输出，请求进行期间显示分析动画
+                deadline = Deadline()
                 if vision_settings['use_stream']:
                     # 流式输出
                     try:
-                        chunks = vivo_vision.analyze_image_stream(command, prompt)
+                        with analyzing_spinner():
+                            chunks = prefetch_first_chunk(vivo_vision.analyze_image_stream(command, prompt, deadline))
                         result = print_streaming_analysis_result(chunks)
+                    except KeyboardInterrupt:
+                        deadline.cancel()
+                        print(f"{Color.YELLOW}\n中断当前分析{Color.RESET}")
                     except Exception as e:
                         print(f"{Color.RED}图片分析失败: {str(e)}{Color.RESET}")
                 else:
                     # 同步输出
                     try:
-                        result = vivo_vision.analyze_image_sync(command, prompt)
+                        with analyzing_spinner():
+                            result = vivo_vision.analyze_image_sync(command, prompt, deadline)
                         print_analysis_result(result)
+                    except KeyboardInterrupt:
+                        deadline.cancel()
+                        print(f"{Color.YELLOW}\n中断当前分析{Color.RESET}")
                     except Exception as e:
                         print(f"{Color.RED}图片分析失败: {str(e)}{Color.RESET}")
                 
@@ -449,9 +682,14 @@ def run_vision_mode(args):
 
 def run_speech_mode(args):
     """运行语音识别模式"""
+    from speech_ui import (
+        print_speech_welcome, print_speech_prompt, recording_spinner, recognizing_spinner,
+        print_speech_result, print_audio_files, print_save_result, print_help_speech,
+        parse_record_command, parse_recognize_command, parse_save_command, ensure_audio_dir
+    )
+    
     # 初始化API客户端
-    vivo_speech = VivoSpeechAPI(args.app_id, args.app_key)
-    vivo_speech.set_debug_mode(args.debug)
+    vivo_speech = create_speech_client(args)
     
     # 初始化语音识别设置
     speech_settings = DEFAULT_SPEECH_SETTINGS.copy()
@@ -463,8 +701,10 @@ def run_speech_mode(args):
     clear_screen()
     print_speech_welcome()
     
-    # 尝试连接语音识别服务
-    if not vivo_speech.connect():
+    # 尝试连接语音识别服务，预热时在后台建立会话，不阻塞菜单显示
+    if args.prewarm:
+        vivo_speech.prewarm()
+    elif not vivo_speech.connect():
         print(f"{Color.RED}无法连接到语音识别服务，请检查网络连接{Color.RESET}")
     
     # 语音识别模式主循环
@@ -502,15 +742,13 @@ def run_speech_mode(args):
                 duration = parse_record_command(command)
                 
                 if duration is not None:
-                    # 显示录音动画
-                    print_recording_animation(duration)
-                    
-                    # 录音并识别
-                    result = vivo_speech.record_and_recognize(
-                        duration=duration,
-                        sample_rate=speech_settings['sample_rate'],
-                        chunk_size=speech_settings['chunk_size']
-                    )
+                    # 录音并识别，录音和识别期间显示动画
+                    with recording_spinner(duration):
+                        result = vivo_speech.record_and_recognize(
+                            duration=duration,
+                            sample_rate=speech_settings['sample_rate'],
+                            chunk_size=speech_settings['chunk_size']
+                        )
                     
                     # 显示识别结果
                     print_speech_result(result)
@@ -529,14 +767,12 @@ def run_speech_mode(args):
                         print(f"{Color.RED}文件不存在: {file_path}{Color.RESET}")
                         continue
                     
-                    # 显示识别动画
-                    print_recognizing_animation()
-                    
-                    # 识别音频文件
-                    result = vivo_speech.recognize_wav_file(
-                        file_path=file_path,
-                        chunk_size=speech_settings['chunk_size']
-                    )
+                    # 识别音频文件，识别期间显示动画
+                    with recognizing_spinner():
+                        result = vivo_speech.recognize_wav_file(
+                            file_path=file_path,
+                            chunk_size=speech_settings['chunk_size']
+                        )
                     
                     # 显示识别结果
                     print_speech_result(result)
@@ -557,16 +793,14 @@ def run_speech_mode(args):
                     # 构建完整的文件路径
                     output_file = os.path.join(speech_settings['output_dir'], filename)
                     
-                    # 显示录音动画
-                    print_recording_animation(duration)
-                    
-                    # 录音并保存
-                    success = vivo_speech.save_recording(
-                        output_file=output_file,
-                        duration=duration,
-                        sample_rate=speech_settings['sample_rate'],
-                        chunk_size=speech_settings['chunk_size']
-                    )
+                    # 录音并保存，录音期间显示动画
+                    with recording_spinner(duration, "录音结束，正在保存"):
+                        success = vivo_speech.save_recording(
+                            output_file=output_file,
+                            duration=duration,
+                            sample_rate=speech_settings['sample_rate'],
+                            chunk_size=speech_settings['chunk_size']
+                        )
                     
                     # 显示保存结果
                     print_save_result(success, output_file)
@@ -592,29 +826,48 @@ def main():
     # 解析命令行参数
     args = parse_arguments()
     
+    # 所有客户端共享同一个连接池
+    transport = create_transport(args)
+    
+    # 批量模式：不进入交互界面
+    if args.batch:
+        vivo_gpt = VivoGPT(args.app_id, args.app_key, transport, create_cache(args), credentials=args.credential_pool,
+                           base_url=args.base_url)
+        try:
+            run_batch(vivo_gpt, args.batch, args.out, args.concurrency, args.temperature, args.max_tokens)
+        finally:
+            transport.close()
+            write_metrics(args.metrics_out)
+        return
+    
+    # 批量绘画模式：不进入交互界面
+    if args.draw_batch:
+        run_draw_batch_mode(args, transport)
+        return
+    
+    # 欢迎界面渲染和等待输入期间在后台建立连接，首个请求不再等待DNS、TCP和TLS
+    if args.prewarm:
+        transport.prewarm(args.base_url, args.prewarm_connections)
+    
     # 检查是否直接进入绘画模式
     if args.draw:
-        run_drawing_mode(args)
+        run_drawing_mode(args, transport)
     
     # 检查是否直接进入图片分析模式
     if args.vision:
-        run_vision_mode(args)
+        run_vision_mode(args, transport)
     
     # 检查是否直接进入语音识别模式
     if args.speech:
         run_speech_mode(args)
     
     # 初始化API客户端
-    vivo_gpt = VivoGPT(args.app_id, args.app_key)
+    vivo_gpt = VivoGPT(args.app_id, args.app_key, transport, create_cache(args), credentials=args.credential_pool,
+                       base_url=args.base_url)
     vivo_gpt.set_debug_mode(args.debug)
     
-    # 初始化绘画API客户端
-    vivo_art = VivoArtAPI(args.app_id, args.app_key)
-    vivo_art.set_debug_mode(args.debug)
-    
-    # 初始化图片分析API客户端
-    vivo_vision = VivoVisionAPI(args.app_id, args.app_key)
-    vivo_vision.set_debug_mode(args.debug)
+    # 绘画任务调度器和图片分析客户端在聊天模式中首次使用时创建
+    vivo_vision = None
     
     # 是否使用流式输出
     use_stream = not args.no_stream
@@ -622,8 +875,9 @@ def main():
     # 打印欢迎信息
     print_welcome()
     
-    # 保存对话历史
-    messages = []
+    # 保存对话历史，超出token预算时自动压缩
+    summarizer = make_vivogpt_summarizer(vivo_gpt) if args.summarize else None
+    history = ConversationHistory(args.history_budget, args.history_turns, summarizer)
     
     try:
         while True:
@@ -639,17 +893,34 @@ def main():
             if not user_input.strip():
                 continue
             
+            # 显示性能指标
+            if user_input.lower().startswith("/stats"):
+                print_stats(user_input)
+                continue
+            
+            # 查看后台绘画任务
+            if user_input.lower() == "/jobs":
+                from draw_ui import print_jobs
+                print_jobs(args.draw_scheduler.jobs() if args.draw_scheduler else [])
+                continue
+            
+            # 重新下载已完成绘画任务中未下载的图片
+            if user_input.lower() == "/download" or user_input.lower().startswith("/download "):
+                from draw_ui import print_download_retry
+                print_download_retry(retry_draw_downloads(get_draw_scheduler(args, transport), user_input))
+                continue
+            
             # 检查绘画模式切换命令
             if user_input.lower() in ['draw', '/draw']:
                 print(f"{Color.CYAN}切换到绘画模式...{Color.RESET}")
-                run_drawing_mode(args)
+                run_drawing_mode(args, transport)
                 print(f"{Color.CYAN}返回聊天模式...{Color.RESET}")
                 continue
             
             # 检查图片分析模式切换命令
             if user_input.lower() in ['vision', '/vision']:
                 print(f"{Color.CYAN}切换到图片分析模式...{Color.RESET}")
-                run_vision_mode(args)
+                run_vision_mode(args, transport)
                 print(f"{Color.CYAN}返回聊天模式...{Color.RESET}")
                 continue
             
@@ -665,72 +936,52 @@ def main():
                 prompt, params = parse_draw_command(user_input)
                 
                 if prompt:
+                    from draw_ui import drawing_spinner, print_task_submitted
+                    scheduler = get_draw_scheduler(args, transport)
                     print(f"{Color.CYAN}执行绘图命令: {prompt}{Color.RESET}")
                     
-                    # 使用默认参数
-                    style = params.get('style', DEFAULT_DRAWING_SETTINGS['style_id'])
+                    # 使用默认参数，风格可以是ID或名称
+                    style = get_draw_catalog(args, transport).resolve_style(
+                        params.get('style', DEFAULT_DRAWING_SETTINGS['style_id'])
+                    )
                     width = int(params.get('width', DEFAULT_DRAWING_SETTINGS['width']))
                     height = int(params.get('height', DEFAULT_DRAWING_SETTINGS['height']))
                     cfg_scale = float(params.get('cfg', DEFAULT_DRAWING_SETTINGS['cfg_scale']))
                     steps = int(params.get('steps', DEFAULT_DRAWING_SETTINGS['steps']))
+                    seed = int(params.get('seed', -1))
+                    negative_prompt = params.get('negative', '')
                     
-                    # 提交绘画任务
-                    print(f"{Color.CYAN}正在提交绘画任务...{Color.RESET}")
-                    
-                    # 显示绘画动画
-                    print_drawing_animation(3)
-                    
-                    response = vivo_art.submit_drawing_task(
-                        prompt=prompt,
-                        style_config=style,
-                        height=height,
-                        width=width,
-                        cfg_scale=cfg_scale,
-                        steps=steps
-                    )
+                    # 提交绘画任务，请求进行期间显示动画
+                    with drawing_spinner("正在提交绘画任务"):
+                        response, job = scheduler.submit(
+                            prompt=prompt,
+                            style_config=style,
+                            height=height,
+                            width=width,
+                            seed=seed,
+                            cfg_scale=cfg_scale,
+                            steps=steps,
+                            negative_prompt=negative_prompt
+                        )
                     
-                    # 打印任务提交结果
-                    task_id = print_task_submitted(response)
+                    # 打印任务提交结果，任务由后台调度器查询进度并下载图片
+                    print_task_submitted(response)
                     
-                    if task_id:
-                        # 询问是否等待结果
+                    if job is not None:
+                        # 询问是否等待结果，不等待时完成后会打印通知
                         print(f"{Color.YELLOW}是否等待绘画结果? (y/n){Color.RESET}")
                         if input().lower() == 'y':
-                            print(f"{Color.CYAN}等待绘画完成，可能需要一些时间...{Color.RESET}")
-                            
-                            # 每5秒查询一次进度
-                            wait_time = 0
-                            while wait_time < 300:  # 最多等待5分钟
-                                progress_response = vivo_art.query_task_progress(task_id)
-                                finished, image_urls = print_task_progress(progress_response)
-                                
-                                if finished:
-                                    # 下载图片
-                                    print(f"\n{Color.CYAN}正在下载图片...{Color.RESET}")
-                                    for i, url in enumerate(image_urls):
-                                        output_dir = DEFAULT_DRAWING_SETTINGS['output_dir']
-                                        if not os.path.exists(output_dir):
-                                            os.makedirs(output_dir)
-                                        
-                                        filepath = vivo_art.download_image(
-                                            url, 
-                                            output_dir, 
-                                            f"drawing_{task_id}_{i}.jpg"
-                                        )
-                                        print_image_saved(filepath)
-                                    break
-                                
-                                # 显示等待动画
-                                print_drawing_animation(5)
-                                wait_time += 5
-                            
-                            if wait_time >= 300:
-                                print(f"{Color.YELLOW}等待超时，请稍后使用 '/draw status {task_id}' 查询任务状态{Color.RESET}")
+                            try:
+                                with drawing_spinner("AI绘画进行中，按 Ctrl-C 转入后台"):
+                                    job.future.result()
+                            except KeyboardInterrupt:
+                                print(f"{Color.YELLOW}\n任务转入后台，完成后自动下载，使用 '/jobs' 查看{Color.RESET}")
                     
                     continue
             
             # 处理图片分析命令，直接在聊天模式执行
             if user_input.lower().startswith("/analyze "):
+                from vision_ui import parse_analyze_command, print_image_info, analyzing_spinner, print_analysis_result
                 image_path, prompt = parse_analyze_command(user_input)
                 
                 if image_path:
@@ -738,15 +989,19 @@ def main():
                     if not print_image_info(image_path):
                         continue
                     
+                    if vivo_vision is None:
+                        vivo_vision = create_vision_client(args, transport)
                     print(f"{Color.CYAN}执行图片分析命令: {prompt}{Color.RESET}")
                     
-                    # 显示分析动画
-                    print_analyzing_animation(3)
-                    
-                    # 使用同步方式分析图片
+                    # 使用同步方式分析图片，请求进行期间显示动画，Ctrl-C 只中断本次分析
+                    deadline = Deadline()
                     try:
-                        result = vivo_vision.analyze_image_sync(image_path, prompt)
+                        with analyzing_spinner():
+                            result = vivo_vision.analyze_image_sync(image_path, prompt, deadline)
                         print_analysis_result(result)
+                    except KeyboardInterrupt:
+                        deadline.cancel()
+                        print(f"{Color.YELLOW}\n中断当前分析{Color.RESET}")
                     except Exception as e:
                         print(f"{Color.RED}图片分析失败: {str(e)}{Color.RESET}")
                     
@@ -754,26 +1009,24 @@ def main():
             
             # 处理语音识别命令，直接在聊天模式执行
             if user_input.lower().startswith("/record"):
+                from speech_ui import parse_record_command, recording_spinner, print_speech_result
                 duration = parse_record_command(user_input)
                 
                 if duration is not None:
                     print(f"{Color.CYAN}执行语音识别命令: 录音{duration}秒并识别{Color.RESET}")
                     
                     # 初始化语音识别API
-                    vivo_speech = VivoSpeechAPI(args.app_id, args.app_key)
-                    vivo_speech.set_debug_mode(args.debug)
+                    vivo_speech = create_speech_client(args)
                     
                     # 连接服务
                     if vivo_speech.connect():
-                        # 显示录音动画
-                        print_recording_animation(duration)
-                        
-                        # 录音并识别
-                        result = vivo_speech.record_and_recognize(
-                            duration=duration,
-                            sample_rate=DEFAULT_SPEECH_SETTINGS['sample_rate'],
-                            chunk_size=DEFAULT_SPEECH_SETTINGS['chunk_size']
-                        )
+                        # 录音并识别，录音和识别期间显示动画
+                        with recording_spinner(duration):
+                            result = vivo_speech.record_and_recognize(
+                                duration=duration,
+                                sample_rate=DEFAULT_SPEECH_SETTINGS['sample_rate'],
+                                chunk_size=DEFAULT_SPEECH_SETTINGS['chunk_size']
+                            )
                         
                         # 显示识别结果
                         print_speech_result(result)
@@ -789,56 +1042,60 @@ def main():
             print_user_message(user_input)
             
             # 添加到对话历史
-            messages.append({"role": "user", "content": user_input})
+            history.add_user(user_input)
             
-            # 处理单轮还是多轮对话
+            # 处理单轮还是多轮对话，Ctrl-C 时通过令牌关闭正在读取的连接
+            ai_reply = ""
+            deadline = Deadline()
             try:
-                print_thinking()
+                # 超出token预算时压缩历史
+                messages = history.prepare()
+                if history.last_compaction:
+                    print_history_compacted(history.last_compaction)
                 
-                if len(messages) > 1:
-                    # 多轮对话
-                    if use_stream:
-                        # 流式输出
-                        response = vivo_gpt.chat_with_history(messages, args.temperature, args.max_tokens, stream=True)
-                        chunks = process_stream_response(response)
-                        ai_reply = print_streaming_ai_message(chunks)
-                        messages.append({"role": "assistant", "content": ai_reply})
+                # 请求发出到首个片段到达期间显示思考动画
+                with thinking_spinner():
+                    if len(messages) > 1:
+                        # 多轮对话
+                        response = vivo_gpt.chat_with_history(messages, args.temperature, args.max_tokens,
+                                                              stream=use_stream, deadline=deadline)
                     else:
-                        # 同步输出
-                        response = vivo_gpt.chat_with_history(messages, args.temperature, args.max_tokens)
-                        if response.get('code') == 0 and response.get('data'):
-                            ai_reply = response['data']['content']
-                            print_ai_message(ai_reply)
-                            messages.append({"role": "assistant", "content": ai_reply})
-                        else:
-                            print(f"{Color.RED}错误：{json.dumps(response, ensure_ascii=False)}{Color.RESET}")
-                else:
-                    # 单轮对话
+                        # 单轮对话
+                        response = vivo_gpt.chat(user_input, args.temperature, args.max_tokens,
+                                                 stream=use_stream, deadline=deadline)
                     if use_stream:
-                        # 流式输出
-                        response = vivo_gpt.chat(user_input, args.temperature, args.max_tokens, stream=True)
-                        chunks = process_stream_response(response)
-                        ai_reply = print_streaming_ai_message(chunks)
-                        messages.append({"role": "assistant", "content": ai_reply})
+                        deltas = prefetch_first_chunk(process_stream_response(response))
+                
+                if use_stream:
+                    # 边解析边渲染，收到首个片段即开始输出
+                    ai_reply = print_streaming_ai_message(deltas)
+                else:
+                    # 同步输出
+                    if response.get('code') == 0 and response.get('data'):
+                        ai_reply = response['data']['content']
+                        print_ai_message(ai_reply)
                     else:
-                        # 同步输出
-                        response = vivo_gpt.chat(user_input, args.temperature, args.max_tokens)
-                        if response.get('code') == 0 and response.get('data'):
-                            ai_reply = response['data']['content']
-                            print_ai_message(ai_reply)
-                            messages.append({"role": "assistant", "content": ai_reply})
-                        else:
-                            print(f"{Color.RED}错误：{json.dumps(response, ensure_ascii=False)}{Color.RESET}")
+                        print(f"{Color.RED}错误：{json.dumps(response, ensure_ascii=False)}{Color.RESET}")
                 
             except KeyboardInterrupt:
+                deadline.cancel()
                 print(f"{Color.YELLOW}\n中断当前生成{Color.RESET}")
-                continue
             except Exception as e:
                 print(f"{Color.RED}发生错误：{str(e)}{Color.RESET}")
-                continue
+            
+            # 记录回复；没有得到回复时丢弃本轮提问，保持user/assistant交替
+            if ai_reply:
+                history.add_assistant(ai_reply)
+            else:
+                history.discard_last_user()
     
     except KeyboardInterrupt:
         print(f"{Color.YELLOW}\n感谢使用蓝心大模型聊天助手，再见！{Color.RESET}")
+    finally:
+        if args.draw_scheduler is not None:
+            args.draw_scheduler.close()
+        transport.close()
+        write_metrics(args.metrics_out)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
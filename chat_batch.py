@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def read_prompts(input_path):
+    """逐行读取JSONL格式的提示词文件
+
+    每行是一个JSON对象，包含 "prompt" 或多轮对话 "messages"，
+    可选 "id"、"temperature"、"max_tokens"。未提供 id 时使用行号。
+
+    Args:
+        input_path: 输入文件路径
+
+    Yields:
+        (id, record) 元组
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                yield line_no, {"invalid": line}
+                continue
+            if not isinstance(record, dict):
+                record = {"prompt": str(record)}
+            yield record.get("id", line_no), record
+
+def load_completed_ids(output_path):
+    """读取已有输出文件中成功完成的ID，用于断点续跑
+
+    Args:
+        output_path: 输出文件路径
+
+    Returns:
+        已完成ID的字符串集合
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # 上次运行中断时可能留下半行
+                continue
+            if isinstance(result, dict) and "id" in result and "error" not in result:
+                completed.add(str(result["id"]))
+    return completed
+
+def truncate_partial_line(output_path, chunk_size=4096):
+    """截掉输出文件末尾上次运行中断时留下的半行，之后追加的记录从新的一行开始
+
+    Args:
+        output_path: 输出文件路径
+        chunk_size: 从文件末尾向前查找换行符时每次读取的字节数
+    """
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            chunk = f.read(position - start)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+def run_one(vivo_gpt, item_id, record, temperature, max_tokens):
+    """执行单条提示词
+
+    Args:
+        vivo_gpt: VivoGPT 客户端
+        item_id: 条目ID
+        record: 输入记录
+        temperature: 默认温度参数
+        max_tokens: 默认最大生成长度
+
+    Returns:
+        写入输出文件的结果字典
+    """
+    result = {"id": item_id}
+    if "invalid" in record:
+        result["error"] = "无效的JSON行"
+        return result
+
+    temperature = record.get("temperature", temperature)
+    max_tokens = record.get("max_tokens", max_tokens)
+    start_time = time.time()
+    try:
+        if record.get("messages"):
+            response = vivo_gpt.chat_with_history(record["messages"], temperature, max_tokens)
+        elif record.get("prompt"):
+            response = vivo_gpt.chat(record["prompt"], temperature, max_tokens)
+        else:
+            result["error"] = "缺少 prompt 或 messages 字段"
+            return result
+    except Exception as e:
+        result["error"] = str(e)
+        result["latency"] = round(time.time() - start_time, 3)
+        return result
+
+    result["latency"] = round(time.time() - start_time, 3)
+    if response.get("code") == 0 and response.get("data"):
+        result["reply"] = response["data"].get("content", "")
+    else:
+        result["error"] = response.get("msg", "未知错误")
+        result["code"] = response.get("code")
+    return result
+
+def run_batch(vivo_gpt, input_path, output_path, concurrency=4, temperature=0.7, max_tokens=2048):
+    """批量执行提示词文件
+
+    输入按行流式读取，同时在途的请求数不超过 2*concurrency；
+    每条结果完成后立即逐行追加到输出文件，已成功的ID在重跑时自动跳过。
+
+    Args:
+        vivo_gpt: VivoGPT 客户端
+        input_path: 输入JSONL文件路径
+        output_path: 输出JSONL文件路径
+        concurrency: 并发工作线程数
+        temperature: 默认温度参数
+        max_tokens: 默认最大生成长度
+
+    Returns:
+        统计信息字典
+    """
+    completed = load_completed_ids(output_path)
+    truncate_partial_line(output_path)
+    stats = {"skipped": 0, "succeeded": 0, "failed": 0}
+    start_time = time.time()
+
+    write_lock = threading.Lock()
+    # 限制在途请求数量，避免把整个输入文件读入内存
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    def write_result(out, future):
+        # 在完成请求的工作线程中立即写出，中断时已完成的结果都已落盘
+        try:
+            result = future.result()
+            with write_lock:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                stats["failed" if "error" in result else "succeeded"] += 1
+        finally:
+            slots.release()
+
+    with open(output_path, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for item_id, record in read_prompts(input_path):
+            if str(item_id) in completed:
+                stats["skipped"] += 1
+                continue
+
+            slots.acquire()
+            future = executor.submit(run_one, vivo_gpt, item_id, record, temperature, max_tokens)
+            future.add_done_callback(lambda future: write_result(out, future))
+
+    stats["elapsed"] = round(time.time() - start_time, 3)
+    print(f"批量执行完成: 成功 {stats['succeeded']}，失败 {stats['failed']}，"
+          f"跳过 {stats['skipped']}，耗时 {stats['elapsed']}秒", file=sys.stderr)
+    return stats
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import math
+import re
+
+# 默认配置
+DEFAULT_TOKEN_BUDGET = 6000      # 模型输入上限为7k，预留余量
+DEFAULT_SUMMARY_MAX_TOKENS = 300
+MESSAGE_OVERHEAD_TOKENS = 4      # 每条消息的角色和分隔符开销
+
+# 中日韩文字和全角符号，大致每个字符对应一个token
+_CJK_PATTERN = re.compile(
+    '[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff'
+    '\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]'
+)
+
+SUMMARY_PROMPT = (
+    "请用简洁的中文概括以下对话的要点，保留关键事实、用户的要求和已经得出的结论，"
+    "不超过200字，只输出摘要本身：\n\n{conversation}"
+)
+SUMMARY_USER_PREFIX = "以下是我们之前对话的摘要，请在后续回答中参考：\n"
+SUMMARY_ACK = "好的，我已了解之前的对话内容。"
+
+def estimate_tokens(text):
+    """估算文本的token数
+
+    中日韩字符按每字一个token计算，其余字符按每4个字符一个token计算。
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + math.ceil(other_count / 4)
+
+def estimate_messages_tokens(messages):
+    """估算消息列表的token数"""
+    return sum(estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+def make_vivogpt_summarizer(vivo_gpt, max_tokens=DEFAULT_SUMMARY_MAX_TOKENS):
+    """创建使用蓝心大模型生成摘要的函数
+
+    Args:
+        vivo_gpt: VivoGPT 客户端
+        max_tokens: 摘要的最大生成长度
+
+    Returns:
+        summarizer(conversation_text) -> 摘要文本，失败时返回None
+    """
+    def summarize(conversation):
+        response = vivo_gpt.chat(SUMMARY_PROMPT.format(conversation=conversation),
+                                 temperature=0.3, max_tokens=max_tokens)
+        if response.get("code") == 0 and response.get("data"):
+            return response["data"].get("content", "").strip() or None
+        return None
+    return summarize
+
+class ConversationHistory:
+    """带token预算的多轮对话历史
+
+    历史按 user/assistant 交替保存。发送前若估算的token数超出预算，
+    从最早的一轮开始整轮丢弃（滑动窗口）；配置了摘要函数时，
+    被丢弃的轮次会和已有摘要一起压缩成一段摘要放在对话开头。
+    """
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, max_turns=None, summarizer=None):
+        """初始化对话历史
+
+        Args:
+            token_budget: 发送给模型的消息总token预算
+            max_turns: 最多保留的历史轮数，None表示只受token预算限制
+            summarizer: 摘要函数，接收对话文本返回摘要，None表示直接丢弃旧轮次
+        """
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.summarizer = summarizer
+        self.messages = []
+        self.summary = None
+        self.last_compaction = None
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add_user(self, content):
+        """添加用户消息"""
+        self.messages.append({"role": "user", "content": content})
+
+    def add_assistant(self, content):
+        """添加AI回复"""
+        self.messages.append({"role": "assistant", "content": content})
+
+    def discard_last_user(self):
+        """丢弃最后一条未得到回复的用户消息，保持角色交替"""
+        if self.messages and self.messages[-1]["role"] == "user":
+            self.messages.pop()
+
+    def clear(self):
+        """清空历史和摘要"""
+        self.messages = []
+        self.summary = None
+        self.last_compaction = None
+
+    def payload(self):
+        """构建发送给模型的消息列表（摘要 + 历史）"""
+        if not self.summary:
+            return list(self.messages)
+        return [
+            {"role": "user", "content": SUMMARY_USER_PREFIX + self.summary},
+            {"role": "assistant", "content": SUMMARY_ACK}
+        ] + self.messages
+
+    def _over_limit(self):
+        """判断当前历史是否超出轮数或token预算"""
+        if self.max_turns is not None and len(self.messages) > self.max_turns * 2 + 1:
+            return True
+        return estimate_messages_tokens(self.payload()) > self.token_budget
+
+    def _drop_oldest_turns(self):
+        """从最早的一轮开始丢弃，直到满足限制或只剩当前消息"""
+        dropped = []
+        while len(self.messages) >= 3 and self._over_limit():
+            dropped.extend(self.messages[:2])
+            del self.messages[:2]
+        return dropped
+
+    def _summary_source(self, dropped):
+        """把已有摘要和被丢弃的轮次拼成待摘要文本"""
+        lines = []
+        if self.summary:
+            lines.append(f"之前的摘要: {self.summary}")
+        for message in dropped:
+            speaker = "用户" if message["role"] == "user" else "蓝心"
+            lines.append(f"{speaker}: {message['content']}")
+        return "\n".join(lines)
+
+    def prepare(self):
+        """按预算压缩历史并返回要发送的消息列表
+
+        每次压缩的结果记录在 last_compaction 中，未压缩时为None。
+
+        Returns:
+            消息列表
+        """
+        self.last_compaction = None
+        if not self._over_limit():
+            return self.payload()
+
+        before_tokens = estimate_messages_tokens(self.payload())
+        dropped = self._drop_oldest_turns()
+
+        summarized = False
+        if dropped and self.summarizer:
+            try:
+                summary = self.summarizer(self._summary_source(dropped))
+            except Exception:
+                summary = None
+            if summary:
+                self.summary = summary
+                summarized = True
+                # 摘要本身也占预算，必要时继续丢弃旧轮次（不再重复摘要）
+                dropped.extend(self._drop_oldest_turns())
+                if self._over_limit():
+                    self.summary = None
+                    summarized = False
+
+        after_tokens = estimate_messages_tokens(self.payload())
+        if dropped or summarized:
+            self.last_compaction = {
+                "before_tokens": before_tokens,
+                "after_tokens": after_tokens,
+                "saved_tokens": before_tokens - after_tokens,
+                "dropped_messages": len(dropped),
+                "summarized": summarized
+            }
+        return self.payload()
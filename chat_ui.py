@@ -4,6 +4,8 @@
 import os
 import time
 import sys
+import threading
+from itertools import chain
 
 # ANSI转义码-颜色常量
 class Color:
@@ -74,7 +76,10 @@ def print_welcome():
     print(f"{Color.GRAY}● 输入 'exit' 或 'quit' 退出对话{Color.RESET}")
     print(f"{Color.GRAY}● 输入 '/draw' 进入绘画模式{Color.RESET}")
     print(f"{Color.GRAY}● 输入 '/vision' 进入图片分析模式{Color.RESET}")
-    print(f"{Color.GRAY}● 输入 '/speech' 进入语音识别模式{Color.RESET}\n")
+    print(f"{Color.GRAY}● 输入 '/speech' 进入语音识别模式{Color.RESET}")
+    print(f"{Color.GRAY}● 输入 '/jobs' 查看后台绘画任务{Color.RESET}")
+    print(f"{Color.GRAY}● 输入 '/download [任务ID]' 重新下载未下载完的绘画图片{Color.RESET}")
+    print(f"{Color.GRAY}● 输入 '/stats' 查看请求耗时统计{Color.RESET}\n")
 
 def print_user_message(message):
     """打印用户消息，带颜色和头像"""
@@ -90,13 +95,106 @@ def print_ai_message(message):
     print(f"{Color.BRIGHT_CYAN}│{Color.RESET} {message}")
     print(f"{Color.BRIGHT_CYAN}└{'─'*58}┘{Color.RESET}\n")
 
-def print_thinking():
-    """打印思考动画"""
-    print(f"{Color.BRIGHT_CYAN}蓝心思考中", end="", flush=True)
-    for _ in range(3):
-        time.sleep(0.3)
-        print("●", end="", flush=True)
-    print(f"{Color.RESET}")
+# 清除光标到行尾
+CLEAR_LINE = '\033[K'
+
+# 进度动画帧
+DOT_FRAMES = ["●○○", "○●○", "○○●", "○●○"]
+BAR_FRAMES = [
+    "⚪⚪⚪⚪⚪",
+    "⚫⚪⚪⚪⚪",
+    "⚫⚫⚪⚪⚪",
+    "⚫⚫⚫⚪⚪",
+    "⚫⚫⚫⚫⚪",
+    "⚫⚫⚫⚫⚫",
+]
+
+class Spinner:
+    """在后台线程播放的进度动画
+
+    动画与实际的请求或录音同时进行，工作结束时调用 stop() 清除动画行，
+    不会为展示动画额外等待。也可以用作上下文管理器：
+
+        with Spinner("图片分析中"):
+            result = vivo_vision.analyze_image_sync(image_path, prompt)
+    """
+
+    def __init__(self, message, frames=None, interval=0.2, color=None):
+        """初始化动画
+
+        Args:
+            message: 提示文本，也可以是接收已用秒数、返回提示文本的函数
+            frames: 动画帧列表
+            interval: 帧间隔(秒)
+            color: 文字颜色
+        """
+        self.message = message
+        self.frames = frames or BAR_FRAMES
+        self.interval = interval
+        self.color = color or f"{Color.BRIGHT_BLUE}{Color.BOLD}"
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _render(self, frame, elapsed):
+        """绘制一帧"""
+        message = self.message(elapsed) if callable(self.message) else self.message
+        # \033[K 清除上一帧更长的残留内容
+        sys.stdout.write(f"\r{self.color}{message} {frame}{Color.RESET}{CLEAR_LINE}")
+        sys.stdout.flush()
+
+    def _run(self):
+        """动画线程主循环"""
+        start_time = time.time()
+        frame_index = 0
+        while not self._stop_event.is_set():
+            self._render(self.frames[frame_index], time.time() - start_time)
+            frame_index = (frame_index + 1) % len(self.frames)
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """开始播放动画，返回自身"""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止动画并清除动画行，可重复调用"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        sys.stdout.write(f"\r{CLEAR_LINE}")
+        sys.stdout.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+def thinking_spinner():
+    """创建等待模型回复的动画"""
+    return Spinner("蓝心思考中", DOT_FRAMES, color=Color.BRIGHT_CYAN)
+
+def prefetch_first_chunk(chunks):
+    """取出流式响应的首个片段
+
+    在 Spinner 中调用，动画会一直播放到首个片段到达为止。
+
+    Args:
+        chunks: 增量文本的可迭代对象
+
+    Returns:
+        包含首个片段和其余片段的迭代器
+    """
+    iterator = iter(chunks)
+    first = next(iterator, None)
+    if first is None:
+        return iter(())
+    return chain([first], iterator)
 
 def print_streaming_ai_message(chunks):
     """打印流式响应的AI消息，带颜色和头像"""
@@ -104,14 +202,20 @@ def print_streaming_ai_message(chunks):
     print(f"{Color.BRIGHT_CYAN}┌─{' 蓝心 ':─^54}─┐{Color.RESET}")
     print(f"{Color.BRIGHT_CYAN}│{Color.RESET} ", end="", flush=True)
     
-    full_text = ""
+    # chunks可以是生成器，每收到一段就立即输出
+    parts = []
     for chunk in chunks:
-        print(f"{chunk}", end="", flush=True)
-        full_text += chunk
-        time.sleep(0.01)  # 控制显示速度
+        print(chunk, end="", flush=True)
+        parts.append(chunk)
     
     print(f"\n{Color.BRIGHT_CYAN}└{'─'*58}┘{Color.RESET}\n")
-    return full_text
+    return "".join(parts)
+
+def print_history_compacted(stats):
+    """打印对话历史压缩信息"""
+    summary_note = "，较早的对话已生成摘要" if stats.get("summarized") else ""
+    print(f"{Color.GRAY}● 对话历史已压缩: 约{stats['before_tokens']} → {stats['after_tokens']} tokens，"
+          f"节省约{stats['saved_tokens']} tokens{summary_note}{Color.RESET}")
 
 # 测试颜色功能
 def test_color():
@@ -133,5 +237,6 @@ if __name__ == "__main__":
     test_color()
     print_welcome()
     print_user_message("你好，我想问一个问题。")
-    print_thinking()
+    with thinking_spinner():
+        time.sleep(1)
     print_ai_message("您好！我是蓝心助手，很高兴为您服务。请问有什么可以帮助您的？") 
\ No newline at end of file
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import threading
+import time
+
+from metrics import get_default_registry
+
+# 选择策略
+ROUND_ROBIN = "round_robin"      # 轮流使用
+LEAST_LOADED = "least_loaded"    # 使用进行中请求最少的凭据
+
+DEFAULT_COOLDOWN = 30.0          # 凭据被限流后暂停使用的时间(秒)
+DEFAULT_COOLDOWN_THRESHOLD = 3   # 连续被限流多少次后进入冷却
+
+class Credential:
+    """一组应用凭据及其使用计数"""
+
+    def __init__(self, app_id, app_key):
+        """初始化凭据
+
+        Args:
+            app_id: 应用ID
+            app_key: 应用密钥
+        """
+        self.app_id = app_id
+        self.app_key = app_key
+        self.inflight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.consecutive_limited = 0
+        self.limited_at = 0.0
+        self.cooldown_until = 0.0
+
+    def __repr__(self):
+        return f"Credential(app_id={self.app_id!r})"
+
+class CredentialPool:
+    """多组应用凭据组成的凭据池
+
+    每次请求从池中取一组凭据签名，按轮询或最少负载选择；
+    凭据连续 cooldown_threshold 轮被限流后在 cooldown 秒内不再参与选择，
+    全部都在冷却时使用最早恢复的一组。偶发的限流交给并发限制器降速，不触发冷却；
+    同一轮中已发出的请求再遇到限流只计一次。
+    """
+
+    def __init__(self, credentials, strategy=ROUND_ROBIN, cooldown=DEFAULT_COOLDOWN, metrics=None,
+                 cooldown_threshold=DEFAULT_COOLDOWN_THRESHOLD):
+        """初始化凭据池
+
+        Args:
+            credentials: (app_id, app_key) 元组或 Credential 的列表
+            strategy: 选择策略，ROUND_ROBIN 或 LEAST_LOADED
+            cooldown: 凭据被限流后暂停使用的时间(秒)
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            cooldown_threshold: 连续被限流多少次后进入冷却
+        """
+        self.credentials = [
+            c if isinstance(c, Credential) else Credential(*c) for c in credentials
+        ]
+        if not self.credentials:
+            raise ValueError("凭据池至少需要一组 app_id/app_key")
+        if strategy not in (ROUND_ROBIN, LEAST_LOADED):
+            raise ValueError(f"不支持的凭据选择策略: {strategy}")
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.cooldown_threshold = max(1, cooldown_threshold)
+        self.metrics = metrics or get_default_registry()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.credentials)
+
+    def available(self):
+        """返回未在冷却中的凭据数"""
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for c in self.credentials if c.cooldown_until <= now)
+
+    def acquire(self, prefer=None):
+        """选择一组凭据，请求结束后需调用 release
+
+        Args:
+            prefer: 指定使用的凭据，冷却中也使用，用于只能由某个应用发出的请求
+
+        Returns:
+            Credential
+        """
+        with self._lock:
+            now = time.monotonic()
+            count = len(self.credentials)
+            # 从轮询位置开始排列，最少负载策略在负载相同时也按轮询顺序
+            ordered = [self.credentials[(self._next + i) % count] for i in range(count)]
+            available = [c for c in ordered if c.cooldown_until <= now]
+            if prefer is not None:
+                credential = prefer
+            elif not available:
+                credential = min(ordered, key=lambda c: c.cooldown_until)
+            elif self.strategy == LEAST_LOADED:
+                credential = min(available, key=lambda c: c.inflight)
+            else:
+                credential = available[0]
+            if prefer is None:
+                self._next = (self.credentials.index(credential) + 1) % count
+            credential.inflight += 1
+            credential.requests += 1
+        self.metrics.inc("vivo_credential_requests_total", app_id=credential.app_id)
+        return credential
+
+    def release(self, credential, rate_limited=False, dropped=False, started=None):
+        """归还凭据并反馈结果
+
+        Args:
+            credential: acquire 返回的凭据
+            rate_limited: 请求被限流，连续达到阈值时凭据进入冷却
+            dropped: 请求没有得到响应
+            started: 请求发出的时间(time.monotonic)，用于识别同一轮的限流
+        """
+        cooling = False
+        with self._lock:
+            credential.inflight -= 1
+            if rate_limited:
+                credential.rate_limited += 1
+                # 本轮已计过限流时，之前发出的请求不再重复计数
+                if started is None or started >= credential.limited_at:
+                    credential.limited_at = time.monotonic()
+                    credential.consecutive_limited += 1
+                if credential.consecutive_limited >= self.cooldown_threshold:
+                    credential.consecutive_limited = 0
+                    credential.cooldown_until = time.monotonic() + self.cooldown
+                    cooling = True
+            elif dropped:
+                credential.errors += 1
+            else:
+                credential.consecutive_limited = 0
+        if rate_limited:
+            self.metrics.inc("vivo_credential_rate_limited_total", app_id=credential.app_id)
+        if cooling:
+            self.metrics.inc("vivo_credential_cooldowns_total", app_id=credential.app_id)
+
+    def pinned(self, credential):
+        """返回固定使用 credential 的凭据池视图，计数和冷却状态仍由本凭据池维护"""
+        return PinnedCredentials(self, credential)
+
+    def stats(self):
+        """返回每组凭据的使用计数"""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "app_id": c.app_id,
+                "inflight": c.inflight,
+                "requests": c.requests,
+                "rate_limited": c.rate_limited,
+                "errors": c.errors,
+                "cooldown": max(0.0, c.cooldown_until - now)
+            } for c in self.credentials]
+
+class PinnedCredentials:
+    """固定使用凭据池中某组凭据的视图
+
+    接口与 CredentialPool 相同，可交给重试策略使用；每次都取同一组凭据，
+    使用计数、限流反馈和冷却都记在原凭据池中，与池中其它请求共用同一把锁。
+    """
+
+    def __init__(self, pool, credential):
+        """初始化视图
+
+        Args:
+            pool: 凭据所属的 CredentialPool
+            credential: 固定使用的凭据
+        """
+        self.pool = pool
+        self.credential = credential
+
+    def __len__(self):
+        return 1
+
+    def available(self):
+        """凭据未在冷却中时返回1，否则返回0；冷却中请求仍用该凭据发出，换不到其它凭据"""
+        with self.pool._lock:
+            return int(self.credential.cooldown_until <= time.monotonic())
+
+    def acquire(self):
+        """取得固定的凭据，请求结束后需调用 release"""
+        return self.pool.acquire(prefer=self.credential)
+
+    def release(self, credential, rate_limited=False, dropped=False, started=None):
+        """归还凭据并反馈结果，参数同 CredentialPool.release"""
+        self.pool.release(credential, rate_limited, dropped, started)
+
+def signing_key(credential, client):
+    """返回签名使用的 (app_id, app_key)
+
+    Args:
+        credential: 本次请求从凭据池取得的凭据，None表示使用客户端自己的凭据
+        client: 带有 app_id/app_key 属性的客户端
+    """
+    if credential is None:
+        return client.app_id, client.app_key
+    return credential.app_id, credential.app_key
+
+def load_credentials(path):
+    """从文件读取凭据列表
+
+    支持JSON数组 [{"app_id": ..., "app_key": ...}, ...]，
+    或每行一组 app_id:app_key 的文本，# 开头的行为注释。
+
+    Returns:
+        (app_id, app_key) 元组列表
+
+    Raises:
+        ValueError: 文件格式错误
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    if content.lstrip().startswith("["):
+        try:
+            items = json.loads(content)
+            return [(item["app_id"], item["app_key"]) for item in items]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            raise ValueError(f"凭据文件格式错误: {e}")
+
+    credentials = []
+    for line_no, line in enumerate(content.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        app_id, sep, app_key = line.partition(":")
+        if not sep or not app_id.strip() or not app_key.strip():
+            raise ValueError(f"凭据文件第{line_no}行应为 app_id:app_key")
+        credentials.append((app_id.strip(), app_key.strip()))
+    return credentials
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import asyncio
+import threading
+import time
+
+class DeadlineExceeded(TimeoutError):
+    """请求超过截止时间"""
+
+class RequestCancelled(Exception):
+    """请求被调用方取消"""
+
+class Deadline:
+    """请求的截止时间和取消令牌
+
+    同一个令牌可以贯穿一次调用中的所有重试、轮询和流式读取：
+    每次发出请求前检查是否已取消或超时，连接和读取超时不超过剩余时间，
+    等待重试或轮询时可被 cancel 立即唤醒。cancel 还会关闭通过 on_cancel
+    登记的流式响应，让正在读取的连接尽快释放。可在其它线程中调用 cancel。
+    """
+
+    def __init__(self, timeout=None):
+        """初始化令牌
+
+        Args:
+            timeout: 距截止的秒数，None表示只能手动取消
+        """
+        self.expires = time.monotonic() + timeout if timeout is not None else None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """是否已被取消"""
+        return self._event.is_set()
+
+    def remaining(self):
+        """距截止的秒数，没有截止时间时返回None"""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        """是否已取消或超过截止时间"""
+        return self.cancelled or self.remaining() == 0.0
+
+    def check(self):
+        """已取消或超时时抛出异常
+
+        Raises:
+            RequestCancelled: 已被取消
+            DeadlineExceeded: 超过截止时间
+        """
+        if self.cancelled:
+            raise RequestCancelled("请求已取消")
+        if self.remaining() == 0.0:
+            raise DeadlineExceeded("请求超过截止时间")
+
+    def timeout(self, connect_timeout, read_timeout):
+        """按剩余时间收窄连接和读取超时
+
+        Returns:
+            (连接超时, 读取超时) 元组
+        """
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return connect_timeout, read_timeout
+        return min(connect_timeout, remaining), min(read_timeout, remaining)
+
+    def sleep(self, seconds):
+        """等待指定时间，被取消时立即返回
+
+        Raises:
+            RequestCancelled: 等待期间被取消
+            DeadlineExceeded: 等待时间超过截止时间
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining < seconds:
+            self._event.wait(remaining)
+        else:
+            self._event.wait(seconds)
+        self.check()
+
+    async def asleep(self, seconds):
+        """sleep 的异步版本"""
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: woken.done() or woken.set_result(None))
+
+        remove = self.on_cancel(wake)
+        remaining = self.remaining()
+        try:
+            await asyncio.wait_for(woken, seconds if remaining is None else min(seconds, remaining))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            remove()
+        self.check()
+
+    def on_cancel(self, callback):
+        """登记取消时调用的函数，已取消时立即调用
+
+        Returns:
+            撤销登记的函数
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel(self):
+        """取消令牌，唤醒等待并调用登记的函数"""
+        with self._lock:
+            if self.cancelled:
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # 关闭连接失败不影响取消
+                pass
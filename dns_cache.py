@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import socket
+import threading
+import time
+
+from metrics import get_default_registry
+
+DEFAULT_DNS_TTL = 300.0          # 解析结果缓存时间(秒)
+
+class DnsCache:
+    """进程内共享的DNS解析缓存
+
+    同步、异步HTTP传输层和语音识别的WebSocket连接都通过同一个实例解析主机名，
+    同一主机在 ttl 秒内只查询一次。所有地址都连接失败时丢弃该主机的缓存，
+    下次连接重新解析。
+    """
+
+    def __init__(self, ttl=DEFAULT_DNS_TTL, metrics=None):
+        """初始化缓存
+
+        Args:
+            ttl: 解析结果缓存时间(秒)
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+        """
+        self.ttl = ttl
+        self.metrics = metrics or get_default_registry()
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        """解析主机名
+
+        Args:
+            host: 主机名或IP
+            port: 端口
+            family: 地址族，默认不限
+
+        Returns:
+            getaddrinfo 结果列表，只包含TCP地址
+
+        Raises:
+            socket.gaierror: 解析失败
+        """
+        key = (host, port, family)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self.metrics.inc("vivo_dns_cache_hits_total", host=host)
+            return entry[1]
+
+        start = time.perf_counter()
+        infos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+        self.metrics.observe("vivo_dns_seconds", time.perf_counter() - start, host=host)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, infos)
+        return infos
+
+    def invalidate(self, host):
+        """丢弃主机的缓存"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == host]:
+                del self._entries[key]
+
+    def connect(self, host, port, open_socket):
+        """按解析出的地址依次尝试建立连接
+
+        Args:
+            host: 主机名
+            port: 端口
+            open_socket: 接收 (ip, port) 的函数，返回已连接的socket，失败时抛出 OSError
+
+        Returns:
+            open_socket 的返回值
+
+        Raises:
+            OSError: 所有地址都连接失败，同时丢弃该主机的缓存
+        """
+        error = None
+        for info in self.resolve(host, port):
+            try:
+                return open_socket(info[4][:2])
+            except OSError as e:
+                error = e
+        self.invalidate(host)
+        raise error if error is not None else OSError(f"无法解析主机: {host}")
+
+# 进程内默认共享的DNS缓存
+_default_dns_cache = None
+_default_dns_cache_lock = threading.Lock()
+
+def get_default_dns_cache():
+    """获取进程内共享的默认DNS缓存，首次调用时创建"""
+    global _default_dns_cache
+    if _default_dns_cache is None:
+        with _default_dns_cache_lock:
+            if _default_dns_cache is None:
+                _default_dns_cache = DnsCache()
+    return _default_dns_cache
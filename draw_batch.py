@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from chat_batch import load_completed_ids, truncate_partial_line
+from draw_scheduler import DrawScheduler, QUEUED, DONE, ETA_FRACTION, SECONDS_PER_QUEUED_TASK
+
+DEFAULT_QUEUE_LIMIT = 8           # 在途任务的服务端排队位置达到该值时暂缓提交
+MIN_ADMISSION_DELAY = 1.0         # 暂缓提交时的最短等待(秒)
+MAX_ADMISSION_DELAY = 30.0        # 暂缓提交时的最长等待(秒)
+
+# 可扫描的参数及其类型，size 为 宽x高 的简写
+SWEEP_PARAMS = {
+    "seed": int,
+    "cfg_scale": float,
+    "steps": int,
+    "style_config": str,
+    "width": int,
+    "height": int,
+    "size": str
+}
+
+# 传给 VivoArtAPI.submit_drawing_task 的参数
+SUBMIT_PARAMS = ("style_config", "width", "height", "seed", "cfg_scale", "steps", "negative_prompt")
+
+def parse_sweep(specs):
+    """解析参数扫描配置
+
+    Args:
+        specs: ["seed=1,2,3", "size=512x512,1024x768", ...]
+
+    Returns:
+        [(参数名, [取值, ...]), ...]，按指定顺序
+
+    Raises:
+        ValueError: 参数名未知或取值格式错误
+    """
+    sweep = []
+    for spec in specs or []:
+        name, sep, values = spec.partition("=")
+        name = name.strip()
+        if not sep or name not in SWEEP_PARAMS:
+            raise ValueError(f"无效的扫描参数: {spec}，可用参数: {', '.join(SWEEP_PARAMS)}")
+        try:
+            parsed = [SWEEP_PARAMS[name](value.strip()) for value in values.split(",") if value.strip()]
+            if name == "size":
+                parsed = [parse_size(value) for value in parsed]
+        except ValueError:
+            raise ValueError(f"无效的扫描取值: {spec}")
+        if not parsed:
+            raise ValueError(f"扫描参数没有取值: {spec}")
+        sweep.append((name, parsed))
+    return sweep
+
+def parse_size(value):
+    """把 宽x高 解析为 (宽, 高)"""
+    width, sep, height = value.lower().partition("x")
+    if not sep:
+        raise ValueError(f"无效的尺寸: {value}")
+    return int(width), int(height)
+
+def read_draw_prompts(input_path):
+    """读取提示词文件
+
+    每行是一个提示词，或一个JSON对象，包含 "prompt" 以及可选的 "id" 和绘画参数
+    (style_config、width、height、seed、cfg_scale、steps、negative_prompt)。空行和 # 开头的行被忽略。
+
+    Yields:
+        记录字典
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = {"prompt": line}
+            else:
+                record = {"prompt": line}
+            yield record
+
+def item_id(prompt, params):
+    """由提示词和参数生成稳定的条目ID，重跑时据此跳过已完成的条目"""
+    content = json.dumps({"prompt": prompt, "params": params}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+def expand_items(records, sweep, defaults):
+    """把每条提示词按扫描参数的笛卡尔积展开为绘画条目
+
+    参数优先级：扫描取值 > 记录中的参数 > defaults。
+
+    Args:
+        records: read_draw_prompts 产出的记录
+        sweep: parse_sweep 的结果
+        defaults: 默认绘画参数
+
+    Yields:
+        (条目ID, 提示词, 参数字典)
+    """
+    names = [name for name, _ in sweep]
+    combos = list(itertools.product(*[values for _, values in sweep]))
+    for record in records:
+        prompt = str(record.get("prompt", "")).strip()
+        if not prompt:
+            continue
+        base = dict(defaults)
+        base.update({key: record[key] for key in SUBMIT_PARAMS if key in record})
+        for combo in combos:
+            params = dict(base)
+            for name, value in zip(names, combo):
+                if name == "size":
+                    params["width"], params["height"] = value
+                else:
+                    params[name] = value
+            # 只有一种组合时沿用记录中指定的ID
+            yield record.get("id") if len(combos) == 1 and "id" in record else item_id(prompt, params), prompt, params
+
+def load_undownloaded_tasks(manifest_path):
+    """读取清单中任务已完成但图片未下载完的条目，重跑时只重新下载图片而不重新提交
+
+    Returns:
+        条目ID -> 任务ID 的字典，之后又成功的条目不包含在内
+    """
+    tasks = {}
+    if not os.path.exists(manifest_path):
+        return tasks
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict) or "id" not in record:
+                continue
+            key = str(record["id"])
+            if record.get("state") == DONE and record.get("task_id") and record.get("images_url") and "error" in record:
+                tasks[key] = record["task_id"]
+            elif "error" not in record:
+                tasks.pop(key, None)
+    return tasks
+
+def admission_delay(jobs, queue_limit):
+    """根据在途任务最近一次查询到的排队情况决定提交下一个任务前的等待时间
+
+    在途任务中排队位置达到 queue_limit 时，说明服务端队列已经很深，继续提交只会延长排队，
+    按该任务的预计时间(没有时按排队位置估计)等待一段时间后再看。
+
+    Returns:
+        等待秒数，0 表示可以立即提交
+    """
+    queued = [job for job in jobs if job.state == QUEUED and job.queue_ahead >= queue_limit]
+    if not queued:
+        return 0.0
+    deepest = max(queued, key=lambda job: job.queue_ahead)
+    delay = deepest.task_eta * ETA_FRACTION if deepest.task_eta else deepest.queue_ahead * SECONDS_PER_QUEUED_TASK
+    return min(MAX_ADMISSION_DELAY, max(MIN_ADMISSION_DELAY, delay))
+
+def manifest_record(item, job=None, response=None):
+    """生成写入清单文件的记录，失败时带 error 字段"""
+    item_key, prompt, params = item
+    record = {"id": item_key, "prompt": prompt, "params": params}
+    if job is None:
+        record["error"] = response.get("msg", "任务提交失败") if response else "任务提交失败"
+        record["code"] = response.get("code") if response else None
+        return record
+    record["task_id"] = job.task_id
+    record["state"] = job.state
+    record["elapsed"] = round(job.elapsed(), 3)
+    record["images_url"] = job.image_urls
+    record["files"] = job.files
+    if job.cached:
+        record["cached"] = True
+    if not job.succeeded or (job.image_urls and len(job.files) < len(job.image_urls)):
+        record["error"] = job.error or job.state
+    return record
+
+def run_draw_batch(vivo_art, items, manifest_path, concurrency=4, queue_limit=DEFAULT_QUEUE_LIMIT,
+                   output_dir="./images"):
+    """批量提交绘画任务
+
+    同时在途(已提交未结束)的任务不超过 concurrency 个；在途任务的服务端排队位置达到 queue_limit 时
+    暂缓提交。任务进度由 DrawScheduler 在后台查询，完成后下载图片，结果按完成顺序逐行追加到清单文件，
+    清单中已成功的条目在重跑时自动跳过，任务已完成但图片没下载完的条目只重新下载图片。
+
+    Args:
+        vivo_art: VivoArtAPI 客户端
+        items: expand_items 产出的 (条目ID, 提示词, 参数字典)
+        manifest_path: 清单文件路径(JSONL)
+        concurrency: 最多在途任务数
+        queue_limit: 暂缓提交的排队位置阈值
+        output_dir: 图片保存目录
+
+    Returns:
+        统计信息字典
+    """
+    completed = load_completed_ids(manifest_path)
+    undownloaded = load_undownloaded_tasks(manifest_path)
+    truncate_partial_line(manifest_path)
+    stats = {"skipped": 0, "redownloaded": 0, "succeeded": 0, "failed": 0, "admission_wait": 0.0}
+    start_time = time.time()
+    pending = {}  # Future -> (条目, DrawJob)
+
+    def write_record(out, record):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        stats["failed" if "error" in record else "succeeded"] += 1
+
+    def collect(out, futures):
+        for future in futures:
+            item, job = pending.pop(future)
+            write_record(out, manifest_record(item, job))
+
+    with open(manifest_path, 'a', encoding='utf-8') as out, DrawScheduler(vivo_art, output_dir) as scheduler:
+        for item in items:
+            if str(item[0]) in completed:
+                stats["skipped"] += 1
+                continue
+
+            # 上次已生成但图片没有下载完的任务，跟踪原任务重新下载，不占用提交名额
+            if str(item[0]) in undownloaded:
+                _, prompt, params = item
+                job = scheduler.track(undownloaded[str(item[0])], prompt, params)
+                pending[job.future] = (item, job)
+                stats["redownloaded"] += 1
+                continue
+
+            # 在途任务达到上限或服务端队列过深时等待
+            while True:
+                collect(out, [future for future in pending if future.done()])
+                jobs = [job for _, job in pending.values()]
+                delay = admission_delay(jobs, queue_limit)
+                if len(jobs) < concurrency and not delay:
+                    break
+                waited = time.time()
+                wait(list(pending), timeout=delay or None, return_when=FIRST_COMPLETED)
+                if len(jobs) < concurrency:
+                    stats["admission_wait"] += time.time() - waited
+
+            _, prompt, params = item
+            try:
+                response, job = scheduler.submit(prompt, **{key: params[key] for key in SUBMIT_PARAMS if key in params})
+            except Exception as e:
+                response, job = {"code": "ERROR", "msg": str(e)}, None
+            if job is None:
+                write_record(out, manifest_record(item, response=response))
+                continue
+            pending[job.future] = (item, job)
+
+        collect(out, wait(list(pending)).done)
+
+    stats["admission_wait"] = round(stats["admission_wait"], 3)
+    stats["elapsed"] = round(time.time() - start_time, 3)
+    print(f"批量绘画完成: 成功 {stats['succeeded']}，失败 {stats['failed']}，跳过 {stats['skipped']}，"
+          f"重新下载 {stats['redownloaded']}，"
+          f"因排队暂缓提交 {stats['admission_wait']}秒，耗时 {stats['elapsed']}秒", file=sys.stderr)
+    return stats
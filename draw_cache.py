@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from image_downloader import file_sha256
+
+# 默认配置
+DEFAULT_CACHE_PATH = "./cache/drawings.db"
+DEFAULT_IMAGE_DIR = "./images/sha256"   # 按内容哈希存放的图片目录
+
+# 决定生成结果的参数，相同取值且种子固定时服务端生成的图片相同
+KEY_PARAMS = ("prompt", "negative_prompt", "style_config", "seed", "cfg_scale", "steps", "width", "height")
+
+def image_extension(path):
+    """根据文件头判断图片格式，返回扩展名"""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    if head.startswith(b"\x89PNG"):
+        return ".png"
+    if head.startswith(b"\xff\xd8"):
+        return ".jpg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return os.path.splitext(path)[1] or ".img"
+
+class DrawCache:
+    """绘画结果的本地索引
+
+    使用SQLite保存每个生成过的任务：参数、任务ID、图片地址和本地图片。种子固定的任务按参数哈希索引，
+    相同参数再次绘画时直接返回已有图片，不再提交任务。图片按内容的SHA256存放，
+    字节相同的图片在磁盘上只保存一份。索引同时作为可搜索的绘画历史。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, image_dir=DEFAULT_IMAGE_DIR):
+        """初始化索引
+
+        Args:
+            path: SQLite数据库文件路径
+            image_dir: 按内容哈希存放图片的目录
+        """
+        self.path = path
+        self.image_dir = image_dir
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "task_id TEXT PRIMARY KEY, key TEXT, prompt TEXT NOT NULL, params TEXT NOT NULL, "
+            "images_url TEXT NOT NULL, images TEXT NOT NULL, created REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_key ON generations (key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_created ON generations (created)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(params):
+        """根据生成参数计算索引键
+
+        Args:
+            params: 包含 KEY_PARAMS 的参数字典，调用方需先补全默认值
+
+        Returns:
+            十六进制哈希字符串；种子未固定(-1或未提供)时每次生成结果不同，返回None
+        """
+        seed = params.get("seed")
+        if seed is None or int(seed) < 0:
+            return None
+        canonical = json.dumps({name: params.get(name) for name in KEY_PARAMS},
+                               ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """查找相同参数生成过的结果
+
+        有图片没有下载、没有存放或本地图片被删除的结果不算命中。
+
+        Returns:
+            条目字典(见 _entry)，未命中返回None
+        """
+        if key is None:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, prompt, params, images_url, images, created, hits FROM generations "
+                "WHERE key = ? AND images != '[]' ORDER BY created DESC", (key,)
+            ).fetchall()
+            for row in rows:
+                entry = self._entry(row)
+                images = json.loads(row[4])
+                if (entry["files"] and len(entry["files"]) == len(images) == len(entry["images_url"])
+                        and all(os.path.exists(path) for path in entry["files"])):
+                    self._conn.execute("UPDATE generations SET hits = hits + 1 WHERE task_id = ?", (entry["task_id"],))
+                    self._conn.commit()
+                    return entry
+        return None
+
+    def record(self, task_id, key, prompt, params, image_urls, files=(), hashes=None):
+        """记录一次生成结果，图片移入按内容哈希存放的目录
+
+        同一任务重复记录时合并：已有的提示词、参数和图片不会被空值覆盖。
+
+        Args:
+            task_id: 任务ID
+            key: make_key 计算的索引键，种子未固定或图生图时为None，只记入历史
+            prompt: 图像描述，未知时为空字符串
+            params: 生成参数字典
+            image_urls: 图片地址列表
+            files: 已下载的图片路径，与 image_urls 一一对应，未下载的为None；为空时只记录任务
+            hashes: 图片路径 -> SHA256，下载时已计算的哈希，缺少时重新计算
+
+        Returns:
+            按内容哈希存放后的图片路径列表，与 files 顺序对应，未下载的为None
+        """
+        hashes = hashes or {}
+        stored = [self._store_file(path, hashes.get(path)) if path else (None, None) for path in files]
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, prompt, params, images_url, images, created FROM generations WHERE task_id = ?",
+                (task_id,)
+            ).fetchone()
+            images = [sha256 for sha256, _ in stored]
+            created = now
+            if row is not None:
+                key = key or row[0]
+                prompt = prompt or row[1]
+                params = params or json.loads(row[2])
+                image_urls = image_urls or json.loads(row[3])
+                previous = json.loads(row[4])
+                if not images:
+                    images = previous
+                elif len(previous) == len(images):
+                    # 补充下载时保留之前已存放的图片
+                    images = [sha256 or old for sha256, old in zip(images, previous)]
+                created = row[5]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (task_id, key, prompt, params, images_url, images, created, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE((SELECT hits FROM generations WHERE task_id = ?), 0))",
+                (task_id, key, prompt, json.dumps(params, ensure_ascii=False), json.dumps(image_urls),
+                 json.dumps(images), created, task_id)
+            )
+            self._conn.commit()
+        return [path for _, path in stored]
+
+    def _store_file(self, path, sha256=None):
+        """把图片移入按内容哈希存放的目录，已有相同内容时删除新文件
+
+        Returns:
+            (sha256, 存放路径)
+        """
+        if sha256 is None:
+            with self._lock:
+                row = self._conn.execute("SELECT sha256 FROM images WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                # 已经存放过的图片
+                return row[0], path
+            sha256 = file_sha256(path).hexdigest()
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM images WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is not None and os.path.exists(row[0]):
+            if os.path.abspath(path) != os.path.abspath(row[0]):
+                os.remove(path)
+            return sha256, row[0]
+
+        target = os.path.join(self.image_dir, sha256[:2], sha256 + image_extension(path))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (sha256, path, size, created) VALUES (?, ?, ?, ?)",
+                (sha256, target, os.path.getsize(target), time.time())
+            )
+            self._conn.commit()
+        return sha256, target
+
+    def task_files(self, task_id):
+        """返回任务已存放的图片
+
+        Returns:
+            与任务的图片地址一一对应的本地路径列表，未下载或已被删除的为None；任务未记录时为空列表
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT images FROM generations WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return []
+            images = json.loads(row[0])
+            paths = self._image_paths(images)
+        return [paths.get(sha256) if sha256 in paths and os.path.exists(paths[sha256]) else None
+                for sha256 in images]
+
+    def search(self, keyword=None, limit=20):
+        """搜索绘画历史
+
+        Args:
+            keyword: 关键词，空格分隔的多个词需同时出现在提示词或参数中，为空时返回最近的记录
+            limit: 最多返回的条数
+
+        Returns:
+            条目字典列表，按生成时间从新到旧
+        """
+        sql = "SELECT task_id, prompt, params, images_url, images, created, hits FROM generations"
+        args = []
+        words = (keyword or "").split()
+        if words:
+            sql += " WHERE " + " AND ".join(["(prompt LIKE ? ESCAPE '\\' OR params LIKE ? ESCAPE '\\')"] * len(words))
+            for word in words:
+                pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                args.extend([pattern, pattern])
+        sql += " ORDER BY created DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+            return [self._entry(row) for row in rows]
+
+    def _entry(self, row):
+        """把数据库行转换为条目字典，调用方持有锁"""
+        task_id, prompt, params, images_url, images, created, hits = row
+        images = json.loads(images)
+        paths = self._image_paths(images)
+        return {
+            "task_id": task_id,
+            "prompt": prompt,
+            "params": json.loads(params),
+            "images_url": json.loads(images_url),
+            "files": [paths[sha256] for sha256 in images if sha256 in paths],
+            "created": created,
+            "hits": hits
+        }
+
+    def _image_paths(self, images):
+        """查询图片哈希对应的存放路径，调用方持有锁
+
+        Returns:
+            sha256 -> 路径，没有存放的哈希不在其中
+        """
+        images = [sha256 for sha256 in images if sha256]
+        if not images:
+            return {}
+        return dict(self._conn.execute(
+            f"SELECT sha256, path FROM images WHERE sha256 IN ({','.join('?' * len(images))})", images
+        ).fetchall())
+
+    def stats(self):
+        """返回记录数、图片数和图片总大小"""
+        with self._lock:
+            generations = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+            images, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        return {"generations": generations, "images": images, "bytes": total}
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import bisect
+import json
+import os
+import threading
+import time
+
+from deadline import Deadline
+
+# 默认配置
+DEFAULT_CATALOG_PATH = "./cache/draw_catalog.json"
+DEFAULT_TTL = 24 * 3600          # 目录有效期(秒)，过期后在后台刷新
+DEFAULT_REFRESH_TIMEOUT = 10.0   # 单次刷新的时限(秒)
+DEFAULT_RETRY_INTERVAL = 60.0    # 刷新失败后再次刷新前的等待时间(秒)
+
+STYLES = "styles"
+PROMPTS = "prompts"
+KINDS = (STYLES, PROMPTS)
+
+class DrawCatalog:
+    """绘画风格和推荐提示词的本地目录
+
+    两份目录保存在磁盘上的JSON文件中，启动时直接从文件加载，超过有效期后在后台线程中重新获取，
+    获取失败时继续使用已有内容，离线时同样可用。风格按ID和名称建立索引，推荐提示词支持前缀和关键词搜索，
+    查找都在本地完成。
+    """
+
+    def __init__(self, vivo_art, path=DEFAULT_CATALOG_PATH, ttl=DEFAULT_TTL, refresh_timeout=DEFAULT_REFRESH_TIMEOUT,
+                 retry_interval=DEFAULT_RETRY_INTERVAL):
+        """初始化目录并加载磁盘上的内容
+
+        Args:
+            vivo_art: VivoArtAPI 客户端，用于刷新目录
+            path: 目录文件路径
+            ttl: 有效期(秒)
+            refresh_timeout: 单次刷新的时限(秒)
+            retry_interval: 刷新失败后再次刷新前的等待时间(秒)
+        """
+        self.vivo_art = vivo_art
+        self.path = path
+        self.ttl = ttl
+        self.refresh_timeout = refresh_timeout
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._data = {kind: {"items": [], "fetched": 0} for kind in KINDS}
+        self._refreshing = {}  # 目录类型 -> 后台刷新线程
+        self._failed_at = {}  # 目录类型 -> 上次刷新失败的时间(time.monotonic)
+        self._styles_by_id = {}
+        self._styles_by_name = {}
+        self._prompt_keys = []  # (小写短提示词, 序号)，按短提示词排序，用于前缀搜索
+        self._load()
+
+    def _load(self):
+        """从磁盘加载目录，文件不存在或损坏时为空"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for kind in KINDS:
+            entry = saved.get(kind) if isinstance(saved, dict) else None
+            if isinstance(entry, dict) and isinstance(entry.get("items"), list):
+                self._data[kind] = {"items": entry["items"], "fetched": entry.get("fetched", 0)}
+        self._build_index()
+
+    def _save(self):
+        """把目录写入磁盘，先写临时文件再重命名，调用方持有锁"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp = self.path + ".tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(temp, self.path)
+
+    def _build_index(self):
+        """重建风格和提示词索引，调用方持有锁或在初始化中调用"""
+        styles = self._data[STYLES]["items"]
+        self._styles_by_id = {style.get("style_id"): style for style in styles if style.get("style_id")}
+        by_name = {}
+        for style in styles:
+            name = str(style.get("style_name", "")).strip().lower()
+            if name and name not in by_name:
+                by_name[name] = style
+        self._styles_by_name = by_name
+        prompts = self._data[PROMPTS]["items"]
+        self._prompt_keys = sorted((str(prompt.get("short_text", "")).lower(), i) for i, prompt in enumerate(prompts))
+
+    def is_stale(self, kind):
+        """目录是否已过期或从未获取"""
+        with self._lock:
+            return time.time() - self._data[kind]["fetched"] > self.ttl
+
+    def _backing_off(self, kind):
+        """上次刷新失败后是否还在等待期内，调用方持有锁"""
+        failed_at = self._failed_at.get(kind)
+        return failed_at is not None and time.monotonic() - failed_at < self.retry_interval
+
+    def refresh(self, kind, deadline=None):
+        """从服务端重新获取一份目录，失败时保留已有内容
+
+        Args:
+            kind: STYLES 或 PROMPTS
+            deadline: Deadline令牌，未提供时使用 refresh_timeout
+
+        Returns:
+            是否获取成功
+        """
+        fetch = self.vivo_art.get_styles if kind == STYLES else self.vivo_art.get_prompts
+        try:
+            response = fetch(deadline or Deadline(self.refresh_timeout))
+        except Exception:
+            response = None
+        ok = bool(response) and response.get("code") == 200 and isinstance(response.get("result"), list)
+        self.vivo_art.metrics.inc("vivo_draw_catalog_refresh_total", kind=kind, result="ok" if ok else "error")
+        if not ok:
+            with self._lock:
+                self._failed_at[kind] = time.monotonic()
+            return False
+        with self._lock:
+            self._failed_at.pop(kind, None)
+            self._data[kind] = {"items": response["result"], "fetched": time.time()}
+            self._build_index()
+            try:
+                self._save()
+            except OSError:
+                # 写不了磁盘时只在内存中使用
+                pass
+        return True
+
+    def refresh_async(self, force=False):
+        """在后台线程中刷新过期的目录，同一目录同时只有一个刷新
+
+        Args:
+            force: 是否忽略有效期和失败后的等待期全部刷新
+
+        Returns:
+            启动的线程列表
+        """
+        threads = []
+        for kind in KINDS:
+            if not force and not self.is_stale(kind):
+                continue
+            with self._lock:
+                thread = self._refreshing.get(kind)
+                if thread is not None and thread.is_alive():
+                    continue
+                if not force and self._backing_off(kind):
+                    continue
+                thread = threading.Thread(target=self.refresh, args=(kind,), name=f"draw-catalog-{kind}", daemon=True)
+                self._refreshing[kind] = thread
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def _ensure(self, kind):
+        """目录为空时等待刷新完成(首次使用且没有磁盘缓存)，过期时在后台刷新
+
+        刷新失败后的等待期内不再刷新，目录为空时直接返回，调用方按没有目录处理。
+        """
+        with self._lock:
+            empty = not self._data[kind]["items"]
+            thread = self._refreshing.get(kind)
+            backing_off = self._backing_off(kind)
+        if empty and backing_off:
+            return
+        if empty:
+            if thread is not None and thread.is_alive():
+                thread.join(self.refresh_timeout)
+            else:
+                self.refresh(kind)
+        else:
+            self.refresh_async()
+
+    def get_styles(self):
+        """返回风格列表，格式同 VivoArtAPI.get_styles 的响应"""
+        self._ensure(STYLES)
+        with self._lock:
+            styles = list(self._data[STYLES]["items"])
+        if not styles:
+            return {"code": "ERROR", "msg": "风格列表不可用"}
+        return {"code": 200, "msg": "成功", "result": styles}
+
+    def get_prompts(self, query=None, limit=None):
+        """返回推荐提示词，格式同 VivoArtAPI.get_prompts 的响应
+
+        Args:
+            query: 搜索词，提供时只返回 search_prompts 的结果
+            limit: 最多返回的条数
+        """
+        self._ensure(PROMPTS)
+        if query:
+            prompts = self.search_prompts(query, limit)
+        else:
+            with self._lock:
+                prompts = self._data[PROMPTS]["items"][:limit]
+        if not prompts:
+            return {"code": "ERROR", "msg": "没有匹配的推荐提示词" if query else "推荐提示词不可用"}
+        return {"code": 200, "msg": "成功", "result": prompts}
+
+    def find_style(self, value):
+        """按风格ID或风格名称(不区分大小写)查找风格
+
+        Returns:
+            风格字典，未找到时返回None
+        """
+        if not value:
+            return None
+        value = str(value).strip()
+        with self._lock:
+            return self._styles_by_id.get(value) or self._styles_by_name.get(value.lower())
+
+    def resolve_style(self, value):
+        """把风格名称解析为风格ID，未找到时原样返回(可能是目录中还没有的风格ID)
+
+        本地还没有风格目录时先获取一次，之后的解析都不访问网络；获取失败后的等待期内直接原样返回。
+        """
+        style = self.find_style(value)
+        if style is None and value:
+            with self._lock:
+                empty = not self._data[STYLES]["items"]
+            if empty:
+                self._ensure(STYLES)
+                style = self.find_style(value)
+        return style.get("style_id") if style else value
+
+    def search_prompts(self, query, limit=None):
+        """搜索推荐提示词
+
+        短提示词以 query 开头的排在前面，其余按空格分隔的关键词全部出现在短提示词或长提示词中匹配，
+        保持目录中的顺序。
+
+        Returns:
+            提示词字典列表
+        """
+        query = (query or "").strip().lower()
+        if not query:
+            return []
+        with self._lock:
+            prompts = self._data[PROMPTS]["items"]
+            start = bisect.bisect_left(self._prompt_keys, (query, -1))
+            matched = []
+            for key, i in self._prompt_keys[start:]:
+                if not key.startswith(query):
+                    break
+                matched.append(i)
+            words = query.split()
+            seen = set(matched)
+            for i, prompt in enumerate(prompts):
+                if i in seen:
+                    continue
+                text = f"{prompt.get('short_text', '')} {prompt.get('long_text', '')}".lower()
+                if all(word in text for word in words):
+                    matched.append(i)
+            return [prompts[i] for i in matched[:limit]]
@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+from contextlib import contextmanager
+
+from deadline import Deadline, RequestCancelled
+
+DEFAULT_MIN_INTERVAL = 1.0       # 同一任务两次查询的最短间隔(秒)
+DEFAULT_MAX_INTERVAL = 15.0      # 同一任务两次查询的最长间隔(秒)
+DEFAULT_MAX_WAIT = 600.0         # 单个任务从提交到完成的最长等待(秒)
+DEFAULT_DOWNLOAD_WORKERS = 4     # 同时下载图片的线程数
+DEFAULT_DOWNLOAD_TIMEOUT = 120.0 # 单张图片的下载时限(秒)
+ETA_FRACTION = 0.5               # 按预计剩余时间的这一比例安排下次查询，越接近完成查询越密
+SECONDS_PER_QUEUED_TASK = 2.0    # 只返回排队位置时，估计每个排在前面的任务需要的时间(秒)
+BACKOFF_FACTOR = 1.5             # 没有预计时间或查询失败时间隔的增长倍数
+MAX_POLL_ERRORS = 5              # 连续查询失败多少次后放弃任务
+
+# 调度器中任务的状态
+PENDING = "pending"          # 已提交，尚未查询
+QUEUED = "queued"            # 服务端排队中
+RUNNING = "running"          # 服务端生成中
+DOWNLOADING = "downloading"  # 已完成，正在下载图片
+DONE = "done"
+FAILED = "failed"
+CANCELED = "canceled"
+TIMEOUT = "timeout"
+FINAL_STATES = (DONE, FAILED, CANCELED, TIMEOUT)
+
+def next_poll_delay(result, blind_polls=0, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL):
+    """根据任务进度安排下次查询的间隔
+
+    有预计剩余时间 task_eta 时在剩余时间的 ETA_FRACTION 处再查，只有排队位置 queue_ahead 时
+    按每个前序任务 SECONDS_PER_QUEUED_TASK 秒估计，都没有时从最短间隔开始按 BACKOFF_FACTOR 递增。
+
+    Args:
+        result: 任务进度响应中的 result
+        blind_polls: 连续没有预计时间的查询次数
+        min_interval: 最短间隔(秒)
+        max_interval: 最长间隔(秒)
+
+    Returns:
+        间隔秒数
+    """
+    eta = result.get("task_eta") or 0
+    queue_ahead = result.get("queue_ahead") or 0
+    if eta > 0:
+        delay = eta * ETA_FRACTION
+    elif queue_ahead > 0:
+        delay = queue_ahead * SECONDS_PER_QUEUED_TASK
+    else:
+        delay = min_interval * BACKOFF_FACTOR ** blind_polls
+    return min(max_interval, max(min_interval, delay))
+
+class DrawJob:
+    """调度器跟踪的一个绘画任务
+
+    future 在任务到达终态(完成并下载、失败、取消或超时)后以任务本身为结果完成，
+    调用方对 future 调用 cancel 时调度器会取消服务端任务。
+    """
+
+    def __init__(self, task_id, prompt="", params=None):
+        self.task_id = task_id
+        self.prompt = prompt
+        self.params = params or {}
+        self.state = PENDING
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.queue_ahead = 0
+        self.task_eta = 0
+        self.progress = None      # 最近一次成功查询的响应
+        self.image_urls = []
+        self.files = []           # 下载到本地的图片路径
+        self.cached = False       # 是否命中绘画结果索引，未提交任务
+        self.error = None
+        self.polls = 0
+        self.blind_polls = 0
+        self.poll_errors = 0
+        self.next_poll = 0.0
+        self.future = Future()
+
+    @property
+    def done(self):
+        """是否已到终态"""
+        return self.state in FINAL_STATES
+
+    @property
+    def succeeded(self):
+        """是否成功完成"""
+        return self.state == DONE
+
+    @property
+    def incomplete(self):
+        """是否有图片尚未下载"""
+        return len(self.files) < len(self.image_urls)
+
+    def elapsed(self):
+        """从提交到完成(或到现在)的秒数"""
+        return (self.finished_at or time.time()) - self.submitted_at
+
+class DrawScheduler:
+    """后台绘画任务调度器
+
+    一个后台线程负责查询所有已提交任务的进度，按服务端返回的预计时间和排队位置
+    安排每个任务的下次查询，而不是固定间隔轮询。任务完成后在下载线程池中自动下载图片，
+    并调用 on_finish 通知调用方。可在多个线程中提交和查看任务。
+    """
+
+    def __init__(self, vivo_art, output_dir="./images", download=True, on_finish=None,
+                 min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, max_wait=DEFAULT_MAX_WAIT,
+                 download_workers=DEFAULT_DOWNLOAD_WORKERS, download_timeout=DEFAULT_DOWNLOAD_TIMEOUT):
+        """初始化调度器
+
+        Args:
+            vivo_art: VivoArtAPI 客户端
+            output_dir: 图片保存目录
+            download: 任务完成后是否自动下载图片
+            on_finish: 任务到达终态时调用的函数，参数为 DrawJob，在调度器的后台线程中调用
+            min_interval: 同一任务两次查询的最短间隔(秒)
+            max_interval: 同一任务两次查询的最长间隔(秒)
+            max_wait: 单个任务从提交到完成的最长等待(秒)，超过后不再查询
+            download_workers: 同时下载图片的线程数
+            download_timeout: 单张图片的下载时限(秒)
+        """
+        self.vivo_art = vivo_art
+        self.output_dir = output_dir
+        self.download = download
+        self.on_finish = on_finish
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_wait = max_wait
+        self.download_timeout = download_timeout
+        self.metrics = vivo_art.metrics
+        self._jobs = {}  # 任务ID -> DrawJob，按提交顺序
+        self._heap = []  # (下次查询时间, 序号, DrawJob)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._inflight = set()  # 进行中的查询和下载的 Deadline，关闭时取消
+        self._closed = False
+        self._thread = None
+        self._downloads = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="draw-download")
+
+    def submit(self, prompt, **params):
+        """提交绘画任务并交给调度器跟踪
+
+        Args:
+            prompt: 图像描述
+            **params: 透传给 VivoArtAPI.submit_drawing_task 的其它参数
+
+        Returns:
+            (response, job) 元组，提交失败时 job 为 None；命中绘画结果索引时不提交任务，
+            response 为 VivoArtAPI.cached_result 的结果，job 已经完成
+        """
+        cached = self.vivo_art.cached_result(prompt, **params)
+        if cached is not None:
+            return cached, self._cached_job(cached["result"], prompt, params)
+        response = self.vivo_art.submit_drawing_task(prompt, **params)
+        if response.get("code") != 200:
+            return response, None
+        return response, self.track(response["result"]["task_id"], prompt, params)
+
+    def track(self, task_id, prompt="", params=None):
+        """跟踪一个已提交的任务，已在跟踪的任务直接返回
+
+        Returns:
+            DrawJob
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("绘画任务调度器已关闭")
+            job = self._jobs.get(task_id)
+            if job is not None:
+                return job
+            job = DrawJob(task_id, prompt, params)
+            self._jobs[task_id] = job
+            # 刚提交的任务不会立即完成，等最短间隔后再第一次查询
+            self._schedule(job, self.min_interval)
+            self._update_gauge()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="draw-scheduler", daemon=True)
+                self._thread.start()
+        job.future.add_done_callback(lambda future: future.cancelled() and self._wake(job))
+        return job
+
+    def _cached_job(self, result, prompt, params):
+        """为命中绘画结果索引的请求创建已完成的任务"""
+        job = DrawJob(result["task_id"], prompt, params)
+        job.cached = True
+        job.image_urls = result["images_url"]
+        job.files = list(result["files"])
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("绘画任务调度器已关闭")
+            self._jobs[job.task_id] = job
+        self._finish(job, DONE)
+        return job
+
+    def get(self, task_id):
+        """返回任务ID对应的 DrawJob，未跟踪时返回None"""
+        with self._cond:
+            return self._jobs.get(task_id)
+
+    def jobs(self):
+        """返回全部任务，按提交顺序"""
+        with self._cond:
+            return list(self._jobs.values())
+
+    def active_count(self):
+        """未到终态的任务数"""
+        with self._cond:
+            return sum(1 for job in self._jobs.values() if not job.done)
+
+    def cancel(self, task_id):
+        """取消服务端任务，任务在跟踪中时同时结束跟踪
+
+        Returns:
+            取消任务的响应
+        """
+        response = self.vivo_art.cancel_task(task_id)
+        job = self.get(task_id)
+        if job is not None and response.get("code") == 200:
+            self._finish(job, CANCELED)
+        return response
+
+    def retry_downloads(self, task_id=None):
+        """重新下载已完成但图片未全部下载的任务，已下载的图片不再重复下载，中断的下载从断点续传
+
+        Args:
+            task_id: 只重试该任务，未提供时重试全部任务
+
+        Returns:
+            重新开始下载的任务列表
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("绘画任务调度器已关闭")
+            if task_id is None:
+                jobs = list(self._jobs.values())
+            else:
+                jobs = [self._jobs[task_id]] if task_id in self._jobs else []
+            jobs = [job for job in jobs if job.state == DONE and job.incomplete]
+            for job in jobs:
+                job.state = DOWNLOADING
+                job.finished_at = None
+                job.error = None
+            self._update_gauge()
+        for job in jobs:
+            self._downloads.submit(self._download, job)
+        return jobs
+
+    def close(self):
+        """停止查询和下载，未完成任务的 future 不再完成"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            inflight = list(self._inflight)
+            self._cond.notify_all()
+        for deadline in inflight:
+            deadline.cancel()
+        self._downloads.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _schedule(self, job, delay):
+        """安排任务的下次查询，调用方持有锁"""
+        job.next_poll = time.monotonic() + delay
+        heapq.heappush(self._heap, (job.next_poll, next(self._seq), job))
+        self._cond.notify()
+
+    def _reschedule(self, job, delay):
+        with self._cond:
+            if not self._closed and not job.done:
+                self._schedule(job, delay)
+
+    def _wake(self, job):
+        """future 被调用方取消时立即处理，不等到下次查询"""
+        self._reschedule(job, 0.0)
+
+    def _update_gauge(self):
+        """更新进行中任务数指标，调用方持有锁"""
+        self.metrics.set("vivo_draw_jobs_active", sum(1 for job in self._jobs.values() if not job.done))
+
+    @contextmanager
+    def _operation(self, timeout=None):
+        """为一次查询或下载创建 Deadline，调度器关闭时取消"""
+        deadline = Deadline(timeout)
+        with self._cond:
+            if self._closed:
+                deadline.cancel()
+            self._inflight.add(deadline)
+        try:
+            yield deadline
+        finally:
+            with self._cond:
+                self._inflight.discard(deadline)
+
+    def _run(self):
+        """后台线程：按下次查询时间依次查询到期的任务"""
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if self._closed:
+                    return
+                next_poll, _, job = heapq.heappop(self._heap)
+            # 任务被重新安排过时，旧的堆条目直接丢弃
+            if job.done or next_poll != job.next_poll:
+                continue
+            try:
+                self._poll(job)
+            except Exception as e:
+                if self._closed:
+                    # 调度器正在关闭，进行中的请求已被取消
+                    return
+                # 单个任务出错只结束该任务，不影响其它任务的查询
+                self.metrics.inc("vivo_draw_poll_errors_total")
+                self._finish(job, FAILED, f"查询任务状态失败: {e}")
+
+    def _poll(self, job):
+        """查询一次任务进度并根据结果完成任务或安排下次查询"""
+        if job.future.cancelled():
+            error = None
+            try:
+                with self._operation(self.vivo_art.transport.connect_timeout) as deadline:
+                    response = self.vivo_art.cancel_task(job.task_id, deadline)
+                if response.get("code") != 200:
+                    error = f"取消服务端任务失败: {response.get('msg')}"
+            except Exception as e:
+                # 服务端取消失败或超时不影响本地结束跟踪
+                error = f"取消服务端任务失败: {e}"
+            if error:
+                self.metrics.inc("vivo_draw_cancel_errors_total")
+            self._finish(job, CANCELED, error)
+            return
+        if time.time() - job.submitted_at > self.max_wait:
+            self._finish(job, TIMEOUT, "任务等待超时")
+            return
+
+        try:
+            with self._operation() as deadline:
+                progress = self.vivo_art.query_task_progress(job.task_id, deadline)
+        except Exception as e:
+            if self._closed:
+                raise
+            progress = {"code": "ERROR", "msg": str(e)}
+        job.polls += 1
+
+        if progress.get("code") != 200:
+            job.poll_errors += 1
+            job.error = progress.get("msg", "查询任务状态失败")
+            if job.poll_errors >= MAX_POLL_ERRORS:
+                self._finish(job, FAILED)
+            else:
+                self._reschedule(job, min(self.max_interval, self.min_interval * BACKOFF_FACTOR ** job.poll_errors))
+            return
+
+        result = progress["result"]
+        job.poll_errors = 0
+        job.error = None
+        job.progress = progress
+        job.queue_ahead = result.get("queue_ahead", 0)
+        job.task_eta = result.get("task_eta", 0)
+        status = result.get("status")
+
+        if status == 2 and result.get("finished"):
+            job.image_urls = result.get("images_url") or []
+            if self.download and job.image_urls:
+                job.state = DOWNLOADING
+                try:
+                    self._downloads.submit(self._download, job)
+                except RuntimeError:
+                    # 下载线程池已关闭
+                    pass
+            else:
+                try:
+                    self.vivo_art.remember_result(job.task_id, job.prompt, job.params, job.image_urls)
+                except Exception:
+                    # 写入索引失败不影响任务结果
+                    pass
+                self._finish(job, DONE)
+        elif status == 3:
+            self._finish(job, FAILED, "任务处理失败")
+        elif status == 4:
+            self._finish(job, CANCELED)
+        else:
+            job.state = QUEUED if status == 0 else RUNNING
+            job.blind_polls = 0 if job.task_eta or job.queue_ahead else job.blind_polls + 1
+            self._reschedule(job, next_poll_delay(result, max(0, job.blind_polls - 1), self.min_interval,
+                                                  self.max_interval))
+
+    def _download(self, job):
+        """并行下载任务中尚未下载的图片，文件名与手动下载时相同
+
+        图片下载完整后才重命名到目标路径。已记入绘画结果索引(移入按内容哈希存放的目录)
+        或目标文件已存在的图片说明之前已经下载完成，不再重复下载。
+        """
+        filenames = [f"drawing_{job.task_id}_{i}.jpg" for i in range(len(job.image_urls))]
+        try:
+            stored = self.vivo_art.result_files(job.task_id)
+        except Exception:
+            stored = []
+        files = []
+        for i, filename in enumerate(filenames):
+            filepath = stored[i] if len(stored) == len(filenames) else None
+            if filepath is None and os.path.exists(os.path.join(self.output_dir, filename)):
+                filepath = os.path.join(self.output_dir, filename)
+            files.append(filepath)
+        missing = [i for i, filepath in enumerate(files) if filepath is None]
+        try:
+            with self._operation(self.download_timeout) as deadline:
+                results = self.vivo_art.download_images([job.image_urls[i] for i in missing], self.output_dir,
+                                                        [filenames[i] for i in missing], deadline)
+        except RequestCancelled:
+            return
+        except Exception as e:
+            results = []
+            job.error = f"图片下载失败: {e}"
+        for i, result in zip(missing, results):
+            if result.ok:
+                files[i] = result.filepath
+        failed = [result for result in results if not result.ok]
+        if failed:
+            job.error = f"图片下载失败: {failed[0].error}"
+        # 启用绘画结果索引时图片移入按内容哈希存放的目录
+        try:
+            files = self.vivo_art.remember_result(job.task_id, job.prompt, job.params, job.image_urls, files,
+                                                  {result.filepath: result.sha256 for result in results if result.ok})
+        except Exception as e:
+            job.error = f"记录绘画结果失败: {e}"
+        job.files = [filepath for filepath in files if filepath]
+        self._finish(job, DONE)
+
+    def _finish(self, job, state, error=None):
+        """任务到达终态：记录结果、完成 future 并通知调用方"""
+        with self._cond:
+            if job.done:
+                return
+            job.state = state
+            job.finished_at = time.time()
+            if error:
+                job.error = error
+            self._update_gauge()
+        self.metrics.inc("vivo_draw_jobs_total", state=state)
+        self.metrics.observe("vivo_draw_job_seconds", job.elapsed(), state=state)
+        # 先通知再完成 future，等待 future 的调用方醒来时通知已经打印
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception:
+                pass
+        try:
+            job.future.set_result(job)
+        except InvalidStateError:
+            # 调用方已取消 future
+            pass
@@ -3,8 +3,8 @@
 
 import os
 import time
-import sys
-from chat_ui import Color
+from chat_ui import Color, Spinner
+from draw_scheduler import PENDING, QUEUED, RUNNING, DOWNLOADING, DONE, FAILED, CANCELED, TIMEOUT
 
 # 绘画ASCII艺术 - 现代简约风格
 DRAWING_ASCII = """
@@ -28,9 +28,12 @@ def print_drawing_welcome():
     print(f"{Color.BRIGHT_BLUE}支持命令: {Color.RESET}")
     print(f"  {Color.BRIGHT_CYAN}○ /draw <提示词> {Color.RESET}- 创建新的绘图")
     print(f"  {Color.BRIGHT_CYAN}○ /styles {Color.RESET}- 显示可用绘画风格")
-    print(f"  {Color.BRIGHT_CYAN}○ /prompts {Color.RESET}- 显示绘画提示词推荐")
+    print(f"  {Color.BRIGHT_CYAN}○ /prompts [关键词] {Color.RESET}- 显示或搜索绘画提示词推荐")
     print(f"  {Color.BRIGHT_CYAN}○ /status <任务ID> {Color.RESET}- 查询任务状态")
     print(f"  {Color.BRIGHT_CYAN}○ /cancel <任务ID> {Color.RESET}- 取消绘画任务")
+    print(f"  {Color.BRIGHT_CYAN}○ /jobs {Color.RESET}- 查看所有后台绘画任务")
+    print(f"  {Color.BRIGHT_CYAN}○ /download [任务ID] {Color.RESET}- 重新下载未下载完的图片")
+    print(f"  {Color.BRIGHT_CYAN}○ /history [关键词] {Color.RESET}- 搜索绘画历史")
     print(f"  {Color.BRIGHT_CYAN}○ /settings {Color.RESET}- 查看或修改绘画设置\n")
 
 def print_drawing_header():
@@ -72,10 +75,13 @@ def print_styles(styles):
     
     print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
 
-def print_prompts(prompts):
-    """打印推荐提示词"""
+def print_prompts(prompts, query=""):
+    """打印推荐提示词，query 为搜索词"""
     if not prompts or "result" not in prompts or not prompts["result"]:
-        print(f"{Color.RED}获取推荐提示词失败!{Color.RESET}")
+        if query:
+            print(f"{Color.YELLOW}没有找到包含 {query} 的推荐提示词{Color.RESET}")
+        else:
+            print(f"{Color.RED}获取推荐提示词失败!{Color.RESET}")
         return
     
     print(f"\n{Color.BRIGHT_BLUE}{Color.BOLD}┌─{' 绘画推荐提示词 ':─^50}─┐{Color.RESET}")
@@ -101,11 +107,21 @@ def print_task_submitted(response):
     task_type = response["result"].get("task_type", "")
     model = response["result"].get("model", "")
     
+    if response["result"].get("cached"):
+        print(f"\n{Color.BRIGHT_BLUE}{Color.BOLD}┌─{' 命中绘画结果缓存 ':─^49}─┐{Color.RESET}")
+        print(f"{Color.BRIGHT_BLUE}│{Color.RESET} 任务ID: {task_id}")
+        print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.GRAY}相同参数和种子生成过，未提交新任务{Color.RESET}")
+        for filepath in response["result"].get("files", []):
+            print(f"{Color.BRIGHT_BLUE}│{Color.RESET} 图片: {filepath}")
+        print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
+        return task_id
+    
     print(f"\n{Color.BRIGHT_BLUE}{Color.BOLD}┌─{' 绘画任务已提交 ':─^50}─┐{Color.RESET}")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} 任务ID: {task_id}")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} 任务类型: {task_type}")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} 模型版本: {model}")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}")
+    print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.GRAY}任务在后台执行，完成后自动下载图片，使用 '/jobs' 查看所有任务{Color.RESET}")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.GRAY}使用 '/status {task_id}' 查询任务状态{Color.RESET}")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.GRAY}使用 '/cancel {task_id}' 取消任务{Color.RESET}")
     print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
@@ -180,36 +196,94 @@ def print_image_saved(filepath):
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} 路径: {filepath}")
     print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
 
-def print_drawing_progress(wait_message="绘画中"):
-    """打印绘画进度动画"""
-    sys.stdout.write(f"\r{Color.BRIGHT_CYAN}{wait_message}")
-    for i in range(3):
-        time.sleep(0.3)
-        sys.stdout.write("●")
-    sys.stdout.flush()
-    
-def print_drawing_animation(seconds=5):
-    """打印绘画过程的动画，持续指定的秒数"""
-    frames = [
-        "⚪⚪⚪⚪⚪",
-        "⚫⚪⚪⚪⚪",
-        "⚫⚫⚪⚪⚪",
-        "⚫⚫⚫⚪⚪",
-        "⚫⚫⚫⚫⚪",
-        "⚫⚫⚫⚫⚫",
-    ]
-    
-    start_time = time.time()
-    frame_index = 0
-    
-    while time.time() - start_time < seconds:
-        sys.stdout.write(f"\r{Color.BRIGHT_BLUE}{Color.BOLD}AI绘画进行中 {frames[frame_index]}{Color.RESET}")
-        sys.stdout.flush()
-        frame_index = (frame_index + 1) % len(frames)
-        time.sleep(0.2)
-    
-    sys.stdout.write("\r" + " " * 50 + "\r")
-    sys.stdout.flush()
+# 后台任务状态的显示文本
+JOB_STATE_TEXT = {
+    PENDING: f"{Color.GRAY}已提交{Color.RESET}",
+    QUEUED: f"{Color.YELLOW}队列中{Color.RESET}",
+    RUNNING: f"{Color.BRIGHT_BLUE}处理中{Color.RESET}",
+    DOWNLOADING: f"{Color.BRIGHT_BLUE}下载中{Color.RESET}",
+    DONE: f"{Color.GREEN}已完成{Color.RESET}",
+    FAILED: f"{Color.RED}处理失败{Color.RESET}",
+    CANCELED: f"{Color.YELLOW}已取消{Color.RESET}",
+    TIMEOUT: f"{Color.RED}等待超时{Color.RESET}"
+}
+
+def print_jobs(jobs):
+    """打印所有后台绘画任务"""
+    if not jobs:
+        print(f"{Color.YELLOW}当前没有后台绘画任务{Color.RESET}")
+        return
+    
+    print(f"\n{Color.BRIGHT_BLUE}{Color.BOLD}┌─{' 后台绘画任务 ':─^52}─┐{Color.RESET}")
+    for job in jobs:
+        prompt = job.prompt if len(job.prompt) <= 20 else job.prompt[:20] + "…"
+        detail = f"已用时 {job.elapsed():.0f}秒"
+        if job.state == QUEUED:
+            detail += f"，排队位置 {job.queue_ahead}，预计 {job.task_eta}秒"
+        elif job.state == RUNNING and job.task_eta:
+            detail += f"，预计 {job.task_eta}秒"
+        print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {job.task_id}  {JOB_STATE_TEXT[job.state]}  {detail}")
+        print(f"{Color.BRIGHT_BLUE}│{Color.RESET}   {Color.GRAY}{prompt}{Color.RESET}")
+        for filepath in job.files:
+            print(f"{Color.BRIGHT_BLUE}│{Color.RESET}   {Color.GREEN}{filepath}{Color.RESET}")
+        if job.error:
+            print(f"{Color.BRIGHT_BLUE}│{Color.RESET}   {Color.RED}{job.error}{Color.RESET}")
+    print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
+
+def print_job_finished(job):
+    """后台任务结束时打印通知，在调度器线程中调用"""
+    if job.cached:
+        # 命中缓存时提交结果中已经显示了图片
+        return
+    if job.succeeded and job.files:
+        files = "，".join(job.files)
+        print(f"\n{Color.GREEN}[绘画完成] {job.task_id} 用时{job.elapsed():.0f}秒，图片已保存: {files}{Color.RESET}")
+    else:
+        reason = f": {job.error}" if job.error else ""
+        print(f"\n{Color.YELLOW}[绘画任务] {job.task_id} {JOB_STATE_TEXT[job.state]}{Color.YELLOW}{reason}{Color.RESET}")
+
+def print_download_retry(jobs):
+    """打印 /download 命令重新开始下载的任务"""
+    if not jobs:
+        print(f"{Color.YELLOW}没有需要重新下载的任务{Color.RESET}")
+        return
+    for job in jobs:
+        if job.image_urls:
+            print(f"{Color.CYAN}任务 {job.task_id} 正在重新下载 {len(job.image_urls) - len(job.files)} 张图片，"
+                  f"完成后通知{Color.RESET}")
+        else:
+            print(f"{Color.CYAN}任务 {job.task_id} 已加入后台跟踪，完成后自动下载图片{Color.RESET}")
+
+def print_draw_history(entries, keyword=""):
+    """打印绘画历史搜索结果
+
+    Args:
+        entries: DrawCache.search 的结果，未启用绘画结果索引时为None
+        keyword: 搜索关键词
+    """
+    if entries is None:
+        print(f"{Color.YELLOW}未启用绘画结果索引，没有绘画历史{Color.RESET}")
+        return
+    if not entries:
+        print(f"{Color.YELLOW}没有找到{'包含 ' + keyword + ' 的' if keyword else ''}绘画记录{Color.RESET}")
+        return
+    
+    print(f"\n{Color.BRIGHT_BLUE}{Color.BOLD}┌─{' 绘画历史 ':─^54}─┐{Color.RESET}")
+    for entry in entries:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created"]))
+        params = entry["params"]
+        detail = f"{params.get('width')}x{params.get('height')} 种子 {params.get('seed')}" if params else ""
+        hits = f"  命中 {entry['hits']} 次" if entry["hits"] else ""
+        print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {created}  {entry['task_id']}  {Color.GRAY}{detail}{hits}{Color.RESET}")
+        if entry["prompt"]:
+            print(f"{Color.BRIGHT_BLUE}│{Color.RESET}   {entry['prompt']}")
+        for filepath in entry["files"]:
+            print(f"{Color.BRIGHT_BLUE}│{Color.RESET}   {Color.GREEN}{filepath}{Color.RESET}")
+    print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
+
+def drawing_spinner(message="AI绘画进行中"):
+    """创建绘画请求的动画，在请求进行期间于后台播放"""
+    return Spinner(message)
 
 def print_drawing_settings(settings):
     """打印绘画设置"""
@@ -226,7 +300,7 @@ def print_help_drawing():
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/draw <提示词> {Color.RESET}- 创建新的绘图")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}   例如: /draw 一只可爱的小猫")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}   支持参数:")
-    print(f"{Color.BRIGHT_BLUE}│{Color.RESET}     --style <风格ID> : 指定绘画风格")
+    print(f"{Color.BRIGHT_BLUE}│{Color.RESET}     --style <风格ID或名称> : 指定绘画风格")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}     --width <宽> : 设置宽度(像素)")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}     --height <高> : 设置高度(像素)")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}     --cfg <数值> : 设置文本相关度(3-15)")
@@ -235,9 +309,12 @@ def print_help_drawing():
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}     --negative <文本> : 设置反向提示词")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET}")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/styles {Color.RESET}- 显示可用绘画风格")
-    print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/prompts {Color.RESET}- 显示绘画提示词推荐")
+    print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/prompts [关键词] {Color.RESET}- 显示或搜索绘画提示词推荐")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/status <任务ID> {Color.RESET}- 查询任务状态")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/cancel <任务ID> {Color.RESET}- 取消绘画任务")
+    print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/jobs {Color.RESET}- 查看所有后台绘画任务")
+    print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/download [任务ID] {Color.RESET}- 重新下载未下载完的图片")
+    print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/history [关键词] {Color.RESET}- 搜索绘画历史")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/settings {Color.RESET}- 查看或修改绘画设置")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/back {Color.RESET}- 返回聊天模式")
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.BRIGHT_CYAN}/help {Color.RESET}- 显示此帮助信息")
@@ -247,5 +324,6 @@ def print_help_drawing():
 if __name__ == "__main__":
     print_drawing_welcome()
     print_drawing_header()
-    print_drawing_animation(3)
+    with drawing_spinner():
+        time.sleep(3)
     print_help_drawing() 
\ No newline at end of file
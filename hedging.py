@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import asyncio
+import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from metrics import get_default_registry
+from deadline import Deadline
+
+# 默认对冲配置
+DEFAULT_HEDGE_PERCENTILE = 0.95  # 首次请求超过该分位的耗时仍未返回时发出对冲请求
+DEFAULT_HEDGE_BUDGET = 0.05      # 对冲请求占请求总数的比例上限
+DEFAULT_MIN_SAMPLES = 20         # 耗时样本少于该数量时不对冲
+DEFAULT_MIN_DELAY = 0.05         # 对冲等待时间的下限(秒)
+
+def _run_in_thread(run):
+    """在后台线程中执行 run，返回对应的 Future"""
+    future = Future()
+
+    def target():
+        try:
+            future.set_result(run())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+def _linked_deadline(parent):
+    """为一次运行创建独立的 Deadline，截止时间与 parent 相同，parent 取消时一并取消
+
+    Returns:
+        (Deadline, 撤销与 parent 关联的函数)
+    """
+    if parent is None:
+        return Deadline(), lambda: None
+    deadline = Deadline(parent.remaining())
+    return deadline, parent.on_cancel(deadline.cancel)
+
+class HedgePolicy:
+    """对冲请求策略
+
+    非流式请求超过该接口历史耗时的 percentile 分位仍未返回时，再发出一个同样的请求
+    (重新生成请求ID和签名)，先返回的结果生效，另一个被取消或丢弃。
+    对冲请求数不超过总请求数的 budget 比例，只增加少量额外负载。
+    等待时间取自 vivo_request_seconds 直方图，与 /stats 中显示的耗时一致。
+    """
+
+    def __init__(self, percentile=DEFAULT_HEDGE_PERCENTILE, budget=DEFAULT_HEDGE_BUDGET,
+                 min_samples=DEFAULT_MIN_SAMPLES, min_delay=DEFAULT_MIN_DELAY, metrics=None):
+        """初始化对冲策略
+
+        Args:
+            percentile: 0到1之间的分位，首次请求超过该分位的耗时后发出对冲请求
+            budget: 对冲请求占请求总数的比例上限
+            min_samples: 接口的耗时样本少于该数量时不对冲
+            min_delay: 对冲等待时间的下限(秒)
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.metrics = metrics or get_default_registry()
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def delay(self, endpoint):
+        """计算接口的对冲等待时间，样本不足时返回None"""
+        if self.metrics.count("vivo_request_seconds", endpoint=endpoint) < self.min_samples:
+            return None
+        latency = self.metrics.percentile("vivo_request_seconds", self.percentile, endpoint=endpoint)
+        return max(self.min_delay, latency) if latency is not None else None
+
+    def _start(self):
+        """记录一次请求"""
+        with self._lock:
+            self.requests += 1
+
+    def _take_budget(self, endpoint):
+        """申请发出一个对冲请求，超出预算时返回False"""
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                self.metrics.inc("vivo_hedges_skipped_total", endpoint=endpoint)
+                return False
+            self.hedges += 1
+        self.metrics.inc("vivo_hedges_total", endpoint=endpoint)
+        return True
+
+    def _record_winner(self, endpoint, hedged_won):
+        """记录对冲请求先返回的次数"""
+        if hedged_won:
+            self.metrics.inc("vivo_hedge_wins_total", endpoint=endpoint)
+
+    def call(self, endpoint, run, deadline=None):
+        """按对冲策略执行请求
+
+        每次运行使用各自的 Deadline，先成功返回的一方生效后取消另一方的 Deadline，
+        传输层随之关闭其连接，落后的请求不再占用流量控制许可和凭据。
+
+        Args:
+            endpoint: 接口名称，用于查询耗时分位和记录指标
+            run: 接收 Deadline 的函数，每次调用都独立签名并发送一次完整请求(含重试)，请求需使用传入的 Deadline
+            deadline: 调用方的 Deadline令牌，取消或超时时两次运行一并结束
+
+        Returns:
+            先成功返回的结果，两次都失败时抛出首次请求的异常
+        """
+        self._start()
+        delay = self.delay(endpoint)
+        if delay is None:
+            return run(deadline)
+
+        primary_deadline, release_primary = _linked_deadline(deadline)
+        try:
+            primary = _run_in_thread(lambda: run(primary_deadline))
+            done, _ = wait([primary], timeout=delay)
+            if done or not self._take_budget(endpoint):
+                return primary.result()
+
+            hedged_deadline, release_hedged = _linked_deadline(deadline)
+            try:
+                hedged = _run_in_thread(lambda: run(hedged_deadline))
+                pending = {primary, hedged}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.exception() is None:
+                            self._record_winner(endpoint, future is hedged)
+                            # 取消落后的一方
+                            (primary_deadline if future is hedged else hedged_deadline).cancel()
+                            return future.result()
+                return primary.result()
+            finally:
+                release_hedged()
+        finally:
+            release_primary()
+
+    async def acall(self, endpoint, run):
+        """call 的异步版本，run 为无参的协程函数，落后的一方会被取消"""
+        self._start()
+        delay = self.delay(endpoint)
+        if delay is None:
+            return await run()
+
+        primary = asyncio.create_task(run())
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._take_budget(endpoint):
+                return await primary
+
+            hedged = asyncio.create_task(run())
+            pending = {primary, hedged}
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            self._record_winner(endpoint, task is hedged)
+                            return task.result()
+                return primary.result()
+            finally:
+                for task in pending:
+                    task.cancel()
+                # 等待被取消的一方归还连接和流量控制许可
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            if not primary.done():
+                primary.cancel()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util import connection
+from dns_cache import get_default_dns_cache
+from metrics import get_default_registry
+from retry_policy import RetryPolicy
+
+# 默认连接池与超时配置
+DEFAULT_POOL_CONNECTIONS = 4     # 缓存的主机连接池数量
+DEFAULT_POOL_MAXSIZE = 16        # 每个主机保持的最大连接数
+DEFAULT_CONNECT_TIMEOUT = 5.0    # 建立连接超时(秒)
+DEFAULT_READ_TIMEOUT = 60.0      # 读取超时(秒)，流式响应中即两次数据之间的最大间隔
+DEFAULT_REFRESH_INTERVAL = 30.0  # 预热连接空闲多久后发送请求保活(秒)
+
+def _timed_connection_class(base, metrics, dns_cache):
+    """创建记录建连耗时的urllib3连接类
+
+    主机名通过共享的DNS缓存解析，TLS仍按原主机名校验证书。
+    TCP建连耗时在 _new_conn 中测量，TLS握手耗时为 connect 总耗时减去TCP部分。
+    """
+    class TimedConnection(base):
+        _tcp_seconds = 0.0
+
+        def _open_socket(self, address):
+            return connection.create_connection(
+                address, self.timeout, source_address=self.source_address, socket_options=self.socket_options
+            )
+
+        def _new_conn(self):
+            start = time.perf_counter()
+            # 与 urllib3 的 _new_conn 相同的异常转换
+            try:
+                sock = dns_cache.connect(self._dns_host, self.port, self._open_socket)
+            except socket.gaierror as e:
+                raise NameResolutionError(self.host, self, e) from e
+            except socket.timeout as e:
+                raise ConnectTimeoutError(
+                    self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+                ) from e
+            except OSError as e:
+                raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+            self._tcp_seconds = time.perf_counter() - start
+            metrics.observe("vivo_tcp_connect_seconds", self._tcp_seconds, host=self.host)
+            return sock
+
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            total = time.perf_counter() - start
+            metrics.inc("vivo_connections_total", host=self.host)
+            metrics.observe("vivo_connect_seconds", total, host=self.host)
+            if isinstance(self, HTTPSConnection):
+                metrics.observe("vivo_tls_handshake_seconds", max(0.0, total - self._tcp_seconds), host=self.host)
+
+    TimedConnection.__name__ = f"Timed{base.__name__}"
+    return TimedConnection
+
+class _MeteredAdapter(HTTPAdapter):
+    """新建连接时记录建连和TLS握手耗时的适配器"""
+
+    def __init__(self, metrics, dns_cache, **kwargs):
+        # HTTPAdapter.__init__ 会调用 init_poolmanager，需先设置注册表和DNS缓存
+        self._metrics = metrics
+        self._dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("TimedHTTPConnectionPool", (HTTPConnectionPool,), {
+                "ConnectionCls": _timed_connection_class(HTTPConnection, self._metrics, self._dns_cache)
+            }),
+            "https": type("TimedHTTPSConnectionPool", (HTTPSConnectionPool,), {
+                "ConnectionCls": _timed_connection_class(HTTPSConnection, self._metrics, self._dns_cache)
+            })
+        }
+
+def _close_on_cancel(response, deadline):
+    """deadline 取消时关闭流式响应
+
+    响应关闭或读完后撤销登记，多次请求共用的 Deadline 不会持有已结束的响应。
+    """
+    remove = deadline.on_cancel(response.close)
+    close, iter_content = response.close, response.iter_content
+
+    def close_and_remove():
+        remove()
+        close()
+
+    def iter_and_remove(*args, **kwargs):
+        yield from iter_content(*args, **kwargs)
+        remove()
+
+    response.close = close_and_remove
+    response.iter_content = iter_and_remove
+
+class HttpTransport:
+    """共享的HTTP传输层
+
+    基于 requests.Session 的连接池，VivoGPT、VivoArtAPI 和 VivoVisionAPI
+    共用同一个实例时，对同一主机的请求会复用已建立的TCP/TLS连接。
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 keep_alive=True, metrics=None, retry_policy=None, hedge_policy=None, dns_cache=None):
+        """初始化传输层
+
+        Args:
+            pool_connections: 缓存的主机连接池数量
+            pool_maxsize: 每个主机连接池的最大连接数
+            connect_timeout: 建立连接超时(秒)
+            read_timeout: 读取超时(秒)
+            keep_alive: 是否保持长连接，为False时每次请求后关闭连接
+            metrics: MetricsRegistry指标注册表，用于记录建连耗时，未提供时使用进程内默认注册表
+            retry_policy: 共用该连接池的客户端使用的RetryPolicy，未提供时使用默认配置
+            hedge_policy: 非流式请求使用的HedgePolicy对冲策略，None表示不对冲
+            dns_cache: DnsCache解析缓存，未提供时使用进程内共享的缓存
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+
+        self.metrics = metrics or get_default_registry()
+        self.retry_policy = retry_policy or RetryPolicy(metrics=self.metrics)
+        self.hedge_policy = hedge_policy
+        self.dns_cache = dns_cache or get_default_dns_cache()
+        self._last_used = time.monotonic()
+        self._closed = threading.Event()
+        self.session = requests.Session()
+        adapter = _MeteredAdapter(
+            self.metrics,
+            self.dns_cache,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def request(self, method, url, timeout=None, deadline=None, **kwargs):
+        """发送HTTP请求
+
+        Args:
+            method: 请求方法
+            url: 请求URL
+            timeout: 超时配置，未提供时使用(连接超时, 读取超时)
+            deadline: Deadline令牌，连接和读取超时不超过剩余时间，取消时关闭流式响应
+            **kwargs: 透传给 requests 的其它参数
+
+        Returns:
+            requests.Response 对象
+        """
+        if timeout is None:
+            timeout = (self.connect_timeout, self.read_timeout)
+        if deadline is not None:
+            timeout = deadline.timeout(*(timeout if isinstance(timeout, tuple) else (timeout, timeout)))
+        self._last_used = time.monotonic()
+        response = self.session.request(method, url, timeout=timeout, **kwargs)
+        if deadline is not None and kwargs.get("stream"):
+            _close_on_cancel(response, deadline)
+        return response
+
+    def get(self, url, **kwargs):
+        """发送GET请求"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """发送POST请求"""
+        return self.request("POST", url, **kwargs)
+
+    def prewarm(self, url, connections=1, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """在后台建立到 url 所在主机的连接并放入连接池
+
+        同时发出 connections 个HEAD请求，完成DNS解析、TCP建连和TLS握手，
+        之后的首个请求可直接复用连接。refresh_interval 秒内没有请求时再次发送，
+        避免空闲连接被服务端关闭。预热失败不影响正常请求。
+
+        Args:
+            url: 预热的地址，通常是API的 base_url
+            connections: 预热的连接数，不超过 pool_maxsize
+            refresh_interval: 空闲保活间隔(秒)，None表示只预热一次
+
+        Returns:
+            执行预热的后台线程
+        """
+        connections = max(1, min(connections, self.pool_maxsize))
+
+        def warm_one():
+            start = time.perf_counter()
+            try:
+                self.session.head(url, timeout=(self.connect_timeout, self.read_timeout), allow_redirects=False)
+            except requests.RequestException:
+                self.metrics.inc("vivo_prewarm_failures_total")
+                return
+            self.metrics.observe("vivo_prewarm_seconds", time.perf_counter() - start)
+
+        def warm():
+            # 并发请求才会各自占用一个连接
+            workers = [threading.Thread(target=warm_one, daemon=True) for _ in range(connections)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        def run():
+            warm()
+            if refresh_interval is None or not self.keep_alive:
+                return
+            while not self._closed.wait(refresh_interval):
+                if time.monotonic() - self._last_used >= refresh_interval:
+                    warm()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """关闭连接池中的所有连接，停止预热保活"""
+        self._closed.set()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def response_json(response):
+    """读取响应的JSON，HTTP状态码不是200时返回错误字典
+
+    Args:
+        response: requests.Response
+
+    Returns:
+        响应字典，或 {"code": 状态码, "msg": 响应文本}
+    """
+    if response.status_code != 200:
+        return {"code": response.status_code, "msg": response.text}
+    return response.json()
+
+# 进程内默认共享的传输层
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+def get_default_transport():
+    """获取进程内共享的默认传输层，首次调用时创建"""
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = HttpTransport()
+    return _default_transport
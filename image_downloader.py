@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from http_transport import get_default_transport
+from metrics import get_default_registry, RequestMetrics
+from deadline import DeadlineExceeded, RequestCancelled
+
+DEFAULT_WORKERS = 4              # 并行下载数
+DEFAULT_CHUNK_SIZE = 64 * 1024   # 每次读取和写入的字节数
+DEFAULT_MAX_ATTEMPTS = 3         # 传输中断后从断点续传的最多尝试次数
+PART_SUFFIX = ".part"            # 下载中的临时文件后缀，完成后原子重命名为目标文件
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+def parse_content_range(value):
+    """解析 Content-Range 响应头
+
+    Returns:
+        (起始偏移, 总大小) 元组，无法解析的部分为None
+    """
+    match = _CONTENT_RANGE.match(value or "")
+    if not match:
+        return None, None
+    start = int(match.group(1)) if match.group(1) is not None else None
+    total = int(match.group(3)) if match.group(3) != "*" else None
+    return start, total
+
+def file_sha256(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """计算文件内容的SHA256"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher
+
+class DownloadResult:
+    """一次下载的结果
+
+    成功时 error 为None，sha256 为边下载边计算的内容哈希；
+    失败时已下载的部分保留在 filepath + PART_SUFFIX 中，下次下载同一路径时从断点续传。
+    """
+
+    def __init__(self, url, filepath, size=0, sha256=None, resumed=0, error=None):
+        self.url = url
+        self.filepath = filepath
+        self.size = size
+        self.sha256 = sha256
+        self.resumed = resumed  # 从已有临时文件续传的字节数
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+class ImageDownloader:
+    """图片下载引擎
+
+    通过共享的 HttpTransport 连接池并行下载多张图片。数据先写入 .part 临时文件，
+    边写边计算SHA256，大小与响应声明的一致后原子重命名为目标文件，目标路径上不会出现不完整的图片。
+    传输中断时保留临时文件，之后用 Range 请求从断点继续。可在多个线程中共用。
+    """
+
+    def __init__(self, transport=None, metrics=None, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """初始化下载引擎
+
+        Args:
+            transport: 共享的HttpTransport，未提供时使用进程内默认连接池
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            workers: 并行下载数
+            chunk_size: 每次读取和写入的字节数
+            max_attempts: 传输中断后从断点续传的最多尝试次数
+        """
+        self.transport = transport or get_default_transport()
+        self.metrics = metrics or get_default_registry()
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self._executor = None
+        self._lock = threading.Lock()
+        self._path_locks = {}  # 目标路径 -> [锁, 使用数]，同一文件同时只有一个下载，没有下载时移除
+
+    @contextmanager
+    def _path_lock(self, filepath):
+        """持有目标路径的锁，最后一个使用者释放时移除"""
+        key = os.path.abspath(filepath)
+        with self._lock:
+            entry = self._path_locks.get(key)
+            if entry is None:
+                entry = self._path_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._path_locks[key]
+
+    def download(self, url, filepath, deadline=None):
+        """下载单张图片
+
+        Args:
+            url: 图片URL
+            filepath: 保存路径，所在目录需已存在
+            deadline: Deadline令牌，超时或取消时停止下载并抛出异常，已下载的部分保留用于续传
+
+        Returns:
+            DownloadResult
+        """
+        with self._path_lock(filepath):
+            return self._download(url, filepath, deadline)
+
+    def _download(self, url, filepath, deadline):
+        part = filepath + PART_SUFFIX
+        existing = os.path.getsize(part) if os.path.exists(part) else 0
+        resumed = 0
+        error = None
+
+        for _ in range(self.max_attempts):
+            # 每次尝试单独计时，尝试结束时归还其占用的流量控制许可
+            tracker = RequestMetrics(self.metrics, "draw_download")
+            hasher = None
+            done = False
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else None
+            try:
+                response = self.transport.retry_policy.call(
+                    "draw_download",
+                    lambda credential: tracker.send(self.transport.get, url, headers=headers, stream=True,
+                                                    deadline=deadline),
+                    tracker, deadline=deadline
+                )
+            except (DeadlineExceeded, RequestCancelled):
+                raise
+            except Exception as e:
+                error = f"下载失败: {e}"
+                continue
+
+            try:
+                with response:
+                    status = response.status_code
+                    if status == 416 and offset:
+                        # 临时文件已包含全部内容，或与服务端文件不一致
+                        _, total = parse_content_range(response.headers.get("Content-Range"))
+                        if total == offset:
+                            hasher = file_sha256(part, self.chunk_size)
+                            resumed = existing
+                            done = True
+                            break
+                        os.remove(part)
+                        error = "续传位置超出文件大小"
+                        continue
+                    if status not in (200, 206):
+                        error = f"下载失败，状态码: {status}"
+                        if 400 <= status < 500:
+                            # 地址失效等客户端错误，重试无意义
+                            break
+                        continue
+
+                    start, total = parse_content_range(response.headers.get("Content-Range"))
+                    if status == 206 and start != offset:
+                        # 返回的片段不从断点开始，不能拼接到已有内容后，丢弃临时文件后不带 Range 从头下载
+                        if os.path.exists(part):
+                            os.remove(part)
+                        error = f"续传位置不符: 请求 {offset}，返回 {start}"
+                        continue
+                    if status == 206 and offset:
+                        # 续传：先用已有内容初始化哈希
+                        hasher = file_sha256(part, self.chunk_size)
+                        mode = "ab"
+                        resumed = existing
+                    else:
+                        # 服务端忽略了 Range，从头下载
+                        hasher = hashlib.sha256()
+                        mode = "wb"
+                        resumed = 0
+                        if status == 200:
+                            length = response.headers.get("Content-Length")
+                            total = int(length) if length and length.isdigit() else None
+
+                    try:
+                        with open(part, mode) as f:
+                            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                                if deadline is not None:
+                                    deadline.check()
+                                if chunk:
+                                    f.write(chunk)
+                                    hasher.update(chunk)
+                                    tracker.add_bytes(len(chunk))
+                    except (DeadlineExceeded, RequestCancelled):
+                        raise
+                    except Exception as e:
+                        # 取消时连接已被关闭，读取报出的错误换成取消或超时异常
+                        if deadline is not None:
+                            deadline.check()
+                        error = f"传输中断: {e}"
+                        hasher = None
+                        self.metrics.inc("vivo_download_interrupted_total")
+                        continue
+
+                size = os.path.getsize(part)
+                if total is not None and size != total:
+                    error = f"文件大小不符: 已下载 {size} 字节，应为 {total} 字节"
+                    if size > total:
+                        os.remove(part)
+                    hasher = None
+                    continue
+                done = True
+                break
+            finally:
+                tracker.finish(api_code=None if done else "error")
+
+        if hasher is None:
+            return DownloadResult(url, filepath, error=error or "下载失败")
+
+        size = os.path.getsize(part)
+        os.replace(part, filepath)
+        if resumed:
+            self.metrics.inc("vivo_download_resumed_bytes_total", resumed)
+        return DownloadResult(url, filepath, size, hasher.hexdigest(), resumed)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-download")
+            return self._executor
+
+    def submit(self, url, filepath, deadline=None):
+        """在后台线程池中下载，返回结果为 DownloadResult 的 Future"""
+        return self._get_executor().submit(self.download, url, filepath, deadline)
+
+    def download_many(self, downloads, deadline=None):
+        """并行下载多张图片
+
+        Args:
+            downloads: [(url, filepath), ...]
+            deadline: Deadline令牌，作用于全部下载
+
+        Returns:
+            与 downloads 顺序对应的 DownloadResult 列表
+        """
+        downloads = list(downloads)
+        if len(downloads) == 1:
+            return [self.download(downloads[0][0], downloads[0][1], deadline)]
+        futures = [self.submit(url, filepath, deadline) for url, filepath in downloads]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """关闭下载线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+
+from chat_history import estimate_tokens
+
+# 耗时类指标(秒)的桶边界
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# 速率类指标(每秒token数、字节数)的桶边界，按2的幂增长
+RATE_BUCKETS = tuple(float(2 ** i) for i in range(31))
+
+class Histogram:
+    """固定桶直方图
+
+    记录样本数、总和、最小和最大值，按桶内线性插值估算分位数，
+    可直接导出为Prometheus直方图。
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """初始化直方图
+
+        Args:
+            buckets: 递增的桶上界
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """记录一个样本"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """估算分位数
+
+        Args:
+            q: 0到1之间的分位
+
+        Returns:
+            分位数估计值，没有样本时返回None
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count or cumulative + bucket_count < rank:
+                cumulative += bucket_count
+                continue
+            lower = self.buckets[index - 1] if index > 0 else self.min
+            upper = self.buckets[index] if index < len(self.buckets) else self.max
+            # 桶边界之外的部分用实际的最小、最大值收窄
+            lower = max(lower, self.min)
+            upper = min(upper, self.max)
+            fraction = (rank - cumulative) / bucket_count
+            return lower + (upper - lower) * fraction
+        return self.max
+
+    def snapshot(self):
+        """返回统计摘要"""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99)
+        }
+
+def _label_key(labels):
+    """把标签字典转换为可哈希的有序元组"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(label_key, extra=None):
+    """格式化Prometheus标签"""
+    pairs = list(label_key) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = []
+    for k, v in pairs:
+        v = v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        escaped.append(f'{k}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value):
+    """格式化Prometheus数值"""
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """进程内指标注册表
+
+    指标按名称和标签区分，分为直方图、计数器和仪表三类。
+    名称以 _per_second 结尾的直方图使用速率桶，其余使用耗时桶。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, value, **labels):
+        """向直方图记录一个样本"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                buckets = RATE_BUCKETS if name.endswith("_per_second") else LATENCY_BUCKETS
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        """增加计数器"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """设置仪表的当前值"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def percentile(self, name, q, **labels):
+        """查询直方图的分位数，没有数据时返回None"""
+        with self._lock:
+            histogram = self._histograms.get((name, _label_key(labels)))
+            return histogram.percentile(q) if histogram else None
+
+    def count(self, name, **labels):
+        """查询直方图的样本数"""
+        with self._lock:
+            histogram = self._histograms.get((name, _label_key(labels)))
+            return histogram.count if histogram else 0
+
+    def snapshot(self):
+        """返回所有指标的摘要
+
+        Returns:
+            {"histograms": [...], "counters": [...], "gauges": [...]}
+        """
+        with self._lock:
+            histograms = [
+                dict(name=name, labels=dict(label_key), **histogram.snapshot())
+                for (name, label_key), histogram in sorted(self._histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(label_key), "value": value}
+                for (name, label_key), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": name, "labels": dict(label_key), "value": value}
+                for (name, label_key), value in sorted(self._gauges.items())
+            ]
+        return {"histograms": histograms, "counters": counters, "gauges": gauges}
+
+    def to_json(self, indent=2):
+        """导出为JSON文本"""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self):
+        """导出为Prometheus文本格式"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                bounds = histogram.buckets + (math.inf,)
+                for bound, bucket_count in zip(bounds, histogram.counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(label_key, [("le", _format_value(bound))])
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(label_key)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(label_key)} {histogram.count}")
+            for (name, label_key), value in sorted(self._counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(label_key)} {_format_value(value)}")
+            for (name, label_key), value in sorted(self._gauges.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{_format_labels(label_key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+# 进程内默认共享的注册表
+_default_registry = MetricsRegistry()
+
+def get_default_registry():
+    """获取进程内共享的默认指标注册表"""
+    return _default_registry
+
+def response_tokens(result):
+    """从非流式响应中取生成的token数
+
+    优先使用响应中的 usage.completionTokens，没有时按内容估算。
+    """
+    data = result.get("data") if isinstance(result, dict) else None
+    if not isinstance(data, dict):
+        return 0
+    usage = data.get("usage") or {}
+    if usage.get("completionTokens"):
+        return usage["completionTokens"]
+    return estimate_tokens(data.get("content") or "")
+
+class RequestMetrics:
+    """一次请求的计时器
+
+    记录首字节时间(TTFB)、首个token时间(TTFT)、总耗时、吞吐量、
+    重试次数和状态码，结束时写入注册表。所有时间从创建计时器开始计算。
+    """
+
+    def __init__(self, registry, endpoint):
+        """初始化计时器
+
+        Args:
+            registry: MetricsRegistry
+            endpoint: 接口名称，作为指标标签
+        """
+        self.registry = registry
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.ttft = None
+        self.tokens = 0
+        self.bytes = 0
+        self.finished = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def send(self, func, *args, **kwargs):
+        """执行一次请求，记录状态码和首字节时间
+
+        请求抛出异常时按异常类型计入状态码后继续抛出，由调用方决定是否重试。
+
+        Returns:
+            请求函数返回的响应对象
+        """
+        try:
+            response = func(*args, **kwargs)
+        except Exception as e:
+            self.failed(e)
+            raise
+        elapsed = getattr(response, "elapsed", None)
+        self.response(response.status_code, elapsed.total_seconds() if elapsed is not None else None)
+        return response
+
+    async def asend(self, func, *args, **kwargs):
+        """send 的aiohttp版本，func 返回可等待的请求"""
+        start = time.perf_counter()
+        try:
+            response = await func(*args, **kwargs)
+        except Exception as e:
+            self.failed(e)
+            raise
+        self.response(response.status, time.perf_counter() - start)
+        return response
+
+    def finish_result(self, result, tokens=False):
+        """按解析后的响应结束计时
+
+        Args:
+            result: 响应字典
+            tokens: 是否统计生成的token数
+
+        Returns:
+            传入的 result
+        """
+        api_code = result.get("code") if isinstance(result, dict) else None
+        self.finish(api_code=api_code, tokens=response_tokens(result) if tokens else None)
+        return result
+
+    def response(self, status, ttfb=None):
+        """记录收到响应头
+
+        Args:
+            status: HTTP状态码
+            ttfb: 首字节时间(秒)，未提供时按当前时间计算
+        """
+        if ttfb is None:
+            ttfb = time.perf_counter() - self.start
+        self.registry.observe("vivo_ttfb_seconds", ttfb, endpoint=self.endpoint)
+        self.registry.inc("vivo_requests_total", endpoint=self.endpoint, status=status)
+
+    def on_finish(self, callback):
+        """注册结束时的回调，回调参数为业务码；已结束时立即调用"""
+        with self._lock:
+            if not self.finished:
+                self._callbacks.append(callback)
+                return
+        callback(None)
+
+    def failed(self, error):
+        """记录一次没有得到响应的请求"""
+        self.registry.inc("vivo_requests_total", endpoint=self.endpoint, status=type(error).__name__)
+
+    def retry(self):
+        """记录一次重试"""
+        self.registry.inc("vivo_retries_total", endpoint=self.endpoint)
+
+    def token(self, count=1):
+        """记录收到生成内容，首次调用时记录TTFT"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+            self.registry.observe("vivo_ttft_seconds", self.ttft, endpoint=self.endpoint)
+        self.tokens += count
+
+    def add_bytes(self, count):
+        """记录传输的字节数"""
+        self.bytes += count
+
+    def finish(self, api_code=None, tokens=None):
+        """结束计时并写入注册表，重复调用只记录一次
+
+        Args:
+            api_code: 接口返回的业务码，非成功码会计入错误
+            tokens: 生成的token数，未提供时使用 token() 累计的数量
+        """
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+        elapsed = time.perf_counter() - self.start
+        registry = self.registry
+        registry.observe("vivo_request_seconds", elapsed, endpoint=self.endpoint)
+
+        if api_code not in (None, 0, 200):
+            registry.inc("vivo_api_errors_total", endpoint=self.endpoint, code=api_code)
+
+        if tokens is not None:
+            self.tokens = tokens
+        if self.tokens:
+            # 流式响应按首个token之后的生成阶段计算速率
+            generate_time = elapsed - self.ttft if self.ttft else elapsed
+            if generate_time > 0:
+                registry.observe("vivo_output_tokens_per_second", self.tokens / generate_time,
+                                 endpoint=self.endpoint)
+            registry.inc("vivo_output_tokens_total", self.tokens, endpoint=self.endpoint)
+        if self.bytes and elapsed > 0:
+            registry.observe("vivo_bytes_per_second", self.bytes / elapsed, endpoint=self.endpoint)
+            registry.inc("vivo_bytes_total", self.bytes, endpoint=self.endpoint)
+
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(api_code)
+
+def timed_sign(registry, client, sign, *args):
+    """调用签名函数并记录签名耗时"""
+    start = time.perf_counter()
+    headers = sign(*args)
+    registry.observe("vivo_sign_seconds", time.perf_counter() - start, client=client)
+    return headers
+
+def format_stats_table(snapshot):
+    """把指标摘要格式化为文本表格，供 /stats 命令显示"""
+    lines = []
+    if snapshot["histograms"]:
+        lines.append(f"{'指标':<34}{'标签':<28}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for item in snapshot["histograms"]:
+            labels = ",".join(f"{k}={v}" for k, v in item["labels"].items())
+            seconds = item["name"].endswith("_seconds")
+
+            def fmt(value):
+                if value is None:
+                    return "-"
+                return f"{value * 1000:.1f}ms" if seconds else f"{value:.1f}"
+
+            lines.append(f"{item['name']:<34}{labels:<28}{item['count']:>6}"
+                         f"{fmt(item['p50']):>10}{fmt(item['p95']):>10}{fmt(item['p99']):>10}")
+    counters = snapshot["counters"] + snapshot.get("gauges", [])
+    if counters:
+        lines.append("")
+        for item in counters:
+            labels = ",".join(f"{k}={v}" for k, v in item["labels"].items())
+            value = item["value"]
+            value = f"{value:.1f}" if isinstance(value, float) else value
+            lines.append(f"{item['name']:<34}{labels:<28}{value:>6}")
+    return "\n".join(lines) if lines else "暂无指标数据"
@@ -0,0 +1,571 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import hmac
+import json
+import os
+import random
+import struct
+import time
+import uuid
+import zlib
+
+from aiohttp import web, WSMsgType
+
+from auth_utils import get_signer
+from chat_history import estimate_tokens
+from credential_pool import load_credentials
+from retry_policy import RATE_LIMIT_CODES
+
+# 默认配置
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8100
+DEFAULT_LATENCY = 0.05           # 每个请求返回首字节前的延迟(秒)
+DEFAULT_JITTER = 0.0             # 附加在延迟上的随机抖动上限(秒)
+DEFAULT_TOKEN_RATE = 50.0        # 流式输出每秒token数，0表示不限速
+DEFAULT_REPLY_TOKENS = 64        # 每条回复的token数
+DEFAULT_CONCURRENCY = 0          # 同时处理的请求数，0表示不限
+DEFAULT_QUEUE_DEPTH = 64         # 并发用满后最多排队的请求数，超出返回限流
+DEFAULT_DRAW_SECONDS = 3.0       # 单个绘画任务的生成时间(秒)
+DEFAULT_DRAW_WORKERS = 2         # 同时生成的绘画任务数
+ASR_BYTES_PER_SECOND = 32000     # 16k采样、16位单声道PCM每秒的字节数
+SIGNATURE_MAX_SKEW = 300         # 请求时间戳与服务端时间允许的偏差(秒)
+MAX_BODY_SIZE = 32 * 1024 * 1024 # 图片分析的请求体包含base64编码的图片
+
+# 绘画任务状态，与 draw_ui.print_task_progress 一致
+TASK_QUEUED = 0
+TASK_RUNNING = 1
+TASK_DONE = 2
+TASK_CANCELED = 4
+
+REPLY_FILLER = "蓝心大模型本地模拟网关生成的示例回复内容"
+
+MOCK_STYLES = [
+    {"style_id": "4cbc9165bc615ea0815301116e7925a3", "style_name": "通用v6.0", "cfg_scale": 7, "steps": 20},
+    {"style_id": "85062a504de85d719df43f268199c308", "style_name": "动漫", "cfg_scale": 7, "steps": 25},
+    {"style_id": "a1b2c3d4e5f60718293a4b5c6d7e8f90", "style_name": "水墨", "cfg_scale": 8, "steps": 30,
+     "denoising_strength": 0.6}
+]
+
+MOCK_PROMPTS = [
+    {"short_text": "雪山日出", "long_text": "清晨的雪山，金色阳光洒在山顶，云海翻腾"},
+    {"short_text": "赛博城市", "long_text": "霓虹灯闪烁的未来城市夜景，雨后街道倒映灯光"},
+    {"short_text": "江南水乡", "long_text": "小桥流水人家，白墙黛瓦，水墨风格"}
+]
+
+class MockRejected(Exception):
+    """请求被模拟网关拒绝，由中间件转换为错误响应"""
+
+    def __init__(self, status, code, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.retry_after = retry_after
+
+class MockGateway:
+    """模拟网关的配置、排队状态和统计
+
+    所有接口先校验签名，再经过限流注入和并发排队：并发用满时请求排队等待，
+    排队数超过 queue_depth 时返回429。绘画任务在后台按 draw_workers 个并行槽位依次生成。
+    """
+
+    def __init__(self, credentials=None, verify=True, latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER,
+                 token_rate=DEFAULT_TOKEN_RATE, reply_tokens=DEFAULT_REPLY_TOKENS, concurrency=DEFAULT_CONCURRENCY,
+                 queue_depth=DEFAULT_QUEUE_DEPTH, rate_limit_ratio=0.0, retry_after=None,
+                 draw_seconds=DEFAULT_DRAW_SECONDS, draw_workers=DEFAULT_DRAW_WORKERS):
+        """初始化模拟网关
+
+        Args:
+            credentials: 允许的 (app_id, app_key) 列表
+            verify: 是否校验请求签名
+            latency: 每个请求返回首字节前的延迟(秒)
+            jitter: 附加在延迟上的随机抖动上限(秒)
+            token_rate: 流式输出每秒token数，0表示不限速
+            reply_tokens: 每条回复的token数
+            concurrency: 同时处理的请求数，0表示不限
+            queue_depth: 并发用满后最多排队的请求数
+            rate_limit_ratio: 随机返回限流的请求比例(0-1)
+            retry_after: 限流响应携带的 Retry-After(秒)，None表示不携带
+            draw_seconds: 单个绘画任务的生成时间(秒)
+            draw_workers: 同时生成的绘画任务数
+        """
+        self.keys = dict(credentials or [])
+        self.verify_signatures = verify
+        self.latency = latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.draw_seconds = draw_seconds
+        self.draw_workers = max(1, draw_workers)
+
+        self.requests = collections.Counter()
+        self.rate_limited = collections.Counter()
+        self.auth_failures = 0
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.waiting = 0
+        self.tasks = {}
+        self._task_seq = 0
+        self._semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self._draw_semaphore = asyncio.Semaphore(self.draw_workers)
+
+    def verify(self, request, uri=None):
+        """校验请求的鉴权头
+
+        Args:
+            request: aiohttp请求
+            uri: 参与签名的URI，默认为请求路径
+
+        Raises:
+            MockRejected: 缺少鉴权头、未知 app_id、时间戳过期或签名不符
+        """
+        if not self.verify_signatures:
+            return
+        headers = request.headers
+        app_id = headers.get("X-AI-GATEWAY-APP-ID")
+        timestamp = headers.get("X-AI-GATEWAY-TIMESTAMP")
+        nonce = headers.get("X-AI-GATEWAY-NONCE")
+        signature = headers.get("X-AI-GATEWAY-SIGNATURE")
+        if not (app_id and timestamp and nonce and signature):
+            self._auth_failed("缺少鉴权请求头")
+        app_key = self.keys.get(app_id)
+        if app_key is None:
+            self._auth_failed(f"未知的 app_id: {app_id}")
+        try:
+            skew = abs(time.time() - int(timestamp))
+        except ValueError:
+            self._auth_failed(f"时间戳格式错误: {timestamp}")
+        if skew > SIGNATURE_MAX_SKEW:
+            self._auth_failed("时间戳超出允许范围")
+        expected = get_signer(app_id, app_key).signature(
+            request.method, uri or request.path, dict(request.query), timestamp, nonce
+        )
+        if not hmac.compare_digest(expected, signature):
+            self._auth_failed("签名校验失败")
+
+    def _auth_failed(self, message):
+        self.auth_failures += 1
+        raise MockRejected(401, 401, message)
+
+    def _rate_limited(self, endpoint, message):
+        self.rate_limited[endpoint] += 1
+        raise MockRejected(429, RATE_LIMIT_CODES[0], message, self.retry_after)
+
+    def inject_rate_limit(self, endpoint):
+        """按 rate_limit_ratio 随机返回限流"""
+        self.requests[endpoint] += 1
+        if self.rate_limit_ratio and random.random() < self.rate_limit_ratio:
+            self._rate_limited(endpoint, "请求过于频繁(模拟限流)")
+
+    @contextlib.asynccontextmanager
+    async def slot(self, endpoint):
+        """占用一个处理槽位，并发用满时排队，排队已满时返回限流"""
+        self.inject_rate_limit(endpoint)
+        if self._semaphore is not None:
+            if self._semaphore.locked() and self.waiting >= self.queue_depth:
+                self._rate_limited(endpoint, "服务繁忙，排队已满(模拟限流)")
+            self.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        self.inflight += 1
+        self.peak_inflight = max(self.peak_inflight, self.inflight)
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    async def delay(self):
+        """模拟首字节延迟"""
+        seconds = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def reply_text(self, prompt):
+        """生成约 reply_tokens 个token的回复"""
+        head = f"模拟回复：{prompt[:16]}。"
+        need = max(0, self.reply_tokens - estimate_tokens(head))
+        return head + (REPLY_FILLER * (need // len(REPLY_FILLER) + 1))[:need]
+
+    def submit_task(self, prompt, width, height, base_url):
+        """创建绘画任务并在后台排队生成"""
+        self._task_seq += 1
+        task_id = uuid.uuid4().hex
+        task = {
+            "task_id": task_id,
+            "seq": self._task_seq,
+            "prompt": prompt,
+            "width": width,
+            "height": height,
+            "status": TASK_QUEUED,
+            "started": None,
+            "images_url": [],
+            "image_url": f"{base_url}/images/{task_id}.png",
+            "png": None
+        }
+        task["runner"] = asyncio.ensure_future(self._run_task(task))
+        self.tasks[task_id] = task
+        return task
+
+    async def _run_task(self, task):
+        async with self._draw_semaphore:
+            task["status"] = TASK_RUNNING
+            task["started"] = time.monotonic()
+            await asyncio.sleep(self.draw_seconds)
+        task["status"] = TASK_DONE
+        task["images_url"] = [task["image_url"]]
+
+    def task_progress(self, task):
+        """按任务当前状态构建进度结果"""
+        queue_ahead = 0
+        if task["status"] == TASK_QUEUED:
+            queue_ahead = sum(1 for other in self.tasks.values()
+                              if other["status"] == TASK_QUEUED and other["seq"] < task["seq"])
+        if task["status"] == TASK_QUEUED:
+            eta = (queue_ahead // self.draw_workers + 1) * self.draw_seconds
+        elif task["status"] == TASK_RUNNING:
+            eta = max(0.0, self.draw_seconds - (time.monotonic() - task["started"]))
+        else:
+            eta = 0
+        return {
+            "task_id": task["task_id"],
+            "status": task["status"],
+            "finished": task["status"] in (TASK_DONE, TASK_CANCELED),
+            "queue_ahead": queue_ahead,
+            "task_eta": int(eta),
+            "images_url": task["images_url"]
+        }
+
+    def cancel_task(self, task):
+        """取消排队中或生成中的任务"""
+        if task["status"] in (TASK_QUEUED, TASK_RUNNING):
+            task["runner"].cancel()
+            task["status"] = TASK_CANCELED
+
+    def snapshot(self):
+        """返回统计信息"""
+        statuses = collections.Counter(task["status"] for task in self.tasks.values())
+        return {
+            "requests": dict(self.requests),
+            "rate_limited": dict(self.rate_limited),
+            "auth_failures": self.auth_failures,
+            "inflight": self.inflight,
+            "peak_inflight": self.peak_inflight,
+            "waiting": self.waiting,
+            "draw_tasks": {str(status): count for status, count in statuses.items()}
+        }
+
+def render_png(width, height, seed):
+    """生成纯色PNG图片，颜色由 seed 决定"""
+    rng = random.Random(seed)
+    row = b"\x00" + bytes(rng.randrange(256) for _ in range(3)) * width
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(row * height))
+            + chunk(b"IEND", b""))
+
+def json_response(body, **kwargs):
+    """返回不转义中文的JSON响应"""
+    return web.json_response(body, dumps=lambda value: json.dumps(value, ensure_ascii=False), **kwargs)
+
+def message_text(content):
+    """取消息中的文本"""
+    return content if isinstance(content, str) else ""
+
+@web.middleware
+async def reject_middleware(request, handler):
+    """把 MockRejected 转换为 {"code": ..., "msg": ...} 错误响应"""
+    try:
+        return await handler(request)
+    except MockRejected as e:
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+        return json_response({"code": e.code, "msg": e.message}, status=e.status, headers=headers)
+
+async def handle_completions(request):
+    """处理 /vivogpt/completions 和 /vivogpt/completions/stream，包括图片分析请求"""
+    mock = request.app["mock"]
+    mock.verify(request)
+    stream = request.path.endswith("/stream")
+    body = await request.json()
+
+    messages = body.get("messages") or []
+    images = [m for m in messages if m.get("contentType") == "image"]
+    prompt = body.get("prompt") or next(
+        (message_text(m.get("content")) for m in reversed(messages)
+         if m.get("role", "user") == "user" and m.get("contentType", "text") == "text"), ""
+    )
+    if images:
+        endpoint = "vision_stream" if stream else "vision"
+        image_kb = sum(len(m.get("content", "")) for m in images) * 3 // 4 // 1024
+        prompt = f"图片约{image_kb}KB，{prompt}"
+    else:
+        endpoint = "chat_stream" if stream else "chat"
+
+    async with mock.slot(endpoint):
+        await mock.delay()
+        content = mock.reply_text(prompt)
+        if not stream:
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(content)
+            return json_response({
+                "code": 0,
+                "msg": "done",
+                "data": {
+                    "sessionId": body.get("sessionId"),
+                    "requestId": request.query.get("requestId"),
+                    "content": content,
+                    "model": body.get("model"),
+                    "provider": "mock",
+                    "usage": {
+                        "promptTokens": prompt_tokens,
+                        "completionTokens": completion_tokens,
+                        "totalTokens": prompt_tokens + completion_tokens
+                    }
+                }
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        interval = 1.0 / mock.token_rate if mock.token_rate > 0 else 0.0
+        try:
+            for piece in content:
+                data = json.dumps({"message": piece, "type": "text"}, ensure_ascii=False)
+                await response.write(f"data:{data}\n\n".encode("utf-8"))
+                if interval:
+                    await asyncio.sleep(interval)
+            await response.write(b"event:close\ndata:[DONE]\n\n")
+        except ConnectionResetError:
+            # 客户端提前断开
+            return response
+        await response.write_eof()
+        return response
+
+async def handle_styles(request):
+    """处理 /api/v1/styles"""
+    mock = request.app["mock"]
+    mock.verify(request)
+    async with mock.slot("draw_styles"):
+        await mock.delay()
+        return json_response({"code": 200, "msg": "成功", "result": MOCK_STYLES})
+
+async def handle_prompts(request):
+    """处理 /api/v1/prompts"""
+    mock = request.app["mock"]
+    mock.verify(request)
+    async with mock.slot("draw_prompts"):
+        await mock.delay()
+        return json_response({"code": 200, "msg": "成功", "result": MOCK_PROMPTS})
+
+async def handle_task_submit(request):
+    """处理 /api/v1/task_submit"""
+    mock = request.app["mock"]
+    mock.verify(request)
+    body = await request.json()
+    async with mock.slot("draw_submit"):
+        await mock.delay()
+        if not body.get("prompt"):
+            return json_response({"code": 400, "msg": "prompt不能为空"})
+        width = min(max(int(body.get("width") or 1024), 1), 2048)
+        height = min(max(int(body.get("height") or 1024), 1), 2048)
+        task = mock.submit_task(body["prompt"], width, height, f"{request.scheme}://{request.host}")
+        return json_response({
+            "code": 200,
+            "msg": "成功",
+            "result": {"task_id": task["task_id"], "task_type": "txt2img", "model": "mock"}
+        })
+
+async def handle_task_progress(request):
+    """处理 /api/v1/task_progress"""
+    mock = request.app["mock"]
+    mock.verify(request)
+    async with mock.slot("draw_progress"):
+        await mock.delay()
+        task = mock.tasks.get(request.query.get("task_id"))
+        if task is None:
+            return json_response({"code": 400, "msg": "任务不存在"})
+        return json_response({"code": 200, "msg": "成功", "result": mock.task_progress(task)})
+
+async def handle_task_cancel(request):
+    """处理 /api/v1/task_cancel"""
+    mock = request.app["mock"]
+    mock.verify(request)
+    body = await request.json()
+    async with mock.slot("draw_cancel"):
+        await mock.delay()
+        task = mock.tasks.get(body.get("task_id"))
+        if task is None:
+            return json_response({"code": 400, "msg": "任务不存在"})
+        mock.cancel_task(task)
+        return json_response({"code": 200, "msg": "成功", "result": {"task_id": task["task_id"]}})
+
+async def handle_image(request):
+    """下载生成的图片，与真实服务的图片地址一样无需签名，支持 Range 请求断点续传"""
+    mock = request.app["mock"]
+    task = mock.tasks.get(request.match_info["task_id"])
+    if task is None or task["status"] != TASK_DONE:
+        raise web.HTTPNotFound()
+    mock.requests["draw_download"] += 1
+    if task["png"] is None:
+        task["png"] = render_png(task["width"], task["height"], task["prompt"])
+    body = task["png"]
+    headers = {"Accept-Ranges": "bytes"}
+    if "Range" not in request.headers:
+        return web.Response(body=body, content_type="image/png", headers=headers)
+
+    try:
+        start, stop, _ = request.http_range.indices(len(body))
+    except ValueError:
+        start, stop = len(body), len(body)
+    if start >= len(body):
+        headers["Content-Range"] = f"bytes */{len(body)}"
+        return web.Response(status=416, headers=headers)
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{len(body)}"
+    return web.Response(status=206, body=body[start:stop], content_type="image/png", headers=headers)
+
+async def handle_asr(request):
+    """处理 /asr/v2 语音识别WebSocket
+
+    收到 started 消息后确认会话，音频每满一秒返回一次中间结果，
+    收到 --end-- 后返回最终结果并关闭连接，收到 --close-- 时直接关闭。
+    """
+    mock = request.app["mock"]
+    # 语音识别的签名URI包含查询字符串
+    mock.verify(request, f"{request.path}?{request.rel_url.raw_query_string}")
+    mock.inject_rate_limit("asr")
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    sid = uuid.uuid4().hex
+    received = 0
+    next_partial = ASR_BYTES_PER_SECOND
+
+    async def send_result(is_last):
+        text = f"模拟识别结果，收到{received / ASR_BYTES_PER_SECOND:.1f}秒音频"
+        await ws.send_str(json.dumps({
+            "action": "result",
+            "type": "asr",
+            "code": 0,
+            "sid": sid,
+            "is_finish": is_last,
+            "data": {"text": text, "is_last": is_last}
+        }, ensure_ascii=False))
+
+    async for message in ws:
+        if message.type == WSMsgType.TEXT:
+            try:
+                data = json.loads(message.data)
+            except json.JSONDecodeError:
+                await ws.send_str(json.dumps({"action": "error", "code": 400, "desc": "无效的JSON消息"}))
+                continue
+            if data.get("type") == "started":
+                await mock.delay()
+                await ws.send_str(json.dumps({"action": "started", "code": 0, "sid": sid}))
+        elif message.type == WSMsgType.BINARY:
+            if message.data == b"--end--":
+                await mock.delay()
+                await send_result(True)
+                await ws.close()
+            elif message.data == b"--close--":
+                await ws.close()
+            else:
+                received += len(message.data)
+                if received >= next_partial:
+                    next_partial += ASR_BYTES_PER_SECOND
+                    await send_result(False)
+    return ws
+
+async def handle_stats(request):
+    """处理 /mock/stats，返回请求计数、限流次数和排队情况"""
+    return json_response(request.app["mock"].snapshot())
+
+def create_app(mock):
+    """创建模拟网关应用
+
+    Args:
+        mock: MockGateway
+
+    Returns:
+        aiohttp.web.Application
+    """
+    app = web.Application(middlewares=[reject_middleware], client_max_size=MAX_BODY_SIZE)
+    app["mock"] = mock
+
+    async def on_cleanup(app):
+        for task in mock.tasks.values():
+            task["runner"].cancel()
+
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/vivogpt/completions", handle_completions)
+    app.router.add_post("/vivogpt/completions/stream", handle_completions)
+    app.router.add_get("/api/v1/styles", handle_styles)
+    app.router.add_get("/api/v1/prompts", handle_prompts)
+    app.router.add_post("/api/v1/task_submit", handle_task_submit)
+    app.router.add_get("/api/v1/task_progress", handle_task_progress)
+    app.router.add_post("/api/v1/task_cancel", handle_task_cancel)
+    app.router.add_get("/images/{task_id}.png", handle_image)
+    app.router.add_get("/asr/v2", handle_asr)
+    app.router.add_get("/mock/stats", handle_stats)
+    return app
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='蓝心大模型本地模拟网关')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='监听端口')
+    parser.add_argument('--app_id', type=str, default=os.environ.get('VIVO_APP_ID'), help='允许的应用ID')
+    parser.add_argument('--app_key', type=str, default=os.environ.get('VIVO_APP_KEY'), help='应用密钥，用于校验签名')
+    parser.add_argument('--credentials', type=str, metavar='FILE', help='凭据文件，每行一组 app_id:app_key 或JSON数组，均可通过校验')
+    parser.add_argument('--no_verify', action='store_true', help='不校验请求签名')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help='每个请求返回首字节前的延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help='附加在延迟上的随机抖动上限(秒)')
+    parser.add_argument('--token_rate', type=float, default=DEFAULT_TOKEN_RATE, help='流式输出每秒token数，0表示不限速')
+    parser.add_argument('--reply_tokens', type=int, default=DEFAULT_REPLY_TOKENS, help='每条回复的token数')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='同时处理的请求数，0表示不限')
+    parser.add_argument('--queue_depth', type=int, default=DEFAULT_QUEUE_DEPTH, help='并发用满后最多排队的请求数，超出返回429')
+    parser.add_argument('--rate_limit_ratio', type=float, default=0.0, help='随机返回429限流的请求比例(0-1)')
+    parser.add_argument('--retry_after', type=float, help='限流响应携带的 Retry-After(秒)')
+    parser.add_argument('--draw_seconds', type=float, default=DEFAULT_DRAW_SECONDS, help='单个绘画任务的生成时间(秒)')
+    parser.add_argument('--draw_workers', type=int, default=DEFAULT_DRAW_WORKERS, help='同时生成的绘画任务数')
+    args = parser.parse_args()
+    args.credential_list = []
+    if args.credentials:
+        try:
+            args.credential_list = load_credentials(args.credentials)
+        except (OSError, ValueError) as e:
+            parser.error(f"读取凭据文件失败: {e}")
+    if args.app_id and args.app_key:
+        args.credential_list.append((args.app_id, args.app_key))
+    if not args.credential_list:
+        # 未指定时接受聊天应用的默认凭据
+        from chat_app import DEFAULT_APP_ID, DEFAULT_APP_KEY
+        args.credential_list.append((DEFAULT_APP_ID, DEFAULT_APP_KEY))
+    return args
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    mock = MockGateway(args.credential_list, not args.no_verify, args.latency, args.jitter, args.token_rate,
+                       args.reply_tokens, args.concurrency, args.queue_depth, args.rate_limit_ratio,
+                       args.retry_after, args.draw_seconds, args.draw_workers)
+    base_url = f"http://{args.host}:{args.port}"
+    print(f"模拟网关已启动: {base_url}")
+    print(f"客户端使用: python chat_app.py --base_url {base_url}")
+    web.run_app(create_app(mock), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import aiohttp
+from aiohttp import web
+
+from vivogpt_async import AsyncVivoGPT, AsyncHttpTransport, aprocess_stream_events
+from vivogpt_api import stream_event_text
+from sse_parser import ERROR
+from metrics import get_default_registry
+from retry_policy import RetryPolicy, CircuitOpenError, RATE_LIMIT_CODES, DEFAULT_MAX_ATTEMPTS
+from rate_limiter import RateLimiter, parse_rate_limits
+from hedging import HedgePolicy, DEFAULT_HEDGE_PERCENTILE, DEFAULT_HEDGE_BUDGET
+from credential_pool import CredentialPool, load_credentials, ROUND_ROBIN, LEAST_LOADED, DEFAULT_COOLDOWN
+
+# 默认配置
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_MODEL = "vivo-BlueLM-TB-Pro"
+DEFAULT_MAX_INFLIGHT = 64     # 同时发往上游的最大请求数
+DEFAULT_MAX_QUEUE = 256       # 等待上游空位的最大请求数，超出直接返回429
+DEFAULT_QUEUE_TIMEOUT = 30.0  # 排队等待上游空位的最长时间(秒)
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_MAX_TOKENS = 2048
+
+class GatewayBusy(Exception):
+    """上游繁忙，请求无法排队"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class ClientDisconnected(Exception):
+    """下游客户端已断开，流式响应无法继续写入"""
+
+class UpstreamGate:
+    """上游并发闸门
+
+    用信号量限制同时发往上游的请求数；上游变慢时请求在此排队，
+    排队人数或等待时间超过上限时立即拒绝，避免无限堆积。
+    """
+
+    def __init__(self, max_inflight, max_queue, queue_timeout):
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+
+    async def __aenter__(self):
+        if self.waiting >= self.max_queue:
+            raise GatewayBusy(429, "网关排队已满，请稍后重试")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise GatewayBusy(503, "等待上游超时，请稍后重试")
+        finally:
+            self.waiting -= 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.semaphore.release()
+
+def error_response(status, message, error_type="server_error", code=None):
+    """构建OpenAI格式的错误响应"""
+    body = {"error": {"message": message, "type": error_type, "code": code}}
+    headers = {"Retry-After": "1"} if status in (429, 503) else None
+    return web.json_response(body, status=status, headers=headers)
+
+def to_vivo_messages(messages):
+    """把OpenAI格式的消息列表转换为蓝心大模型格式"""
+    converted = []
+    for message in messages:
+        content = message.get("content") or ""
+        # OpenAI允许content为分段列表，这里只保留文本段
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        converted.append({"role": message.get("role", "user"), "content": content})
+    return converted
+
+def completion_chunk(completion_id, created, model, delta, finish_reason=None):
+    """构建一个流式响应分片"""
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+
+async def handle_chat_completions(request):
+    """处理 /v1/chat/completions 请求"""
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return error_response(400, "请求体不是合法的JSON", "invalid_request_error")
+    if not isinstance(body, dict):
+        return error_response(400, "请求体必须是JSON对象", "invalid_request_error")
+
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        return error_response(400, "messages 不能为空", "invalid_request_error")
+
+    vivo_gpt = request.app["vivo_gpt"]
+    gate = request.app["gate"]
+    model = body.get("model") or DEFAULT_MODEL
+    # 0 是合法取值，只在未提供时使用默认值
+    temperature = body.get("temperature")
+    if temperature is None:
+        temperature = DEFAULT_TEMPERATURE
+    max_tokens = body.get("max_tokens")
+    if max_tokens is None:
+        max_tokens = DEFAULT_MAX_TOKENS
+    vivo_messages = to_vivo_messages(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    try:
+        async with gate:
+            if body.get("stream"):
+                return await stream_completion(request, vivo_gpt, vivo_messages, temperature,
+                                               max_tokens, completion_id, created, model)
+
+            # 每次调用都会重新生成请求ID并签名
+            response = await vivo_gpt.chat_with_history(vivo_messages, temperature, max_tokens)
+    except GatewayBusy as e:
+        return error_response(e.status, e.message, "rate_limit_error")
+    except CircuitOpenError as e:
+        return error_response(503, str(e), "rate_limit_error")
+    except (asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+        return error_response(502, f"上游请求失败: {e}")
+
+    if response.get("code") != 0 or not response.get("data"):
+        status = 429 if response.get("code") in RATE_LIMIT_CODES else 502
+        return error_response(status, response.get("msg", "上游返回错误"), "upstream_error", response.get("code"))
+
+    return web.json_response({
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": response["data"].get("content", "")},
+            "finish_reason": "stop"
+        }]
+    })
+
+async def stream_completion(request, vivo_gpt, messages, temperature, max_tokens, completion_id, created, model):
+    """以SSE方式转发流式响应
+
+    先打开上游响应，上游返回非200状态码时和非流式请求一样返回429或502错误；
+    响应头发出后上游报告的错误以错误分片发给客户端。
+    每个分片写入后都会等待发送缓冲区排空，再读取上游的下一个分片，
+    下游客户端读得慢时上游读取也随之放慢。
+    """
+    async with await vivo_gpt.open_history_stream(messages, temperature, max_tokens) as upstream:
+        if upstream.status != 200:
+            text = await upstream.text()
+            upstream.request_metrics.finish()
+            try:
+                error = json.loads(text)
+            except ValueError:
+                error = None
+            code = error.get("code", upstream.status) if isinstance(error, dict) else upstream.status
+            message = error.get("msg", text) if isinstance(error, dict) else text
+            status = 429 if upstream.status == 429 or code in RATE_LIMIT_CODES else 502
+            return error_response(status, message or f"上游返回状态码 {upstream.status}", "upstream_error", code)
+
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache"
+        })
+        await response.prepare(request)
+
+        async def write(data=None):
+            """写入数据，data 为None时结束响应；客户端断开时抛出 ClientDisconnected"""
+            try:
+                if data is None:
+                    await response.write_eof()
+                else:
+                    await response.write(data)
+            except (OSError, aiohttp.ClientError) as e:
+                raise ClientDisconnected() from e
+
+        async def send(payload):
+            await write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        events = aprocess_stream_events(upstream)
+        error = None
+        try:
+            await send(completion_chunk(completion_id, created, model, {"role": "assistant", "content": ""}))
+            try:
+                async for event in events:
+                    if event.type == ERROR:
+                        data = event.data if isinstance(event.data, dict) else {}
+                        error = {"message": event.text or "上游返回错误", "type": "upstream_error",
+                                 "code": data.get("code")}
+                        break
+                    delta = stream_event_text(event)
+                    if delta:
+                        await send(completion_chunk(completion_id, created, model, {"content": delta}))
+            except (asyncio.TimeoutError, aiohttp.ClientError, OSError, CircuitOpenError) as e:
+                error = {"message": f"上游请求失败: {e}", "type": "server_error", "code": None}
+
+            # 响应头已发出，出错时只能在流内报告错误，不再发送正常结束的分片
+            if error is not None:
+                await send({"error": error})
+            else:
+                await send(completion_chunk(completion_id, created, model, {}, "stop"))
+            await write(b"data: [DONE]\n\n")
+            await write()
+        except ClientDisconnected:
+            # 客户端已断开，不再写入
+            pass
+        finally:
+            await events.aclose()
+        return response
+
+async def handle_models(request):
+    """处理 /v1/models 请求"""
+    return web.json_response({
+        "object": "list",
+        "data": [{"id": DEFAULT_MODEL, "object": "model", "owned_by": "vivo"}]
+    })
+
+async def handle_metrics(request):
+    """处理 /metrics 请求，以Prometheus文本格式导出上游请求指标"""
+    return web.Response(text=get_default_registry().to_prometheus(),
+                        content_type="text/plain", charset="utf-8")
+
+def create_app(app_id, app_key, max_inflight=DEFAULT_MAX_INFLIGHT, max_queue=DEFAULT_MAX_QUEUE,
+               queue_timeout=DEFAULT_QUEUE_TIMEOUT, base_url=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+               endpoint_rates=None, credentials=None, hedge_policy=None):
+    """创建网关应用
+
+    Args:
+        app_id: 应用ID
+        app_key: 应用密钥
+        max_inflight: 每组凭据同时发往上游的最大请求数
+        max_queue: 最大排队请求数
+        queue_timeout: 排队等待的最长时间(秒)
+        base_url: 上游地址，未提供时使用官方地址
+        max_attempts: 上游限流或出错时含首次请求在内的最大尝试次数
+        endpoint_rates: {接口名称: (每秒请求数, 突发数)}，按接口限制上游请求速率
+        credentials: CredentialPool凭据池，提供时请求在多组凭据间分摊，总并发按凭据数放大
+        hedge_policy: 非流式请求使用的HedgePolicy对冲策略，None表示不对冲
+
+    Returns:
+        aiohttp.web.Application
+    """
+    app = web.Application()
+
+    async def on_startup(app):
+        # 每组凭据的自适应并发在 max_inflight 以内根据上游限流情况调整
+        total_inflight = max_inflight * (len(credentials) if credentials else 1)
+        limiter = RateLimiter(max_limit=max_inflight, endpoint_rates=endpoint_rates)
+        transport = AsyncHttpTransport(pool_maxsize=total_inflight,
+                                       retry_policy=RetryPolicy(max_attempts, limiter=limiter),
+                                       hedge_policy=hedge_policy)
+        app["vivo_gpt"] = AsyncVivoGPT(app_id, app_key, transport, credentials=credentials, base_url=base_url)
+        app["gate"] = UpstreamGate(total_inflight, max_queue, queue_timeout)
+
+    async def on_cleanup(app):
+        await app["vivo_gpt"].transport.close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/v1/chat/completions", handle_chat_completions)
+    app.router.add_get("/v1/models", handle_models)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='蓝心大模型OpenAI兼容网关')
+    parser.add_argument('--app_id', type=str, default=os.environ.get('VIVO_APP_ID'), help='应用ID')
+    parser.add_argument('--app_key', type=str, default=os.environ.get('VIVO_APP_KEY'), help='应用密钥')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='监听端口')
+    parser.add_argument('--max_inflight', type=int, default=DEFAULT_MAX_INFLIGHT, help='每组凭据的上游最大并发数')
+    parser.add_argument('--max_queue', type=int, default=DEFAULT_MAX_QUEUE, help='最大排队请求数')
+    parser.add_argument('--queue_timeout', type=float, default=DEFAULT_QUEUE_TIMEOUT, help='排队超时(秒)')
+    parser.add_argument('--base_url', type=str, help='上游地址')
+    parser.add_argument('--max_retries', type=int, default=DEFAULT_MAX_ATTEMPTS - 1, help='上游限流或出错时的最大重试次数')
+    parser.add_argument('--rate_limit', action='append', metavar='ENDPOINT=QPS[:BURST]', help='按接口限制上游每秒请求数，可重复指定')
+    parser.add_argument('--hedge', action='store_true', help='非流式请求超过历史耗时分位仍未返回时发出对冲请求')
+    parser.add_argument('--hedge_percentile', type=float, default=DEFAULT_HEDGE_PERCENTILE, help='发出对冲请求的耗时分位(0-1)')
+    parser.add_argument('--hedge_budget', type=float, default=DEFAULT_HEDGE_BUDGET, help='对冲请求占请求总数的比例上限')
+    parser.add_argument('--credentials', type=str, metavar='FILE', help='凭据文件，每行一组 app_id:app_key 或JSON数组，请求在多组凭据间分摊')
+    parser.add_argument('--credential_strategy', choices=[ROUND_ROBIN, LEAST_LOADED], default=ROUND_ROBIN, help='凭据选择策略')
+    parser.add_argument('--credential_cooldown', type=float, default=DEFAULT_COOLDOWN, help='凭据被限流后暂停使用的时间(秒)')
+    args = parser.parse_args()
+    try:
+        args.endpoint_rates = parse_rate_limits(args.rate_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    args.credential_pool = None
+    if args.credentials:
+        try:
+            args.credential_pool = CredentialPool(
+                load_credentials(args.credentials), args.credential_strategy, args.credential_cooldown
+            )
+        except (OSError, ValueError) as e:
+            parser.error(f"读取凭据文件失败: {e}")
+        # 未单独指定时以第一组凭据作为客户端默认凭据
+        first = args.credential_pool.credentials[0]
+        args.app_id = args.app_id or first.app_id
+        args.app_key = args.app_key or first.app_key
+    if not args.app_id or not args.app_key:
+        parser.error('需要 --app_id/--app_key、--credentials 或环境变量 VIVO_APP_ID/VIVO_APP_KEY')
+    return args
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    app = create_app(args.app_id, args.app_key, args.max_inflight, args.max_queue,
+                     args.queue_timeout, args.base_url, args.max_retries + 1, args.endpoint_rates,
+                     args.credential_pool,
+                     HedgePolicy(args.hedge_percentile, args.hedge_budget) if args.hedge else None)
+    print(f"OpenAI兼容网关已启动: http://{args.host}:{args.port}/v1/chat/completions")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
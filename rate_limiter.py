@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import asyncio
+import threading
+import time
+
+from metrics import get_default_registry
+
+# 默认并发配置
+DEFAULT_INITIAL_LIMIT = 8        # 初始并发上限
+DEFAULT_MIN_LIMIT = 1            # 并发上限的下限
+DEFAULT_MAX_LIMIT = 64           # 并发上限的上限
+DEFAULT_DECREASE_FACTOR = 0.5    # 遇到限流时并发上限乘以该系数
+
+class TokenBucket:
+    """令牌桶，限制每秒请求数
+
+    令牌以 rate 的速度补充，最多累积 burst 个。取令牌采用预约方式：
+    令牌不足时先记账，返回需要等待的时间，同步和异步调用方各自等待。
+    """
+
+    def __init__(self, rate, burst=None):
+        """初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 最多累积的令牌数，默认与 rate 相同且至少为1
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """取一个令牌
+
+        Returns:
+            取到令牌前需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+class _Waiter:
+    """等待并发名额的调用方"""
+
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+class Permit:
+    """一次请求占用的并发名额，release 可重复调用"""
+
+    __slots__ = ("limiter", "started", "released")
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self, rate_limited=False, dropped=False):
+        """归还名额并反馈结果
+
+        Args:
+            rate_limited: 请求被限流，并发上限乘性减小
+            dropped: 请求没有得到响应(如连接错误)，不调整并发上限
+        """
+        if self.released:
+            return
+        self.released = True
+        self.limiter._release(self, rate_limited, dropped)
+
+class AIMDLimiter:
+    """加性增、乘性减(AIMD)的自适应并发限制器
+
+    请求成功且并发已用满时增大上限：首次限流前每次加1(慢启动)，之后每次加 1/limit，
+    即每轮约加1；遇到限流时上限乘以 decrease_factor。
+    同一轮中已发出的请求再遇到限流不会重复减小上限。
+    同步线程和异步协程可共用同一个实例。
+    """
+
+    def __init__(self, initial_limit=DEFAULT_INITIAL_LIMIT, min_limit=DEFAULT_MIN_LIMIT,
+                 max_limit=DEFAULT_MAX_LIMIT, decrease_factor=DEFAULT_DECREASE_FACTOR, metrics=None,
+                 labels=None):
+        """初始化限制器
+
+        Args:
+            initial_limit: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            decrease_factor: 遇到限流时的乘性减小系数
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            labels: 指标标签
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.metrics = metrics or get_default_registry()
+        self.labels = labels or {}
+        self.inflight = 0
+        self._slow_start = True
+        self._last_decrease = 0.0
+        self._waiters = []
+        self._lock = threading.Lock()
+        self._report()
+
+    def _report(self):
+        """更新仪表"""
+        self.metrics.set("vivo_concurrency_limit", int(self.limit), **self.labels)
+        self.metrics.set("vivo_inflight_requests", self.inflight, **self.labels)
+
+    def _try_acquire(self, wake):
+        """有空余名额时直接占用，否则排队
+
+        Returns:
+            (permit, waiter)，二者其一为None
+        """
+        with self._lock:
+            if not self._waiters and self.inflight < int(self.limit):
+                self.inflight += 1
+                self._report()
+                return Permit(self), None
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            return None, waiter
+
+    def acquire(self, deadline=None):
+        """同步获取名额，没有空余名额时阻塞等待
+
+        Args:
+            deadline: Deadline令牌，等待期间被取消或超时时放弃排队并抛出异常
+
+        Returns:
+            Permit
+        """
+        start = time.perf_counter()
+        event = threading.Event()
+        permit, waiter = self._try_acquire(event.set)
+        if permit is None:
+            remove = deadline.on_cancel(event.set) if deadline is not None else None
+            try:
+                while not waiter.granted:
+                    event.wait(deadline.remaining() if deadline is not None else None)
+                    if not waiter.granted:
+                        deadline.check()
+            except BaseException:
+                self._abandon(waiter)
+                raise
+            finally:
+                if remove is not None:
+                    remove()
+            permit = Permit(self)
+        self.metrics.observe("vivo_limiter_wait_seconds", time.perf_counter() - start, **self.labels)
+        return permit
+
+    async def aacquire(self, deadline=None):
+        """异步获取名额，没有空余名额时等待而不阻塞事件循环，参数同 acquire
+
+        Returns:
+            Permit
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        permit, waiter = self._try_acquire(wake)
+        if permit is None:
+            remove = deadline.on_cancel(wake) if deadline is not None else None
+            try:
+                if deadline is None:
+                    await future
+                else:
+                    try:
+                        await asyncio.wait_for(future, deadline.remaining())
+                    except asyncio.TimeoutError:
+                        pass
+                    if not waiter.granted:
+                        deadline.check()
+            except BaseException:
+                self._abandon(waiter)
+                raise
+            finally:
+                if remove is not None:
+                    remove()
+            permit = Permit(self)
+        self.metrics.observe("vivo_limiter_wait_seconds", time.perf_counter() - start, **self.labels)
+        return permit
+
+    def _abandon(self, waiter):
+        """调用方放弃等待，名额已经转交过来时归还"""
+        with self._lock:
+            granted = waiter.granted
+            if not granted:
+                self._waiters.remove(waiter)
+        if granted:
+            Permit(self).release(dropped=True)
+
+    def _release(self, permit, rate_limited, dropped):
+        """归还名额，调整上限并唤醒排队的调用方"""
+        with self._lock:
+            saturated = self.inflight >= int(self.limit)
+            self.inflight -= 1
+            if rate_limited:
+                # 本轮已减小过上限时，之前发出的请求不再重复减小
+                if permit.started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._slow_start = False
+                    self._last_decrease = time.monotonic()
+                    self.metrics.inc("vivo_concurrency_decreases_total", **self.labels)
+            elif not dropped and saturated:
+                step = 1.0 if self._slow_start else 1.0 / self.limit
+                self.limit = min(self.max_limit, self.limit + step)
+
+            while self._waiters and self.inflight < int(self.limit):
+                waiter = self._waiters.pop(0)
+                waiter.granted = True
+                self.inflight += 1
+                waiter.wake()
+            self._report()
+
+class RateLimiter:
+    """进程内共享的流量控制
+
+    接口限流按应用凭据计算，因此每组凭据各有一个AIMD并发限制器，所有接口共用；
+    可为单个接口另设令牌桶限制每组凭据每秒的请求数。
+    """
+
+    def __init__(self, initial_limit=DEFAULT_INITIAL_LIMIT, min_limit=DEFAULT_MIN_LIMIT,
+                 max_limit=DEFAULT_MAX_LIMIT, endpoint_rates=None, metrics=None):
+        """初始化流量控制
+
+        Args:
+            initial_limit: 每组凭据的初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 每组凭据并发上限的上限
+            endpoint_rates: {接口名称: (每秒请求数, 突发数)}，突发数可为None
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+        """
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.endpoint_rates = dict(endpoint_rates or {})
+        self.metrics = metrics or get_default_registry()
+        self._limiters = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, key=None):
+        """获取凭据对应的并发限制器
+
+        Args:
+            key: 凭据的 app_id，None表示未使用凭据池
+        """
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                labels = {"app_id": key} if key is not None else {}
+                limiter = self._limiters[key] = AIMDLimiter(
+                    self.initial_limit, self.min_limit, self.max_limit, metrics=self.metrics, labels=labels
+                )
+            return limiter
+
+    def _bucket_delay(self, endpoint, key):
+        """按接口的令牌桶计算需要等待的时间"""
+        rate = self.endpoint_rates.get(endpoint)
+        if rate is None:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get((key, endpoint))
+            if bucket is None:
+                bucket = self._buckets[(key, endpoint)] = TokenBucket(*rate)
+        delay = bucket.reserve()
+        self.metrics.observe("vivo_rate_limit_wait_seconds", delay, endpoint=endpoint)
+        return delay
+
+    def acquire(self, endpoint, key=None, deadline=None):
+        """同步获取发送请求的许可
+
+        Args:
+            endpoint: 接口名称
+            key: 本次请求使用的凭据 app_id
+            deadline: Deadline令牌，限速和排队等待不超过截止时间
+
+        Returns:
+            Permit，请求结束后调用 release
+        """
+        delay = self._bucket_delay(endpoint, key)
+        if delay > 0:
+            if deadline is not None:
+                deadline.sleep(delay)
+            else:
+                time.sleep(delay)
+        return self.limiter(key).acquire(deadline)
+
+    async def aacquire(self, endpoint, key=None, deadline=None):
+        """异步获取发送请求的许可，参数同 acquire"""
+        delay = self._bucket_delay(endpoint, key)
+        if delay > 0:
+            if deadline is not None:
+                await deadline.asleep(delay)
+            else:
+                await asyncio.sleep(delay)
+        return await self.limiter(key).aacquire(deadline)
+
+def parse_rate_limits(specs):
+    """解析命令行中的接口限速配置
+
+    Args:
+        specs: ["chat=5", "draw_submit=0.5:2", ...]，格式为 接口=每秒请求数[:突发数]
+
+    Returns:
+        {接口名称: (每秒请求数, 突发数)}
+
+    Raises:
+        ValueError: 格式错误
+    """
+    rates = {}
+    for spec in specs or []:
+        endpoint, sep, value = spec.partition("=")
+        if not sep or not endpoint:
+            raise ValueError(f"限速配置格式应为 接口=每秒请求数[:突发数]: {spec}")
+        rate, _, burst = value.partition(":")
+        rate = float(rate)
+        if rate <= 0:
+            raise ValueError(f"每秒请求数必须大于0: {spec}")
+        rates[endpoint.strip()] = (rate, float(burst) if burst else None)
+    return rates
+
+# 进程内默认共享的流量控制
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+def get_default_rate_limiter():
+    """获取进程内共享的默认流量控制，首次调用时创建"""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter()
+    return _default_limiter
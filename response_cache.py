@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# 行首的事件字段，用于判断录制的流是否正常结束
+_CLOSE_EVENT = re.compile(rb"^event:[ \t]*close[ \t]*\r?$", re.M)
+_FAILED_EVENT = re.compile(rb"^event:[ \t]*(?:error|antispam)[ \t]*\r?$", re.M)
+
+# 默认配置
+DEFAULT_CACHE_PATH = "./cache/responses.db"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024   # 缓存总大小上限
+DEFAULT_TTL = 7 * 24 * 3600            # 缓存有效期(秒)
+
+class ResponseCache:
+    """对话响应的磁盘缓存
+
+    使用SQLite保存，键为请求参数的哈希。超出容量时按最近访问时间淘汰（LRU），
+    超过有效期的条目读取时视为未命中并删除。
+
+    每个条目是一个字典，可能包含：
+        response: 非流式接口的完整响应
+        sse_body: 流式接口的原始SSE文本
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        """初始化缓存
+
+        Args:
+            path: SQLite数据库文件路径
+            max_bytes: 缓存总大小上限(字节)
+            ttl: 有效期(秒)，None表示永不过期
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, payload, temperature, max_tokens):
+        """根据请求参数生成缓存键
+
+        Args:
+            model: 模型名称
+            payload: 对话内容，{"prompt": ...} 或 {"messages": [...]}
+            temperature: 温度参数
+            max_tokens: 最大生成长度
+
+        Returns:
+            十六进制哈希字符串
+        """
+        canonical = json.dumps(
+            {"model": model, "payload": payload, "temperature": temperature, "max_new_tokens": max_tokens},
+            ensure_ascii=False, sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """读取缓存条目
+
+        Returns:
+            条目字典，未命中或已过期返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def put(self, key, entry):
+        """写入缓存条目，与已有条目合并后按容量淘汰
+
+        Args:
+            key: 缓存键
+            entry: 条目字典
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            created = now
+            if row is not None:
+                merged = json.loads(row[0])
+                merged.update(entry)
+                entry = merged
+                created = row[1]
+            value = json.dumps(entry, ensure_ascii=False)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), created, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """删除过期条目，并按LRU淘汰直到总大小不超过上限"""
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        while True:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                break
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT 16)"
+            )
+
+    def stats(self):
+        """返回缓存条目数和总大小"""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": total}
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+class CachedStreamResponse:
+    """从缓存回放的流式响应，与 requests 流式响应的用法一致"""
+
+    status_code = 200
+    text = ""
+    from_cache = True
+
+    def __init__(self, sse_body):
+        self._body = sse_body.encode("utf-8")
+
+    def iter_content(self, chunk_size=None, *args, **kwargs):
+        """产出缓存的SSE数据，chunk_size为None时一次产出全部"""
+        if chunk_size is None:
+            yield self._body
+            return
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+    def iter_lines(self, *args, **kwargs):
+        """逐行产出缓存的SSE数据"""
+        for line in self._body.splitlines():
+            yield line
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class RecordingStreamResponse:
+    """包装流式响应，完整且正常结束的流会被记录下来
+
+    只有读到 close 事件的流才会回调 on_complete，
+    中途中断、出错或触发干预的流不会写入缓存。
+    """
+
+    from_cache = False
+
+    def __init__(self, response, on_complete):
+        self._response = response
+        self._on_complete = on_complete
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_content(self, *args, **kwargs):
+        """透传原始数据块并记录，结束后整体检查事件"""
+        chunks = []
+        for chunk in self._response.iter_content(*args, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        body = b"".join(chunks)
+        if (self._response.status_code == 200 and _CLOSE_EVENT.search(body)
+                and not _FAILED_EVENT.search(body)):
+            self._on_complete(body.decode("utf-8", errors="ignore"))
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import asyncio
+import random
+import sys
+import threading
+import time
+
+import requests
+
+from metrics import get_default_registry
+from rate_limiter import get_default_rate_limiter
+
+# 接口文档中表示触发模型限流的业务码
+RATE_LIMIT_CODES = (30001, 2002)
+# 可重试的HTTP状态码
+RATE_LIMIT_STATUS = (429,)
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+# 默认重试配置
+DEFAULT_MAX_ATTEMPTS = 4         # 含首次请求在内的最大尝试次数
+DEFAULT_BASE_DELAY = 0.5         # 首次重试的退避上限(秒)
+DEFAULT_MAX_DELAY = 8.0          # 单次退避的最大值(秒)
+DEFAULT_DEADLINE = 60.0          # 一次调用含重试在内的总时限(秒)
+DEFAULT_FAILURE_THRESHOLD = 5    # 连续失败多少次后熔断
+DEFAULT_RESET_TIMEOUT = 30.0     # 熔断后多久放行一次试探请求(秒)
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，请求未发出"""
+
+    def __init__(self, endpoint, retry_in):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        super().__init__(f"{endpoint} 接口持续限流或出错，已熔断，{retry_in:.0f}秒后再试")
+
+def _status_of(result):
+    """取响应对象或错误字典中的状态码"""
+    if isinstance(result, dict):
+        return result.get("code")
+    status = getattr(result, "status_code", None)
+    return status if status is not None else getattr(result, "status", None)
+
+def is_rate_limited(result):
+    """判断响应是否为限流"""
+    status = _status_of(result)
+    return status in RATE_LIMIT_STATUS or status in RATE_LIMIT_CODES
+
+def is_retryable_result(result, idempotent=True):
+    """判断响应是否值得重试
+
+    Args:
+        result: requests/aiohttp 响应对象，或 {"code": ..., "msg": ...} 字典
+        idempotent: 请求是否可安全重放；否则只在限流时重试，避免重复提交
+
+    Returns:
+        是否可重试
+    """
+    if is_rate_limited(result):
+        return True
+    return idempotent and _status_of(result) in RETRYABLE_STATUS
+
+def is_retryable_error(error, idempotent=True):
+    """判断请求异常是否值得重试
+
+    建连失败时请求一定没有发出，总是可以重试；
+    连接被重置等情况只对可安全重放的请求重试。读取超时不重试。
+    """
+    # 只有异步客户端会抛出 aiohttp 的异常，未加载时不为此导入它，以免拖慢同步客户端的启动
+    aiohttp = sys.modules.get("aiohttp")
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if aiohttp is not None and isinstance(error, aiohttp.ClientConnectorError):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, requests.exceptions.ReadTimeout):
+        return False
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                          ConnectionResetError)):
+        return True
+    if aiohttp is not None and isinstance(error, (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError,
+                                                  aiohttp.ClientPayloadError)):
+        return True
+    return False
+
+def _retry_after(result):
+    """读取响应头中的 Retry-After(秒)，没有时返回None"""
+    headers = getattr(result, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+def _discard(result):
+    """丢弃要重试的响应，把连接归还连接池"""
+    release = getattr(result, "release", None) or getattr(result, "close", None)
+    if release is not None:
+        release()
+
+class _Lease:
+    """一次尝试占用的流量控制许可和凭据，release 可重复调用"""
+
+    __slots__ = ("permit", "pool", "credential", "released")
+
+    def __init__(self, permit, pool, credential):
+        self.permit = permit
+        self.pool = pool
+        self.credential = credential
+        self.released = False
+
+    def release(self, rate_limited=False, dropped=False):
+        """归还许可和凭据，参数同 Permit.release"""
+        if self.released:
+            return
+        self.released = True
+        self.permit.release(rate_limited=rate_limited, dropped=dropped)
+        if self.credential is not None:
+            self.pool.release(self.credential, rate_limited=rate_limited, dropped=dropped,
+                              started=self.permit.started)
+
+class CircuitBreaker:
+    """单个接口的熔断器
+
+    连续失败达到阈值后进入熔断状态，期间直接拒绝请求；
+    经过 reset_timeout 后放行一个试探请求，成功则恢复，失败则继续熔断。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        """初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断后多久放行试探请求(秒)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self, endpoint):
+        """请求前检查，熔断中抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            remaining = self.opened_at + self.reset_timeout - now
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            # 试探请求被中断而没有记录结果时，超时后允许再次试探
+            if self.state == self.HALF_OPEN and (not self._trial_in_flight
+                                                 or now - self._trial_started >= self.reset_timeout):
+                self._trial_in_flight = True
+                self._trial_started = now
+                return
+            raise CircuitOpenError(endpoint, max(remaining, 0.0))
+
+    def record_success(self):
+        """记录请求成功，恢复正常状态"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """记录请求失败
+
+        Returns:
+            本次失败是否使熔断器进入熔断状态
+        """
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+class RetryPolicy:
+    """共享的重试策略
+
+    对限流(429、30001、2002)、5xx和连接错误按带抖动的指数退避重试，
+    总耗时不超过 deadline，并为每个接口维护一个熔断器。
+    每次尝试都调用传入的 attempt 函数，由它重新生成请求ID和签名；
+    提供凭据池时每次尝试重新选择凭据，被限流的凭据冷却期间由其它凭据承担请求。
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, deadline=DEFAULT_DEADLINE,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 metrics=None, limiter=None):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 含首次请求在内的最大尝试次数，1表示不重试
+            base_delay: 首次重试的退避上限(秒)，之后每次翻倍
+            max_delay: 单次退避的最大值(秒)
+            deadline: 一次调用含重试在内的总时限(秒)
+            failure_threshold: 熔断器的连续失败阈值，0表示不熔断
+            reset_timeout: 熔断后多久放行试探请求(秒)
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            limiter: 每次尝试前获取许可的RateLimiter，未提供时使用进程内共享的默认实例
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.metrics = metrics or get_default_registry()
+        self.limiter = limiter or get_default_rate_limiter()
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint):
+        """获取接口的熔断器，不熔断时返回None"""
+        if not self.failure_threshold:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def backoff(self, retries, retry_after=None):
+        """计算第 retries 次重试前的等待时间
+
+        采用全抖动：在 [0, min(max_delay, base_delay * 2^(retries-1))] 中随机取值，
+        避免大量客户端同时重试。服务端给出 Retry-After 时不早于该时间。
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retries - 1)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _before_attempt(self, endpoint, breaker):
+        """请求前检查熔断器"""
+        if breaker is None:
+            return
+        try:
+            breaker.before_call(endpoint)
+        except CircuitOpenError:
+            self.metrics.inc("vivo_circuit_rejected_total", endpoint=endpoint)
+            raise
+
+    def _after_attempt(self, endpoint, breaker, failed):
+        """记录本次尝试的结果"""
+        if breaker is None:
+            return
+        if not failed:
+            breaker.record_success()
+        elif breaker.record_failure():
+            self.metrics.inc("vivo_circuit_opened_total", endpoint=endpoint)
+
+    @staticmethod
+    def _hold(lease, result, tracker):
+        """最终结果返回给调用方后的许可归还
+
+        流式响应要读完才算结束，因此有 tracker 时等它结束再归还，
+        流内以错误事件返回的限流码同样会反馈给限制器。
+        """
+        if tracker is None or is_rate_limited(result):
+            lease.release(rate_limited=is_rate_limited(result))
+        else:
+            tracker.on_finish(lambda api_code: lease.release(rate_limited=api_code in RATE_LIMIT_CODES))
+
+    def _next_delay(self, retries, expires, retry_after=None):
+        """计算下次重试的等待时间，已用完重试次数或会超过总时限时返回None"""
+        if retries >= self.max_attempts:
+            return None
+        delay = self.backoff(retries, retry_after)
+        if time.monotonic() + delay >= expires:
+            return None
+        return delay
+
+    def _outcome(self, endpoint, breaker, retries, expires, idempotent, result=None, error=None,
+                 credentials=None):
+        """判断本次尝试后是否重试，返回等待时间，不重试时返回None"""
+        if error is not None:
+            failed = is_retryable_error(error, idempotent)
+        else:
+            failed = is_retryable_result(result, idempotent)
+        # 单组凭据被限流时换用其它凭据即可，还有可用凭据时不计入接口熔断
+        spread = (failed and error is None and credentials is not None and is_rate_limited(result)
+                  and breaker is not None and breaker.state == CircuitBreaker.CLOSED and credentials.available())
+        if not spread:
+            self._after_attempt(endpoint, breaker, failed)
+        if not failed or (breaker is not None and breaker.state != CircuitBreaker.CLOSED):
+            # 熔断后不再重试，把最后一次的真实错误交给调用方
+            return None
+        return self._next_delay(retries, expires, _retry_after(result) if error is None else None)
+
+    def _expires(self, deadline):
+        """本次调用的截止时间(time.monotonic)，取策略总时限和令牌中较早的一个"""
+        expires = time.monotonic() + self.deadline
+        remaining = deadline.remaining() if deadline is not None else None
+        return expires if remaining is None else min(expires, time.monotonic() + remaining)
+
+    def _lease(self, endpoint, credentials, deadline=None):
+        """同步获取一次尝试的凭据和许可"""
+        credential = credentials.acquire() if credentials is not None else None
+        try:
+            permit = self.limiter.acquire(endpoint, credential.app_id if credential is not None else None, deadline)
+        except BaseException:
+            if credential is not None:
+                credentials.release(credential, dropped=True)
+            raise
+        return _Lease(permit, credentials, credential)
+
+    async def _alease(self, endpoint, credentials, deadline=None):
+        """异步获取一次尝试的凭据和许可"""
+        credential = credentials.acquire() if credentials is not None else None
+        try:
+            permit = await self.limiter.aacquire(endpoint, credential.app_id if credential is not None else None,
+                                                 deadline)
+        except BaseException:
+            if credential is not None:
+                credentials.release(credential, dropped=True)
+            raise
+        return _Lease(permit, credentials, credential)
+
+    def call(self, endpoint, attempt, tracker=None, idempotent=True, credentials=None, deadline=None):
+        """按策略执行请求
+
+        Args:
+            endpoint: 接口名称，用于熔断和指标
+            attempt: 接收凭据的函数，每次调用都用该凭据重新签名并发送请求，
+                返回响应对象或结果字典；未提供凭据池时凭据为None
+            tracker: RequestMetrics，重试时计数，最终抛出异常时结束计时，
+                结束时归还流量控制的许可
+            idempotent: 请求是否可安全重放
+            credentials: CredentialPool凭据池，每次尝试从中选择一组凭据
+            deadline: Deadline令牌，每次尝试前检查，重试等待可被取消，总时限不超过令牌的截止时间
+
+        Returns:
+            最后一次尝试的结果
+
+        Raises:
+            CircuitOpenError: 接口处于熔断状态
+            RequestCancelled: 令牌被取消
+            DeadlineExceeded: 超过令牌的截止时间
+        """
+        breaker = self.breaker(endpoint)
+        expires = self._expires(deadline)
+        retries = 0
+        try:
+            while True:
+                if deadline is not None:
+                    deadline.check()
+                self._before_attempt(endpoint, breaker)
+                lease = self._lease(endpoint, credentials, deadline)
+                retries += 1
+                try:
+                    result = attempt(lease.credential)
+                except BaseException as e:
+                    lease.release(dropped=True)
+                    if not isinstance(e, Exception):
+                        raise
+                    delay = self._outcome(endpoint, breaker, retries, expires, idempotent, error=e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._outcome(endpoint, breaker, retries, expires, idempotent, result=result,
+                                          credentials=credentials)
+                    if delay is None:
+                        self._hold(lease, result, tracker)
+                        return result
+                    lease.release(rate_limited=is_rate_limited(result))
+                    _discard(result)
+                if tracker is not None:
+                    tracker.retry()
+                if deadline is not None:
+                    deadline.sleep(delay)
+                else:
+                    time.sleep(delay)
+        except Exception:
+            # 首次请求就被熔断拒绝时没有发出请求，不记录耗时
+            if tracker is not None and retries:
+                tracker.finish()
+            raise
+
+    async def acall(self, endpoint, attempt, tracker=None, idempotent=True, credentials=None, deadline=None):
+        """call 的异步版本，attempt 为接收凭据的协程函数"""
+        breaker = self.breaker(endpoint)
+        expires = self._expires(deadline)
+        retries = 0
+        try:
+            while True:
+                if deadline is not None:
+                    deadline.check()
+                self._before_attempt(endpoint, breaker)
+                lease = await self._alease(endpoint, credentials, deadline)
+                retries += 1
+                try:
+                    result = await attempt(lease.credential)
+                except BaseException as e:
+                    lease.release(dropped=True)
+                    if not isinstance(e, Exception):
+                        raise
+                    delay = self._outcome(endpoint, breaker, retries, expires, idempotent, error=e)
+                    if delay is None:
+                        raise
+                else:
+                    delay = self._outcome(endpoint, breaker, retries, expires, idempotent, result=result,
+                                          credentials=credentials)
+                    if delay is None:
+                        self._hold(lease, result, tracker)
+                        return result
+                    lease.release(rate_limited=is_rate_limited(result))
+                    _discard(result)
+                if tracker is not None:
+                    tracker.retry()
+                if deadline is not None:
+                    await deadline.asleep(delay)
+                else:
+                    await asyncio.sleep(delay)
+        except Exception:
+            # 首次请求就被熔断拒绝时没有发出请求，不记录耗时
+            if tracker is not None and retries:
+                tracker.finish()
+            raise
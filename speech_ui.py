@@ -2,10 +2,8 @@
 # encoding: utf-8
 
 import os
-import time
-import sys
 import re
-from chat_ui import Color
+from chat_ui import Color, Spinner
 
 # 语音识别ASCII艺术 - 现代简约风格
 SPEECH_ASCII = """
@@ -42,52 +40,29 @@ def print_speech_prompt():
     print(f"{Color.BRIGHT_BLUE}{Color.BOLD}语音>>> {Color.RESET}", end="", flush=True)
     return input()
 
-def print_recording_animation(seconds):
-    """打印录音过程的动画，持续指定的秒数"""
-    frames = [
-        "⚪⚪⚪⚪⚪",
-        "⚫⚪⚪⚪⚪",
-        "⚫⚫⚪⚪⚪",
-        "⚫⚫⚫⚪⚪",
-        "⚫⚫⚫⚫⚪",
-        "⚫⚫⚫⚫⚫",
-    ]
-    
-    start_time = time.time()
-    frame_index = 0
+def recording_spinner(seconds, after_message="录音结束，正在识别"):
+    """创建录音过程的动画，在录音进行期间于后台播放
     
+    Args:
+        seconds: 录音时长
+        after_message: 录音时长结束后、处理完成前显示的提示
+        
+    Returns:
+        Spinner实例
+    """
     print(f"\n{Color.BRIGHT_BLUE}{Color.BOLD}┌─{' 开始录音 ':─^52}─┐{Color.RESET}")
     print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
     
-    while time.time() - start_time < seconds:
-        sys.stdout.write(f"\r{Color.BRIGHT_BLUE}{Color.BOLD}录音中 {frames[frame_index]}{Color.RESET}")
-        sys.stdout.flush()
-        frame_index = (frame_index + 1) % len(frames)
-        time.sleep(0.2)
+    def message(elapsed):
+        if elapsed < seconds:
+            return f"录音中 {int(elapsed)}/{seconds}秒"
+        return after_message
     
-    sys.stdout.write("\r" + " " * 50 + "\r")
-    sys.stdout.flush()
-    print(f"\n{Color.BRIGHT_BLUE}{Color.BOLD}┌─{' 录音结束，正在处理 ':─^46}─┐{Color.RESET}")
-    print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
+    return Spinner(message)
 
-def print_recognizing_animation():
-    """打印识别过程的动画"""
-    frames = [
-        "⚪⚪⚪⚪⚪",
-        "⚫⚪⚪⚪⚪",
-        "⚫⚫⚪⚪⚪",
-        "⚫⚫⚫⚪⚪",
-        "⚫⚫⚫⚫⚪",
-        "⚫⚫⚫⚫⚫",
-    ]
-    
-    for i in range(10):  # 播放10帧动画
-        sys.stdout.write(f"\r{Color.BRIGHT_BLUE}{Color.BOLD}识别中 {frames[i % len(frames)]}{Color.RESET}")
-        sys.stdout.flush()
-        time.sleep(0.2)
-    
-    sys.stdout.write("\r" + " " * 50 + "\r")
-    sys.stdout.flush()
+def recognizing_spinner():
+    """创建识别过程的动画，在识别进行期间于后台播放"""
+    return Spinner("识别中")
 
 def print_speech_result(result_text):
     """打印语音识别结果"""
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import json
+
+def _stdlib_loads(value):
+    """标准库解析bytes时会先探测编码，直接按UTF-8解码更快"""
+    return json.loads(value.decode("utf-8"))
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson 为可选加速依赖，未安装时使用标准库
+    _loads = _stdlib_loads
+
+# 类型化事件
+DELTA = "delta"          # 增量内容
+ANTISPAM = "antispam"    # 触发干预，text 为替换回复
+ERROR = "error"          # 服务端报告错误
+CLOSE = "close"          # 正常结束
+INVALID = "invalid"      # 无法解析的数据
+
+class SSEEvent:
+    """一条原始SSE事件：事件类型和合并后的data字段(bytes)"""
+
+    __slots__ = ("event", "data")
+
+    def __init__(self, event, data):
+        self.event = event
+        self.data = data
+
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, data={self.data!r})"
+
+class StreamEvent:
+    """类型化的流式事件
+
+    Attributes:
+        type: DELTA / ANTISPAM / ERROR / CLOSE / INVALID
+        text: 事件携带的文本，增量内容、干预回复或错误信息
+        data: 解析后的JSON数据，INVALID 时为原始文本
+    """
+
+    __slots__ = ("type", "text", "data")
+
+    def __init__(self, type, text="", data=None):
+        self.type = type
+        self.text = text
+        self.data = data
+
+    def __repr__(self):
+        return f"StreamEvent(type={self.type!r}, text={self.text!r})"
+
+class SSEParser:
+    """增量SSE解析器
+
+    直接处理网络收到的原始字节块，块边界可以落在任意位置。
+    按SSE规范以空行分隔事件，同一事件中的多行 data 以换行合并，
+    event 字段与其后的 data 配对。只在需要时解码，避免逐行构造字符串。
+    """
+
+    def __init__(self):
+        self._pending = []   # 尚未遇到换行的数据块
+        self._event = None
+        self._data = []
+
+    def feed(self, chunk):
+        """喂入一个字节块
+
+        Args:
+            chunk: bytes
+
+        Returns:
+            本次已完整的 SSEEvent 列表
+        """
+        if b"\n" not in chunk:
+            if chunk:
+                self._pending.append(chunk)
+            return []
+
+        if self._pending:
+            self._pending.append(chunk)
+            chunk = b"".join(self._pending)
+            self._pending = []
+        if b"\r" in chunk:
+            # \r\n 跨块时 \r 留在上一块的残行中，拼接后再统一替换
+            chunk = chunk.replace(b"\r\n", b"\n")
+
+        lines = chunk.split(b"\n")
+        tail = lines.pop()
+        if tail:
+            self._pending.append(tail)
+
+        events = []
+        data = self._data
+        for line in lines:
+            if not line:
+                # 空行表示事件结束
+                if data or self._event is not None:
+                    events.append(SSEEvent(self._event, data[0] if len(data) == 1 else b"\n".join(data)))
+                    self._event = None
+                    data = self._data = []
+            elif line.startswith(b"data:"):
+                # 绝大多数行是 data 行，单独走快速路径
+                data.append(line[6:] if line.startswith(b"data: ") else line[5:])
+            else:
+                self._field(line, events)
+                data = self._data
+        return events
+
+    def flush(self):
+        """流结束时处理剩余数据，返回最后的事件列表"""
+        events = []
+        if self._pending:
+            line = b"".join(self._pending).rstrip(b"\r")
+            self._pending = []
+            if line:
+                self._field(line, events)
+        self._dispatch(events)
+        return events
+
+    def _field(self, line, events):
+        """处理 data 以外的字段行"""
+        colon = line.find(b":")
+        if colon == 0:
+            # 注释行
+            return
+        if colon < 0:
+            name, value = line, b""
+        else:
+            name, value = line[:colon], line[colon + 1:]
+            if value[:1] == b" ":
+                value = value[1:]
+
+        if name == b"data":
+            self._data.append(value)
+        elif name == b"event":
+            # event 总是出现在 data 之前；已有 data 说明上一事件缺少空行分隔
+            if self._data:
+                self._dispatch(events)
+            self._event = value.decode("utf-8", errors="ignore").strip()
+
+    def _dispatch(self, events):
+        """把已收集的字段组成事件"""
+        if self._data or self._event is not None:
+            events.append(SSEEvent(self._event, b"\n".join(self._data)))
+            self._event = None
+            self._data = []
+
+def _decode_json(value):
+    """解析JSON，失败返回None"""
+    try:
+        return _loads(value)
+    except ValueError:
+        return None
+
+def _data_payloads(data):
+    """解析事件的data字段
+
+    多行data通常合并为一个JSON；若服务端未用空行分隔事件导致无法整体解析，
+    则逐行解析。
+
+    Returns:
+        [(parsed, raw)] 列表，parsed 为None表示解析失败
+    """
+    stripped = data.strip()
+    if not stripped or stripped == b"[DONE]":
+        return []
+    parsed = _decode_json(stripped)
+    if parsed is not None or b"\n" not in stripped:
+        return [(parsed, stripped)]
+    return [(_decode_json(line), line) for line in stripped.split(b"\n")
+            if line.strip() and line.strip() != b"[DONE]"]
+
+def to_stream_events(sse_event):
+    """把原始SSE事件转换为类型化事件列表"""
+    event_type = sse_event.event
+    if event_type is None:
+        # 快速路径：普通增量事件直接解析
+        try:
+            parsed = _loads(sse_event.data)
+        except ValueError:
+            parsed = None
+        if type(parsed) is dict:
+            return [StreamEvent(DELTA, parsed.get("message") or parsed.get("reply") or "", parsed)]
+    elif event_type == "close":
+        return [StreamEvent(CLOSE)]
+
+    results = []
+    payloads = _data_payloads(sse_event.data)
+    if event_type in ("error", "antispam") and not payloads:
+        return [StreamEvent(event_type)]
+
+    for parsed, raw in payloads:
+        if not isinstance(parsed, dict):
+            results.append(StreamEvent(INVALID, "JSON解析错误", raw.decode("utf-8", errors="ignore")))
+        elif event_type == "error":
+            results.append(StreamEvent(ERROR, parsed.get("msg", ""), parsed))
+        elif event_type == "antispam":
+            results.append(StreamEvent(ANTISPAM, parsed.get("reply") or parsed.get("message") or "", parsed))
+        elif event_type in (None, "message"):
+            text = parsed.get("message") or parsed.get("reply") or ""
+            results.append(StreamEvent(DELTA, text, parsed))
+    return results
+
+def iter_stream_events(chunks):
+    """从字节块序列中解析类型化事件
+
+    Args:
+        chunks: 可迭代的bytes块，例如 response.iter_content(chunk_size=None)
+
+    Yields:
+        StreamEvent
+    """
+    parser = SSEParser()
+    for chunk in chunks:
+        for sse_event in parser.feed(chunk):
+            yield from to_stream_events(sse_event)
+    for sse_event in parser.flush():
+        yield from to_stream_events(sse_event)
@@ -2,10 +2,8 @@
 # encoding: utf-8
 
 import os
-import time
-import sys
 import re
-from chat_ui import Color
+from chat_ui import Color, Spinner
 
 # 图片分析ASCII艺术 - 现代简约风格
 VISION_ASCII = """
@@ -106,28 +104,9 @@ def print_browse_images(directory="./"):
     print(f"{Color.BRIGHT_BLUE}│{Color.RESET} {Color.GRAY}要分析图片，请输入: /analyze <文件名> [提示词]{Color.RESET}")
     print(f"{Color.BRIGHT_BLUE}└{'─'*58}┘{Color.RESET}\n")
 
-def print_analyzing_animation(seconds=3):
-    """打印分析过程的动画，持续指定的秒数"""
-    frames = [
-        "⚪⚪⚪⚪⚪",
-        "⚫⚪⚪⚪⚪",
-        "⚫⚫⚪⚪⚪",
-        "⚫⚫⚫⚪⚪",
-        "⚫⚫⚫⚫⚪",
-        "⚫⚫⚫⚫⚫",
-    ]
-    
-    start_time = time.time()
-    frame_index = 0
-    
-    while time.time() - start_time < seconds:
-        sys.stdout.write(f"\r{Color.BRIGHT_BLUE}{Color.BOLD}图片分析中 {frames[frame_index]}{Color.RESET}")
-        sys.stdout.flush()
-        frame_index = (frame_index + 1) % len(frames)
-        time.sleep(0.2)
-    
-    sys.stdout.write("\r" + " " * 50 + "\r")
-    sys.stdout.flush()
+def analyzing_spinner():
+    """创建图片分析过程的动画，在请求进行期间于后台播放"""
+    return Spinner("图片分析中")
 
 def print_image_info(image_path):
     """打印图片信息"""
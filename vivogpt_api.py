@@ -1,41 +1,70 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 import json
 import uuid
 from auth_utils import gen_sign_headers, gen_canonical_query_string
+from http_transport import get_default_transport, response_json
+from response_cache import ResponseCache, CachedStreamResponse, RecordingStreamResponse
+from sse_parser import iter_stream_events, DELTA, ANTISPAM, ERROR, INVALID
+from metrics import get_default_registry, RequestMetrics, timed_sign
+from chat_history import estimate_tokens
+from credential_pool import signing_key
+
+DEFAULT_BASE_URL = "https://api-ai.vivo.com.cn"
 
 class VivoGPT:
     """蓝心大模型API客户端"""
     
-    def __init__(self, app_id, app_key):
+    def __init__(self, app_id, app_key, transport=None, cache=None, metrics=None, credentials=None, base_url=None):
         """初始化API客户端
         
         Args:
             app_id: 应用ID
             app_key: 应用密钥
+            transport: 共享的HttpTransport，未提供时使用进程内默认连接池
+            cache: ResponseCache响应缓存，提供时默认对所有请求启用
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            credentials: CredentialPool凭据池，提供时每次请求从池中选择凭据签名
+            base_url: 服务地址，未提供时使用官方地址，可指向本地模拟网关
         """
         self.app_id = app_id
         self.app_key = app_key
-        self.base_url = "https://api-ai.vivo.com.cn"
+        self.transport = transport or get_default_transport()
+        self.metrics = metrics or get_default_registry()
+        self.credentials = credentials
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.model = "vivo-BlueLM-TB-Pro"
         self.debug_mode = False
+        self.cache = cache
+        self.cache_enabled = cache is not None
     
     def set_debug_mode(self, mode):
         """设置调试模式"""
         self.debug_mode = mode
     
-    def chat(self, prompt, temperature=0.7, max_tokens=2048, stream=False):
-        """同步调用蓝心大模型API
+    def set_cache(self, cache, enabled=True):
+        """设置响应缓存
         
         Args:
-            prompt: 提问内容
-            temperature: 温度参数，控制输出的随机性
+            cache: ResponseCache实例，None表示首次使用时创建默认缓存
+            enabled: 未逐次指定 use_cache 时是否默认启用缓存
+        """
+        self.cache = cache
+        self.cache_enabled = enabled
+    
+    def _prepare_request(self, payload, temperature, max_tokens, stream, credential=None):
+        """构建请求URL、鉴权头和请求体
+        
+        Args:
+            payload: 对话内容，{"prompt": ...} 或 {"messages": [...]}
+            temperature: 温度参数
             max_tokens: 生成答案的最大长度
             stream: 是否使用流式接口
+            credential: 凭据池中选出的凭据，None表示使用客户端自己的凭据
             
         Returns:
-            同步调用返回完整响应，流式调用返回响应对象
+            (url_with_params, headers, data) 元组
         """
         # 生成请求ID和会话ID
         request_id = str(uuid.uuid4())
@@ -50,18 +79,17 @@ class VivoGPT:
         url_with_params = f"{url}?{gen_canonical_query_string(query)}"
         
         # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "POST", uri, query)
+        app_id, app_key = signing_key(credential, self)
+        headers = timed_sign(self.metrics, "chat", gen_sign_headers, app_id, app_key, "POST", uri, query)
         headers["Content-Type"] = "application/json"
         
         # 构建请求体
-        data = {
-            "model": "vivo-BlueLM-TB-Pro",
-            "prompt": prompt,
-            "sessionId": session_id,
-            "extra": {
-                "temperature": temperature,
-                "max_new_tokens": max_tokens
-            }
+        data = {"model": self.model}
+        data.update(payload)
+        data["sessionId"] = session_id
+        data["extra"] = {
+            "temperature": temperature,
+            "max_new_tokens": max_tokens
         }
         
         # 打印请求详情
@@ -71,15 +99,106 @@ class VivoGPT:
             print(f"请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
             print(f"请求体: {json.dumps(data, ensure_ascii=False, indent=2)}")
         
-        # 发送请求
+        return url_with_params, headers, data
+    
+    def _active_cache(self, use_cache):
+        """确定本次请求使用的缓存，未启用时返回None"""
+        if use_cache is None:
+            use_cache = self.cache_enabled
+        if not use_cache:
+            return None
+        if self.cache is None:
+            self.cache = ResponseCache()
+        return self.cache
+    
+    def _from_cache(self, cache, key, stream):
+        """读取缓存，按调用方式还原为响应字典或可回放的流式响应"""
+        entry = cache.get(key)
+        if not entry:
+            return None
+        
+        if self.debug_mode:
+            print(f"\n调试信息: 命中响应缓存 {key[:12]}")
+
         if stream:
-            response = requests.post(url_with_params, headers=headers, json=data, stream=True)
+            if "sse_body" in entry:
+                return CachedStreamResponse(entry["sse_body"])
+            # 非流式缓存的结果作为单个片段回放
+            content = entry["response"]["data"].get("content", "")
+            return CachedStreamResponse(
+                "data:" + json.dumps({"message": content}, ensure_ascii=False) + "\n\n"
+                "event:close\ndata:[DONE]\n\n"
+            )
+        
+        if "response" in entry:
+            return entry["response"]
+        events = iter_stream_events([entry["sse_body"].encode("utf-8")])
+        content = "".join(filter(None, map(stream_event_text, events)))
+        return {"code": 0, "msg": "done", "data": {"content": content}}
+    
+    def _send(self, payload, temperature, max_tokens, stream, use_cache=None, deadline=None):
+        """发送对话请求，启用缓存时优先返回缓存结果"""
+        endpoint = "chat_stream" if stream else "chat"
+        cache = self._active_cache(use_cache)
+        if cache is not None:
+            key = ResponseCache.make_key(self.model, payload, temperature, max_tokens)
+            cached = self._from_cache(cache, key, stream)
+            if cached is not None:
+                self.metrics.inc("vivo_cache_hits_total", endpoint=endpoint)
+                return cached
+        
+        def run(run_deadline):
+            # 对冲时每次运行使用各自的 Deadline 和指标记录，落后的一方被取消后单独结束
+            tracker = RequestMetrics(self.metrics, endpoint)
+            
+            def attempt(credential):
+                # 每次尝试都重新生成请求ID并签名
+                url_with_params, headers, data = self._prepare_request(payload, temperature, max_tokens, stream,
+                                                                       credential)
+                response = tracker.send(self.transport.post, url_with_params, headers=headers, json=data,
+                                        stream=stream, deadline=run_deadline)
+                return response if stream else response_json(response)
+            
+            result = self.transport.retry_policy.call(endpoint, attempt, tracker, credentials=self.credentials,
+                                                      deadline=run_deadline)
+            if stream:
+                # 首个token和总耗时由 process_stream_response 在读取过程中记录
+                result.request_metrics = tracker
+                result.deadline = run_deadline
+                return result
+            return tracker.finish_result(result, tokens=True)
+        
+        hedge = self.transport.hedge_policy
+        result = run(deadline) if stream or hedge is None else hedge.call(endpoint, run, deadline)
+        if stream:
+            response = result
+            if cache is not None:
+                # 完整读完的流才写入缓存
+                response = RecordingStreamResponse(response, lambda body: cache.put(key, {"sse_body": body}))
             return response
         else:
-            response = requests.post(url_with_params, headers=headers, json=data)
-            return response.json()
+            if cache is not None and result.get("code") == 0 and result.get("data"):
+                cache.put(key, {"response": result})
+            return result
+    
+    def chat(self, prompt, temperature=0.7, max_tokens=2048, stream=False, use_cache=None, deadline=None):
+        """同步调用蓝心大模型API
+        
+        Args:
+            prompt: 提问内容
+            temperature: 温度参数，控制输出的随机性
+            max_tokens: 生成答案的最大长度
+            stream: 是否使用流式接口
+            use_cache: 是否使用响应缓存，None表示按客户端设置
+            deadline: Deadline令牌，限制含重试和流式读取在内的总耗时，可随时取消
+            
+        Returns:
+            同步调用返回完整响应，流式调用返回响应对象
+        """
+        return self._send({"prompt": prompt}, temperature, max_tokens, stream, use_cache, deadline)
     
-    def chat_with_history(self, messages, temperature=0.7, max_tokens=2048, stream=False):
+    def chat_with_history(self, messages, temperature=0.7, max_tokens=2048, stream=False, use_cache=None,
+                          deadline=None):
         """使用多轮对话历史调用蓝心大模型API
         
         Args:
@@ -87,90 +206,73 @@ class VivoGPT:
             temperature: 温度参数，控制输出的随机性
             max_tokens: 生成答案的最大长度
             stream: 是否使用流式接口
+            use_cache: 是否使用响应缓存，None表示按客户端设置
+            deadline: Deadline令牌，限制含重试和流式读取在内的总耗时，可随时取消
             
         Returns:
             同步调用返回完整响应，流式调用返回响应对象
         """
-        # 生成请求ID和会话ID
-        request_id = str(uuid.uuid4())
-        session_id = str(uuid.uuid4())
-        
-        # 确定接口URI
-        uri = "/vivogpt/completions/stream" if stream else "/vivogpt/completions"
-        url = f"{self.base_url}{uri}"
-        
-        # 构建URL参数
-        query = {"requestId": request_id}
-        url_with_params = f"{url}?{gen_canonical_query_string(query)}"
-        
-        # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "POST", uri, query)
-        headers["Content-Type"] = "application/json"
-        
-        # 构建请求体
-        data = {
-            "model": "vivo-BlueLM-TB-Pro",
-            "messages": messages,
-            "sessionId": session_id,
-            "extra": {
-                "temperature": temperature,
-                "max_new_tokens": max_tokens
-            }
-        }
-        
-        # 打印请求详情
-        if self.debug_mode:
-            print("\n调试信息:")
-            print(f"请求URL: {url_with_params}")
-            print(f"请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
-            print(f"请求体: {json.dumps(data, ensure_ascii=False, indent=2)}")
-        
-        # 发送请求
-        if stream:
-            response = requests.post(url_with_params, headers=headers, json=data, stream=True)
-            return response
-        else:
-            response = requests.post(url_with_params, headers=headers, json=data)
-            return response.json()
+        return self._send({"messages": messages}, temperature, max_tokens, stream, use_cache, deadline)
 
 # 流式响应处理函数
-def process_stream_response(response):
-    """处理流式响应数据
+def stream_event_text(event):
+    """从类型化流式事件中取出要展示的文本
     
     Args:
-        response: 流式响应对象
+        event: sse_parser.StreamEvent
         
     Returns:
-        生成的完整内容字符串
+        增量文本或干预回复，没有内容的事件返回None
+    """
+    if event.type in (DELTA, ANTISPAM):
+        return event.text or None
+    if event.type == ERROR:
+        print(f"发生错误: {event.text}" if event.text else "发生错误")
+    elif event.type == INVALID:
+        print(f"解析JSON失败: {event.data}")
+    return None
+
+def process_stream_response(response):
+    """处理流式响应数据
+
+    按网络到达的原始字节块增量解析SSE数据，每解析出一段增量内容就立即产出，
+    调用方可以边接收边渲染，无需等待整个响应结束。
+    请求带有 Deadline 令牌时每个事件之前检查，取消或超时时关闭连接并抛出异常。
+
+    Args:
+        response: 流式响应对象
+
+    Yields:
+        每次产出一段增量文本
     """
-    if response.status_code == 200:
-        full_content = ""
-        chunks = []
-        for line in response.iter_lines():
-            if line:
-                line_text = line.decode('utf-8')
-                if line_text.startswith('data:'):
-                    try:
-                        data_text = line_text[5:].strip()
-                        if data_text != '[DONE]':
-                            data_json = json.loads(data_text)
-                            if 'message' in data_json:
-                                full_content += data_json['message']
-                                chunks.append(data_json['message'])
-                            elif 'reply' in data_json:
-                                full_content += data_json['reply']
-                                chunks.append(data_json['reply'])
-                    except json.JSONDecodeError:
-                        if '[DONE]' not in line_text:
-                            print(f"解析JSON失败: {line_text}")
-                elif line_text.startswith('event:'):
-                    event_type = line_text[6:].strip()
-                    if event_type == 'error':
-                        print("发生错误")
-                    elif event_type == 'close':
-                        pass  # 不打印响应完成消息
-        return chunks
-    else:
+    tracker = getattr(response, "request_metrics", None)
+    deadline = getattr(response, "deadline", None)
+    if response.status_code != 200:
         print(f"请求失败，状态码: {response.status_code}")
         print(response.text)
-        return [] 
\ No newline at end of file
+        if tracker is not None:
+            tracker.finish()
+        return
+
+    api_code = None
+    try:
+        for event in iter_stream_events(response.iter_content(chunk_size=None)):
+            if deadline is not None:
+                deadline.check()
+            if event.type == ERROR:
+                api_code = (event.data or {}).get("code", "error")
+            delta = stream_event_text(event)
+            if delta:
+                if tracker is not None:
+                    tracker.token(estimate_tokens(delta))
+                yield delta
+    except Exception:
+        # 取消时连接已被关闭，读取报出的错误换成取消或超时异常
+        if deadline is not None:
+            deadline.check()
+        raise
+    finally:
+        # 提前中断迭代时也要释放连接
+        response.close()
+        if tracker is not None:
+            tracker.finish(api_code=api_code)
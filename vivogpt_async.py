@@ -0,0 +1,667 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import asyncio
+import os
+import socket
+import time
+
+try:
+    import aiohttp
+except ImportError:  # 异步客户端为可选功能，仅在使用时才需要 aiohttp
+    aiohttp = None
+
+from sse_parser import SSEParser, to_stream_events, DELTA, ANTISPAM, ERROR
+from dns_cache import get_default_dns_cache
+from metrics import get_default_registry, RequestMetrics
+from retry_policy import RetryPolicy
+from chat_history import estimate_tokens
+from deadline import Deadline, DeadlineExceeded, RequestCancelled
+from vivogpt_api import VivoGPT, stream_event_text
+from vivogpt_draw import VivoArtAPI
+from image_downloader import PART_SUFFIX, DownloadResult
+from vivogpt_vision import VivoVisionAPI
+
+# 默认连接池与超时配置
+DEFAULT_POOL_MAXSIZE = 100       # 同时保持的最大连接数
+DEFAULT_CONNECT_TIMEOUT = 5.0    # 建立连接超时(秒)
+DEFAULT_READ_TIMEOUT = 60.0      # 两次数据之间的最大间隔(秒)
+DEFAULT_KEEPALIVE_TIMEOUT = 30.0 # 空闲连接保持时间(秒)
+
+def _cached_resolver(dns_cache):
+    """创建通过共享DNS缓存解析主机名的aiohttp解析器"""
+    class CachedResolver(aiohttp.abc.AbstractResolver):
+        async def resolve(self, host, port=0, family=socket.AF_INET):
+            # 未命中缓存时 getaddrinfo 会阻塞，放到线程池中执行
+            loop = asyncio.get_running_loop()
+            infos = await loop.run_in_executor(None, dns_cache.resolve, host, port, family)
+            return [{
+                "hostname": host,
+                "host": info[4][0],
+                "port": info[4][1],
+                "family": info[0],
+                "proto": info[2],
+                "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV
+            } for info in infos]
+
+        async def close(self):
+            pass
+
+    return CachedResolver()
+
+class AsyncHttpTransport:
+    """基于 aiohttp 的异步HTTP传输层
+
+    一个实例在同一事件循环内可被多个异步客户端共享，
+    所有请求复用同一个连接池。
+    """
+
+    def __init__(self, pool_maxsize=DEFAULT_POOL_MAXSIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 metrics=None, retry_policy=None, hedge_policy=None, dns_cache=None):
+        """初始化传输层
+
+        Args:
+            pool_maxsize: 最大连接数
+            connect_timeout: 建立连接超时(秒)
+            read_timeout: 读取超时(秒)
+            keepalive_timeout: 空闲连接保持时间(秒)
+            metrics: MetricsRegistry指标注册表，用于记录建连耗时，未提供时使用进程内默认注册表
+            retry_policy: 共用该连接池的客户端使用的RetryPolicy，未提供时使用默认配置
+            hedge_policy: 非流式请求使用的HedgePolicy对冲策略，None表示不对冲
+            dns_cache: DnsCache解析缓存，未提供时使用进程内共享的缓存，与同步传输层共用
+        """
+        if aiohttp is None:
+            raise RuntimeError("异步客户端需要安装 aiohttp: pip install aiohttp")
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.metrics = metrics or get_default_registry()
+        self.retry_policy = retry_policy or RetryPolicy(metrics=self.metrics)
+        self.hedge_policy = hedge_policy
+        self.dns_cache = dns_cache or get_default_dns_cache()
+        self._session = None
+
+    def _trace_config(self):
+        """创建记录建连耗时的跟踪配置，DNS解析耗时由DnsCache记录"""
+        metrics = self.metrics
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.host = params.url.host
+
+        async def on_connect_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connect_end(session, context, params):
+            # aiohttp 的建连耗时包含DNS、TCP和TLS握手
+            metrics.inc("vivo_connections_total", host=context.host)
+            metrics.observe("vivo_connect_seconds", time.perf_counter() - context.connect_start, host=context.host)
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_start.append(on_connect_start)
+        trace_config.on_connection_create_end.append(on_connect_end)
+        return trace_config
+
+    def _get_session(self):
+        """获取会话，首次使用时在当前事件循环中创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                keepalive_timeout=self.keepalive_timeout,
+                resolver=_cached_resolver(self.dns_cache),
+                use_dns_cache=False
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                  trace_configs=[self._trace_config()])
+        return self._session
+
+    def request(self, method, url, deadline=None, **kwargs):
+        """发送HTTP请求，返回值可用于 async with
+
+        Args:
+            deadline: Deadline令牌，连接、读取和总耗时不超过剩余时间
+        """
+        if deadline is not None:
+            connect_timeout, read_timeout = deadline.timeout(self.connect_timeout, self.read_timeout)
+            kwargs.setdefault("timeout", aiohttp.ClientTimeout(
+                total=deadline.remaining(), sock_connect=connect_timeout, sock_read=read_timeout
+            ))
+        return self._get_session().request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        """发送GET请求"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """发送POST请求"""
+        return self.request("POST", url, **kwargs)
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+async def aresponse_json(response):
+    """读取aiohttp响应的JSON并释放连接，HTTP状态码不是200时返回错误字典"""
+    async with response:
+        if response.status != 200:
+            return {"code": response.status, "msg": await response.text()}
+        return await response.json(content_type=None)
+
+async def aiter_stream_events(response):
+    """按到达的原始字节块增量解析aiohttp流式响应
+
+    Args:
+        response: aiohttp 流式响应对象
+
+    Yields:
+        sse_parser.StreamEvent
+    """
+    parser = SSEParser()
+    async for chunk in response.content.iter_any():
+        for sse_event in parser.feed(chunk):
+            for event in to_stream_events(sse_event):
+                yield event
+    for sse_event in parser.flush():
+        for event in to_stream_events(sse_event):
+            yield event
+
+async def aprocess_stream_response(response):
+    """异步处理流式响应数据
+
+    Args:
+        response: aiohttp 流式响应对象，带有 deadline 属性时每个事件之前检查
+
+    Yields:
+        每次产出一段增量文本
+    """
+    if response.status != 200:
+        print(f"请求失败，状态码: {response.status}")
+        print(await response.text())
+        tracker = getattr(response, "request_metrics", None)
+        if tracker is not None:
+            tracker.finish()
+        return
+
+    async for event in aprocess_stream_events(response):
+        delta = stream_event_text(event)
+        if delta:
+            yield delta
+
+async def aprocess_stream_events(response):
+    """异步读取状态码为200的流式响应中的类型化事件
+
+    带有 request_metrics 属性时统计产出的token并在结束时记录指标，带有 deadline 属性时每个事件之前检查。
+
+    Args:
+        response: aiohttp 流式响应对象
+
+    Yields:
+        sse_parser.StreamEvent
+    """
+    tracker = getattr(response, "request_metrics", None)
+    deadline = getattr(response, "deadline", None)
+    api_code = None
+    try:
+        async for event in aiter_stream_events(response):
+            if deadline is not None:
+                deadline.check()
+            if event.type == ERROR:
+                api_code = (event.data or {}).get("code", "error")
+            elif event.type in (DELTA, ANTISPAM) and event.text and tracker is not None:
+                tracker.token(estimate_tokens(event.text))
+            yield event
+    finally:
+        if tracker is not None:
+            tracker.finish(api_code=api_code)
+
+class _AsyncClientMixin:
+    """异步客户端的公共部分：传输层管理"""
+
+    def _init_transport(self, transport, metrics=None):
+        """记录是否由客户端自己创建传输层，以便关闭时只释放自己的连接池"""
+        self._owns_transport = transport is None
+        return transport or AsyncHttpTransport(metrics=metrics)
+
+    async def _call(self, tracker, attempt, idempotent=True, credentials=None, deadline=None):
+        """按传输层的重试策略执行请求，credentials 为签名使用的凭据池，deadline 为Deadline令牌"""
+        return await self.transport.retry_policy.acall(tracker.endpoint, attempt, tracker, idempotent, credentials,
+                                                       deadline)
+
+    async def _hedged_call(self, tracker, attempt, credentials=None, deadline=None):
+        """非流式请求按传输层的对冲策略执行，未配置时同 _call"""
+        hedge = self.transport.hedge_policy
+        if hedge is None:
+            return await self._call(tracker, attempt, credentials=credentials, deadline=deadline)
+        return await hedge.acall(
+            tracker.endpoint, lambda: self._call(tracker, attempt, credentials=credentials, deadline=deadline)
+        )
+
+    async def close(self):
+        """关闭客户端自己创建的连接池"""
+        if self._owns_transport:
+            await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+class AsyncVivoGPT(_AsyncClientMixin, VivoGPT):
+    """蓝心大模型异步API客户端"""
+
+    def __init__(self, app_id, app_key, transport=None, metrics=None, credentials=None, base_url=None):
+        """初始化API客户端
+
+        Args:
+            app_id: 应用ID
+            app_key: 应用密钥
+            transport: 共享的AsyncHttpTransport，未提供时自动创建
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            credentials: CredentialPool凭据池，提供时每次请求从池中选择凭据签名
+            base_url: 服务地址，未提供时使用官方地址，可指向本地模拟网关
+        """
+        super().__init__(app_id, app_key, self._init_transport(transport, metrics), metrics=metrics,
+                         credentials=credentials, base_url=base_url)
+
+    async def _post_json(self, payload, temperature, max_tokens, deadline=None):
+        """发送非流式对话请求并返回JSON响应"""
+        tracker = RequestMetrics(self.metrics, "chat")
+
+        async def attempt(credential):
+            # 每次尝试都重新生成请求ID并签名
+            url_with_params, headers, data = self._prepare_request(payload, temperature, max_tokens, False, credential)
+            return await aresponse_json(await tracker.asend(self.transport.post, url_with_params,
+                                                            headers=headers, json=data, deadline=deadline))
+
+        result = await self._hedged_call(tracker, attempt, self.credentials, deadline)
+        return tracker.finish_result(result, tokens=True)
+
+    async def _open_stream(self, payload, temperature, max_tokens, deadline=None):
+        """发送流式对话请求，返回附带指标和 deadline 的上游响应"""
+        tracker = RequestMetrics(self.metrics, "chat_stream")
+
+        async def attempt(credential):
+            url_with_params, headers, data = self._prepare_request(payload, temperature, max_tokens, True, credential)
+            return await tracker.asend(self.transport.post, url_with_params, headers=headers, json=data,
+                                       deadline=deadline)
+
+        response = await self._call(tracker, attempt, credentials=self.credentials, deadline=deadline)
+        response.request_metrics = tracker
+        response.deadline = deadline
+        return response
+
+    async def _stream(self, payload, temperature, max_tokens, deadline=None):
+        """发送流式对话请求，逐段产出增量文本"""
+        async with await self._open_stream(payload, temperature, max_tokens, deadline) as response:
+            async for delta in aprocess_stream_response(response):
+                yield delta
+
+    async def chat(self, prompt, temperature=0.7, max_tokens=2048, stream=False, deadline=None):
+        """异步调用蓝心大模型API
+
+        Args:
+            prompt: 提问内容
+            temperature: 温度参数，控制输出的随机性
+            max_tokens: 生成答案的最大长度
+            stream: 是否使用流式接口
+            deadline: Deadline令牌，限制含重试和流式读取在内的总耗时
+
+        Returns:
+            非流式返回完整响应，流式返回产出增量文本的异步迭代器
+        """
+        if stream:
+            return self.chat_stream(prompt, temperature, max_tokens, deadline)
+        return await self._post_json({"prompt": prompt}, temperature, max_tokens, deadline)
+
+    async def chat_with_history(self, messages, temperature=0.7, max_tokens=2048, stream=False, deadline=None):
+        """使用多轮对话历史异步调用蓝心大模型API
+
+        Args:
+            messages: 消息历史列表
+            temperature: 温度参数，控制输出的随机性
+            max_tokens: 生成答案的最大长度
+            stream: 是否使用流式接口
+            deadline: Deadline令牌，限制含重试和流式读取在内的总耗时
+
+        Returns:
+            非流式返回完整响应，流式返回产出增量文本的异步迭代器
+        """
+        if stream:
+            return self.chat_with_history_stream(messages, temperature, max_tokens, deadline)
+        return await self._post_json({"messages": messages}, temperature, max_tokens, deadline)
+
+    def chat_stream(self, prompt, temperature=0.7, max_tokens=2048, deadline=None):
+        """流式单轮对话，返回产出增量文本的异步迭代器"""
+        return self._stream({"prompt": prompt}, temperature, max_tokens, deadline)
+
+    def chat_with_history_stream(self, messages, temperature=0.7, max_tokens=2048, deadline=None):
+        """流式多轮对话，返回产出增量文本的异步迭代器"""
+        return self._stream({"messages": messages}, temperature, max_tokens, deadline)
+
+    async def open_history_stream(self, messages, temperature=0.7, max_tokens=2048, deadline=None):
+        """发送流式多轮对话请求并返回上游响应
+
+        供需要区分上游错误的调用方使用：先检查响应状态码，再用 aprocess_stream_events 读取事件，
+        用完后需关闭响应(可用 async with)。
+        """
+        return await self._open_stream({"messages": messages}, temperature, max_tokens, deadline)
+
+class AsyncVivoArtAPI(_AsyncClientMixin, VivoArtAPI):
+    """蓝心大模型绘画异步API客户端"""
+
+    def __init__(self, app_id, app_key, transport=None, metrics=None, credentials=None, base_url=None,
+                 cache=None):
+        """初始化API客户端
+
+        Args:
+            app_id: 应用ID
+            app_key: 应用密钥
+            transport: 共享的AsyncHttpTransport，未提供时自动创建
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            credentials: CredentialPool凭据池，提供时每次请求从池中选择凭据签名
+            base_url: 服务地址，未提供时使用官方地址，可指向本地模拟网关
+            cache: DrawCache绘画结果索引，提供时记录生成结果，种子固定的相同请求直接返回已有图片
+        """
+        super().__init__(app_id, app_key, self._init_transport(transport, metrics), metrics=metrics,
+                         credentials=credentials, base_url=base_url, cache=cache)
+        # 同步下载引擎依赖 HttpTransport，异步客户端用 download_image 和 download_images 下载
+        self.downloader = None
+
+    async def _get_json(self, build, endpoint, credentials=None, deadline=None):
+        """按重试策略发送GET请求并返回JSON响应，参数同 VivoArtAPI._get_json"""
+        tracker = RequestMetrics(self.metrics, endpoint)
+
+        async def attempt(credential):
+            url, headers = build(credential)
+            return await aresponse_json(await tracker.asend(self.transport.get, url, headers=headers,
+                                                            deadline=deadline))
+
+        result = await self._call(tracker, attempt, credentials=credentials or self.credentials, deadline=deadline)
+        return tracker.finish_result(result)
+
+    async def _post_json(self, build, endpoint, idempotent=True, credentials=None, deadline=None):
+        """按重试策略发送POST请求并返回JSON响应，参数同 VivoArtAPI._post_json"""
+        tracker = RequestMetrics(self.metrics, endpoint)
+
+        async def attempt(credential):
+            url, headers, data = build(credential)
+            return await aresponse_json(await tracker.asend(self.transport.post, url, headers=headers, json=data,
+                                                            deadline=deadline))
+
+        result = await self._call(tracker, attempt, idempotent, credentials or self.credentials, deadline)
+        return tracker.finish_result(result)
+
+    async def get_styles(self, deadline=None):
+        """获取可用风格列表"""
+        return await self._get_json(self._styles_request, "draw_styles", deadline=deadline)
+
+    async def get_prompts(self, deadline=None):
+        """获取文生图推荐词列表"""
+        return await self._get_json(self._prompts_request, "draw_prompts", deadline=deadline)
+
+    async def submit_drawing_task(self, prompt, style_config=None, height=None, width=None,
+                                  init_image=None, image_type=0, seed=-1, cfg_scale=None,
+                                  denoising_strength=0.1, ctrl_net_strength=0.5, steps=None,
+                                  negative_prompt="", deadline=None):
+        """提交绘画任务，参数同 VivoArtAPI.submit_drawing_task"""
+        used = {}
+
+        def build(credential):
+            used["credential"] = credential
+            return self._submit_request(
+                prompt, style_config, height, width, init_image, image_type, seed, cfg_scale,
+                denoising_strength, ctrl_net_strength, steps, negative_prompt, credential
+            )
+
+        result = await self._post_json(build, "draw_submit", idempotent=False, deadline=deadline)
+        self._remember_task(result, used.get("credential"))
+        return result
+
+    async def query_task_progress(self, task_id, deadline=None):
+        """查询绘画任务进度"""
+        progress = await self._get_json(
+            lambda credential: self._progress_request(task_id, credential), "draw_progress", self._task_pool(task_id),
+            deadline
+        )
+        self._forget_task(task_id, progress)
+        return progress
+
+    async def cancel_task(self, task_id, deadline=None):
+        """取消绘画任务"""
+        result = await self._post_json(
+            lambda credential: self._cancel_request(task_id, credential), "draw_cancel",
+            credentials=self._task_pool(task_id), deadline=deadline
+        )
+        self._forget_task(task_id)
+        return result
+
+    async def submit_and_wait(self, prompt, style_config=None, height=None, width=None,
+                              init_image=None, image_type=0, seed=-1, cfg_scale=None,
+                              denoising_strength=0.1, ctrl_net_strength=0.5, steps=None,
+                              negative_prompt="", max_wait_time=600, poll_interval=5, deadline=None):
+        """提交绘画任务并等待结果，等待期间不阻塞事件循环，参数同 VivoArtAPI.submit_and_wait
+
+        协程被取消或 deadline 被取消时会尝试取消服务端任务。
+
+        Returns:
+            (finished, result) 元组，finished为是否成功完成，result为任务结果；
+            启用绘画结果索引且命中时不提交任务，result 为 cached_result 的结果
+        """
+        # 相同参数生成过的结果直接返回
+        params = {
+            "style_config": style_config, "height": height, "width": width, "init_image": init_image,
+            "seed": seed, "cfg_scale": cfg_scale, "steps": steps, "negative_prompt": negative_prompt
+        }
+        cached = self.cached_result(prompt, **params)
+        if cached is not None:
+            return True, cached
+
+        if deadline is None:
+            deadline = Deadline(max_wait_time)
+
+        try:
+            response = await self.submit_drawing_task(
+                prompt, style_config, height, width, init_image, image_type,
+                seed, cfg_scale, denoising_strength, ctrl_net_strength, steps, negative_prompt, deadline
+            )
+        except DeadlineExceeded:
+            return False, {"code": "TIMEOUT", "msg": "任务等待超时"}
+
+        if response.get("code") != 200:
+            return False, response
+
+        task_id = response["result"]["task_id"]
+
+        # 轮询任务状态
+        try:
+            while True:
+                progress = await self.query_task_progress(task_id, deadline)
+
+                outcome = self._progress_outcome(progress)
+                if outcome is not None:
+                    if outcome:
+                        # 没有本地图片，只记入历史
+                        self.remember_result(task_id, prompt, params, progress["result"].get("images_url") or [])
+                    return outcome, progress
+
+                await deadline.asleep(poll_interval)
+        except DeadlineExceeded:
+            # 超时
+            return False, {"code": "TIMEOUT", "msg": "任务等待超时"}
+        except (RequestCancelled, asyncio.CancelledError):
+            # 调用方已放弃结果，尽量取消服务端任务
+            try:
+                await asyncio.shield(self.cancel_task(task_id, Deadline(self.transport.connect_timeout)))
+            except (DeadlineExceeded, asyncio.CancelledError):
+                pass
+            raise
+
+    async def download_image(self, image_url, output_dir="./images", filename=None, deadline=None):
+        """下载生成的图像
+
+        Returns:
+            保存的文件路径，失败返回None
+        """
+        filepath = self._image_filepath(image_url, output_dir, filename)
+
+        tracker = RequestMetrics(self.metrics, "draw_download")
+
+        async def attempt(credential):
+            return await tracker.asend(self.transport.get, image_url, deadline=deadline)
+
+        async with await self._call(tracker, attempt, deadline=deadline) as response:
+            if response.status != 200:
+                tracker.finish()
+                return None
+
+            # 先写入临时文件，中途取消或超时时删除不完整的文件
+            part = filepath + PART_SUFFIX
+            try:
+                with open(part, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(8192):
+                        if deadline is not None:
+                            deadline.check()
+                        f.write(chunk)
+                        tracker.add_bytes(len(chunk))
+            except (DeadlineExceeded, RequestCancelled, asyncio.CancelledError, asyncio.TimeoutError):
+                os.remove(part)
+                raise
+
+        os.replace(part, filepath)
+        tracker.finish()
+        return filepath
+
+    async def download_images(self, image_urls, output_dir="./images", filenames=None, deadline=None):
+        """并行下载一个任务的多张图像，参数同 VivoArtAPI.download_images
+
+        Returns:
+            与 image_urls 顺序对应的 DownloadResult 列表，sha256 为None，记入绘画结果索引时重新计算
+        """
+        filenames = filenames or [None] * len(image_urls)
+
+        async def fetch(url, filename):
+            filepath = self._image_filepath(url, output_dir, filename)
+            try:
+                saved = await self.download_image(url, output_dir, filename, deadline)
+            except (DeadlineExceeded, RequestCancelled):
+                raise
+            except Exception as e:
+                return DownloadResult(url, filepath, error=f"下载失败: {e}")
+            if saved is None:
+                return DownloadResult(url, filepath, error="下载失败")
+            return DownloadResult(url, saved, os.path.getsize(saved))
+
+        return list(await asyncio.gather(*[fetch(url, filename) for url, filename in zip(image_urls, filenames)]))
+
+class AsyncVivoVisionAPI(_AsyncClientMixin, VivoVisionAPI):
+    """蓝心大模型图片分析异步API客户端"""
+
+    def __init__(self, app_id, app_key, transport=None, metrics=None, credentials=None, base_url=None):
+        """初始化API客户端
+
+        Args:
+            app_id: 应用ID
+            app_key: 应用密钥
+            transport: 共享的AsyncHttpTransport，未提供时自动创建
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            credentials: CredentialPool凭据池，提供时每次请求从池中选择凭据签名
+            base_url: 服务地址，未提供时使用官方地址，可指向本地模拟网关
+        """
+        super().__init__(app_id, app_key, self._init_transport(transport, metrics), metrics=metrics,
+                         credentials=credentials, base_url=base_url)
+
+    async def _build_messages_async(self, image_path, prompt):
+        """在线程池中读取并编码图片，避免大图阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._build_messages, image_path, prompt)
+
+    async def _send_async(self, tracker, messages, stream, deadline=None):
+        """按重试策略发送请求，每次尝试都重新签名
+
+        Returns:
+            流式请求返回响应对象，否则返回响应字典
+        """
+        async def attempt(credential):
+            url_with_params, headers, data = self._sign_request(messages, stream, credential)
+            response = await tracker.asend(self.transport.post, url_with_params, headers=headers, json=data,
+                                           deadline=deadline)
+            return response if stream else await aresponse_json(response)
+
+        if stream:
+            return await self._call(tracker, attempt, credentials=self.credentials, deadline=deadline)
+        return await self._hedged_call(tracker, attempt, self.credentials, deadline)
+
+    async def analyze_image(self, image_path, prompt, stream=False, deadline=None):
+        """分析图片
+
+        Args:
+            image_path: 图片路径
+            prompt: 分析提示
+            stream: 是否使用流式输出
+            deadline: Deadline令牌，限制含重试和流式读取在内的总耗时
+
+        Returns:
+            非流式返回 (response_data, time_cost) 元组，流式返回产出消息字典的异步迭代器
+        """
+        if stream:
+            return self._stream_messages(image_path, prompt, deadline)
+
+        messages = await self._build_messages_async(image_path, prompt)
+        start_time = time.time()
+        tracker = RequestMetrics(self.metrics, "vision")
+        result = tracker.finish_result(await self._send_async(tracker, messages, False, deadline), tokens=True)
+        time_cost = time.time() - start_time
+
+        if self.debug_mode:
+            print(f"请求耗时: {time_cost:.2f}秒")
+
+        return result, time_cost
+
+    async def _stream_messages(self, image_path, prompt, deadline=None):
+        """发送流式分析请求，逐条产出消息字典"""
+        messages = await self._build_messages_async(image_path, prompt)
+        start_time = time.time()
+        tracker = RequestMetrics(self.metrics, "vision_stream")
+        async with await self._send_async(tracker, messages, True, deadline) as response:
+            if response.status != 200:
+                tracker.finish()
+                yield {"code": response.status, "msg": await response.text()}
+                return
+
+            api_code = None
+            try:
+                async for event in aiter_stream_events(response):
+                    if deadline is not None:
+                        deadline.check()
+                    if event.type == DELTA and event.text:
+                        tracker.token(estimate_tokens(event.text))
+                    elif event.type == ERROR:
+                        api_code = (event.data or {}).get("code", "error")
+                    yield self._stream_message(event, start_time)
+            finally:
+                tracker.finish(api_code=api_code)
+
+    async def analyze_image_sync(self, image_path, prompt, deadline=None):
+        """非流式分析图片，返回结果文本"""
+        response, _ = await self.analyze_image(image_path, prompt, stream=False, deadline=deadline)
+        return self._extract_text(response)
+
+    async def analyze_image_stream(self, image_path, prompt, deadline=None):
+        """流式分析图片，逐段产出结果文本"""
+        async for chunk in self._stream_messages(image_path, prompt, deadline):
+            if "data" in chunk and "message" in chunk["data"]:
+                yield chunk["data"]["message"]
+            elif "done" in chunk:
+                break
+            elif "event" in chunk and chunk["event"] in ["error", "antispam"]:
+                yield "\n[分析中断]"
+                break
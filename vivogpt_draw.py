@@ -1,27 +1,50 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 import json
 import uuid
-import time
 import os
+import threading
 from auth_utils import gen_sign_headers, gen_canonical_query_string
+from http_transport import get_default_transport, response_json
+from metrics import get_default_registry, RequestMetrics, timed_sign
+from credential_pool import signing_key
+from vivogpt_api import DEFAULT_BASE_URL
+from deadline import Deadline, DeadlineExceeded, RequestCancelled
+from image_downloader import ImageDownloader
+
+# 最多记录的任务提交凭据数，从未查询到终态的任务超出后丢弃最早的记录
+MAX_TASK_CREDENTIALS = 1024
 
 class VivoArtAPI:
     """蓝心大模型绘画API客户端"""
     
-    def __init__(self, app_id, app_key):
+    def __init__(self, app_id, app_key, transport=None, metrics=None, credentials=None, base_url=None,
+                 cache=None):
         """初始化API客户端
         
         Args:
             app_id: 应用ID
             app_key: 应用密钥
+            transport: 共享的HttpTransport，未提供时使用进程内默认连接池
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            credentials: CredentialPool凭据池，提供时每次请求从池中选择凭据签名
+            base_url: 服务地址，未提供时使用官方地址，可指向本地模拟网关
+            cache: DrawCache绘画结果索引，提供时记录生成结果，种子固定的相同请求直接返回已有图片
         """
         self.app_id = app_id
         self.app_key = app_key
-        self.base_url = "https://api-ai.vivo.com.cn"
+        self.transport = transport or get_default_transport()
+        self.metrics = metrics or get_default_registry()
+        self.credentials = credentials
+        # 任务ID -> 提交任务时使用的凭据，查询和取消任务时沿用
+        self._task_credentials = {}
+        self._task_lock = threading.Lock()
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
         self.debug_mode = False
+        self.cache = cache
+        # 共享连接池的图片下载引擎
+        self.downloader = ImageDownloader(self.transport, self.metrics)
         
         # 默认绘画参数
         self.default_style_config = "4cbc9165bc615ea0815301116e7925a3"  # 通用v6.0
@@ -34,96 +57,101 @@ class VivoArtAPI:
         """设置调试模式"""
         self.debug_mode = mode
     
-    def get_styles(self):
-        """获取可用风格列表
+    def _prepare_get(self, uri, query, title, credential=None):
+        """构建GET请求的URL和鉴权头
         
+        Args:
+            uri: 接口URI
+            query: URL参数
+            title: 调试输出标题
+            credential: 凭据池中选出的凭据，None表示使用客户端自己的凭据
+            
         Returns:
-            风格列表响应
+            (url_with_params, headers) 元组
         """
-        # 生成请求ID
-        data_id = str(uuid.uuid4())
-        
-        # 接口URI和参数
-        uri = "/api/v1/styles"
-        query = {
-            "businessCode": "pc",
-            "dataId": data_id,
-            "styleType": "txt2img"
-        }
-        
         # 构建URL
         url = f"{self.base_url}{uri}"
         url_with_params = f"{url}?{gen_canonical_query_string(query)}"
         
         # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "GET", uri, query)
+        app_id, app_key = signing_key(credential, self)
+        headers = timed_sign(self.metrics, "draw", gen_sign_headers, app_id, app_key, "GET", uri, query)
         
         # 调试输出
         if self.debug_mode:
-            print("\n调试信息 - 请求风格列表:")
+            print(f"\n调试信息 - {title}:")
             print(f"请求URL: {url_with_params}")
             print(f"请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
         
-        # 发送请求
-        response = requests.get(url_with_params, headers=headers)
-        return response.json()
+        return url_with_params, headers
     
-    def get_prompts(self):
-        """获取文生图推荐词列表
+    def _prepare_post(self, uri, data, title, credential=None):
+        """构建POST请求的URL和鉴权头
         
+        Args:
+            uri: 接口URI
+            data: 请求体
+            title: 调试输出标题
+            credential: 凭据池中选出的凭据，None表示使用客户端自己的凭据
+            
         Returns:
-            推荐词列表响应
+            (url, headers) 元组
         """
-        # 生成请求ID
-        data_id = str(uuid.uuid4())
-        
-        # 接口URI和参数
-        uri = "/api/v1/prompts"
-        query = {
-            "businessCode": "pc",
-            "dataId": data_id
-        }
-        
-        # 构建URL
         url = f"{self.base_url}{uri}"
-        url_with_params = f"{url}?{gen_canonical_query_string(query)}"
         
         # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "GET", uri, query)
+        app_id, app_key = signing_key(credential, self)
+        headers = timed_sign(self.metrics, "draw", gen_sign_headers, app_id, app_key, "POST", uri, {})
+        headers["Content-Type"] = "application/json"
         
         # 调试输出
         if self.debug_mode:
-            print("\n调试信息 - 请求推荐词列表:")
-            print(f"请求URL: {url_with_params}")
+            print(f"\n调试信息 - {title}:")
+            print(f"请求URL: {url}")
             print(f"请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
+            print(f"请求体: {json.dumps(data, ensure_ascii=False, indent=2)}")
         
-        # 发送请求
-        response = requests.get(url_with_params, headers=headers)
-        return response.json()
+        return url, headers
     
-    def submit_drawing_task(self, prompt, style_config=None, height=None, width=None, 
-                          init_image=None, image_type=0, seed=-1, cfg_scale=None, 
-                          denoising_strength=0.1, ctrl_net_strength=0.5, steps=None, 
-                          negative_prompt=""):
-        """提交绘画任务
-        
-        Args:
-            prompt: 图像描述
-            style_config: 风格模板ID
-            height: 图像高度
-            width: 图像宽度
-            init_image: 初始图像，用于图生图
-            image_type: 初始图像类型，0=base64，1=URL
-            seed: 随机种子
-            cfg_scale: 文本相关度
-            denoising_strength: 图片相关度
-            ctrl_net_strength: 控制强度
-            steps: 采样步数
-            negative_prompt: 反向关键词
-            
-        Returns:
-            提交任务的响应
-        """
+    def _styles_request(self, credential=None):
+        """构建获取风格列表的请求"""
+        query = {
+            "businessCode": "pc",
+            "dataId": str(uuid.uuid4()),
+            "styleType": "txt2img"
+        }
+        return self._prepare_get("/api/v1/styles", query, "请求风格列表", credential)
+    
+    def _prompts_request(self, credential=None):
+        """构建获取推荐词列表的请求"""
+        query = {
+            "businessCode": "pc",
+            "dataId": str(uuid.uuid4())
+        }
+        return self._prepare_get("/api/v1/prompts", query, "请求推荐词列表", credential)
+    
+    def _progress_request(self, task_id, credential=None):
+        """构建查询任务进度的请求"""
+        query = {
+            "task_id": task_id
+        }
+        return self._prepare_get("/api/v1/task_progress", query, "查询任务进度", credential)
+    
+    def _cancel_request(self, task_id, credential=None):
+        """构建取消任务的请求，返回 (url, headers, data)"""
+        data = {
+            "dataId": str(uuid.uuid4()),
+            "businessCode": "pc",
+            "task_id": task_id
+        }
+        url, headers = self._prepare_post("/api/v1/task_cancel", data, "取消绘画任务", credential)
+        return url, headers, data
+    
+    def _submit_request(self, prompt, style_config=None, height=None, width=None, 
+                        init_image=None, image_type=0, seed=-1, cfg_scale=None, 
+                        denoising_strength=0.1, ctrl_net_strength=0.5, steps=None, 
+                        negative_prompt="", credential=None):
+        """构建提交绘画任务的请求，参数同 submit_drawing_task，返回 (url, headers, data)"""
         # 使用默认值
         style_config = style_config or self.default_style_config
         height = height or self.default_height
@@ -131,16 +159,9 @@ class VivoArtAPI:
         cfg_scale = cfg_scale or self.default_cfg_scale
         steps = steps or self.default_steps
         
-        # 生成请求ID
-        data_id = str(uuid.uuid4())
-        
-        # 接口URI
-        uri = "/api/v1/task_submit"
-        url = f"{self.base_url}{uri}"
-        
         # 构建请求体
         data = {
-            "dataId": data_id,
+            "dataId": str(uuid.uuid4()),
             "businessCode": "pc",
             "userAccount": "",
             "prompt": prompt,
@@ -160,95 +181,255 @@ class VivoArtAPI:
             data["denoisingStrength"] = denoising_strength
             data["ctrlNetStrength"] = ctrl_net_strength
         
-        # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "POST", uri, {})
-        headers["Content-Type"] = "application/json"
+        url, headers = self._prepare_post("/api/v1/task_submit", data, "提交绘画任务", credential)
+        return url, headers, data
+    
+    def _task_pool(self, task_id):
+        """查询和取消任务使用的凭据池
         
-        # 调试输出
-        if self.debug_mode:
-            print("\n调试信息 - 提交绘画任务:")
-            print(f"请求URL: {url}")
-            print(f"请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
-            print(f"请求体: {json.dumps(data, ensure_ascii=False, indent=2)}")
+        任务属于提交它的应用，使用凭据池时固定用提交时的凭据。
+        """
+        credential = self._task_credentials.get(task_id)
+        if credential is None:
+            return self.credentials
+        return self.credentials.pinned(credential)
+    
+    def _remember_task(self, result, credential):
+        """记录提交成功的任务所用的凭据，超过 MAX_TASK_CREDENTIALS 时丢弃最早的记录"""
+        if credential is not None and result.get("code") == 200:
+            with self._task_lock:
+                self._task_credentials[result["result"]["task_id"]] = credential
+                while len(self._task_credentials) > MAX_TASK_CREDENTIALS:
+                    del self._task_credentials[next(iter(self._task_credentials))]
+    
+    def _forget_task(self, task_id, progress=None):
+        """任务结束后丢弃提交凭据的记录
+        
+        Args:
+            task_id: 任务ID
+            progress: 任务进度响应，提供时只在任务已到终态(完成、失败或取消)时丢弃
+        """
+        if progress is not None:
+            if progress.get("code") != 200:
+                return
+            if self._progress_outcome(progress) is None and progress["result"].get("status") != 4:
+                return
+        with self._task_lock:
+            self._task_credentials.pop(task_id, None)
+    
+    def _get_json(self, build, endpoint, credentials=None, deadline=None):
+        """按重试策略发送GET请求并返回JSON响应，同时记录指标
         
-        # 发送请求
-        response = requests.post(url, headers=headers, json=data)
-        return response.json()
+        Args:
+            build: 接收凭据的函数，返回 (url, headers)，每次尝试都重新调用以更新签名
+            endpoint: 接口名称
+            credentials: 本次使用的凭据池，未提供时使用客户端的凭据池
+            deadline: Deadline令牌，限制含重试在内的总耗时
+        """
+        tracker = RequestMetrics(self.metrics, endpoint)
         
-    def query_task_progress(self, task_id):
-        """查询绘画任务进度
+        def attempt(credential):
+            url, headers = build(credential)
+            return response_json(tracker.send(self.transport.get, url, headers=headers, deadline=deadline))
+        
+        result = self.transport.retry_policy.call(
+            endpoint, attempt, tracker, credentials=credentials or self.credentials, deadline=deadline
+        )
+        return tracker.finish_result(result)
+    
+    def _post_json(self, build, endpoint, idempotent=True, credentials=None, deadline=None):
+        """按重试策略发送POST请求并返回JSON响应，同时记录指标
         
         Args:
-            task_id: 任务ID
-            
+            build: 接收凭据的函数，返回 (url, headers, data)，每次尝试都重新调用以更新签名
+            endpoint: 接口名称
+            idempotent: 请求是否可安全重放，提交任务时只在限流时重试
+            credentials: 本次使用的凭据池，未提供时使用客户端的凭据池
+            deadline: Deadline令牌，限制含重试在内的总耗时
+        """
+        tracker = RequestMetrics(self.metrics, endpoint)
+        
+        def attempt(credential):
+            url, headers, data = build(credential)
+            return response_json(tracker.send(self.transport.post, url, headers=headers, json=data,
+                                              deadline=deadline))
+        
+        result = self.transport.retry_policy.call(
+            endpoint, attempt, tracker, idempotent, credentials=credentials or self.credentials,
+            deadline=deadline
+        )
+        return tracker.finish_result(result)
+    
+    def get_styles(self, deadline=None):
+        """获取可用风格列表
+        
+        Args:
+            deadline: Deadline令牌
+        
         Returns:
-            任务进度响应
+            风格列表响应
         """
-        # 接口URI和参数
-        uri = "/api/v1/task_progress"
-        query = {
-            "task_id": task_id
-        }
+        return self._get_json(self._styles_request, "draw_styles", deadline=deadline)
+    
+    def get_prompts(self, deadline=None):
+        """获取文生图推荐词列表
         
-        # 构建URL
-        url = f"{self.base_url}{uri}"
-        url_with_params = f"{url}?{gen_canonical_query_string(query)}"
+        Args:
+            deadline: Deadline令牌
         
-        # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "GET", uri, query)
+        Returns:
+            推荐词列表响应
+        """
+        return self._get_json(self._prompts_request, "draw_prompts", deadline=deadline)
+    
+    def _draw_params(self, style_config=None, height=None, width=None, seed=-1, cfg_scale=None, steps=None,
+                     negative_prompt="", **kwargs):
+        """补全默认值后决定生成结果的参数，其它参数忽略；数值统一类型，7 和 7.0 视为相同"""
+        return {
+            "style_config": style_config or self.default_style_config,
+            "height": int(height or self.default_height),
+            "width": int(width or self.default_width),
+            "seed": -1 if seed is None else int(seed),
+            "cfg_scale": float(cfg_scale or self.default_cfg_scale),
+            "steps": int(steps or self.default_steps),
+            "negative_prompt": negative_prompt or ""
+        }
+    
+    def _cache_key(self, prompt, params):
+        """计算绘画结果索引键，未启用索引或图生图时返回None，种子未固定时由 DrawCache.make_key 返回None"""
+        if self.cache is None or params.get("init_image"):
+            return None
+        return self.cache.make_key(dict(self._draw_params(**params), prompt=prompt))
+    
+    def cached_result(self, prompt, **params):
+        """查找相同参数生成过且图片仍在本地的结果
         
-        # 调试输出
+        Args:
+            prompt: 图像描述
+            **params: 同 submit_drawing_task 的其它参数
+            
+        Returns:
+            与任务完成时的进度响应格式相同的字典，result 中附带本地图片 files 和 cached 标记；未命中返回None
+        """
+        entry = self.cache.lookup(self._cache_key(prompt, params)) if self.cache is not None else None
+        if entry is None:
+            return None
+        self.metrics.inc("vivo_draw_cache_hits_total")
         if self.debug_mode:
-            print("\n调试信息 - 查询任务进度:")
-            print(f"请求URL: {url_with_params}")
-            print(f"请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
-        
-        # 发送请求
-        response = requests.get(url_with_params, headers=headers)
-        return response.json()
+            print(f"\n调试信息: 命中绘画结果索引 {entry['task_id']}")
+        return {
+            "code": 200,
+            "msg": "成功",
+            "result": {
+                "task_id": entry["task_id"],
+                "status": 2,
+                "finished": True,
+                "queue_ahead": 0,
+                "task_eta": 0,
+                "images_url": entry["images_url"],
+                "files": entry["files"],
+                "cached": True
+            }
+        }
     
-    def cancel_task(self, task_id):
-        """取消绘画任务
+    def remember_result(self, task_id, prompt, params, image_urls, files=(), hashes=None):
+        """把完成的任务记入绘画结果索引
         
         Args:
             task_id: 任务ID
+            prompt: 图像描述，未知时为空字符串
+            params: 提交任务时的参数，未知时为空字典
+            image_urls: 图片地址列表
+            files: 已下载的图片路径，与 image_urls 一一对应，未下载的为None
+            hashes: 图片路径 -> SHA256，下载时已计算的哈希
             
         Returns:
-            取消任务的响应
+            与 files 对应的图片本地路径，启用索引时为按内容哈希存放后的路径
         """
-        # 生成请求ID
-        data_id = str(uuid.uuid4())
+        if self.cache is None:
+            return list(files)
+        return self.cache.record(task_id, self._cache_key(prompt, params), prompt,
+                                 self._draw_params(**params) if params else {}, image_urls, files, hashes)
+    
+    def result_files(self, task_id):
+        """返回绘画结果索引中任务已存放的图片，与图片地址一一对应，未下载的为None；未启用索引时为空列表"""
+        return self.cache.task_files(task_id) if self.cache is not None else []
+    
+    def submit_drawing_task(self, prompt, style_config=None, height=None, width=None, 
+                          init_image=None, image_type=0, seed=-1, cfg_scale=None, 
+                          denoising_strength=0.1, ctrl_net_strength=0.5, steps=None, 
+                          negative_prompt="", deadline=None):
+        """提交绘画任务
         
-        # 接口URI
-        uri = "/api/v1/task_cancel"
-        url = f"{self.base_url}{uri}"
+        Args:
+            prompt: 图像描述
+            style_config: 风格模板ID
+            height: 图像高度
+            width: 图像宽度
+            init_image: 初始图像，用于图生图
+            image_type: 初始图像类型，0=base64，1=URL
+            seed: 随机种子
+            cfg_scale: 文本相关度
+            denoising_strength: 图片相关度
+            ctrl_net_strength: 控制强度
+            steps: 采样步数
+            negative_prompt: 反向关键词
+            deadline: Deadline令牌
+            
+        Returns:
+            提交任务的响应
+        """
+        used = {}
         
-        # 构建请求体
-        data = {
-            "dataId": data_id,
-            "businessCode": "pc",
-            "task_id": task_id
-        }
+        def build(credential):
+            used["credential"] = credential
+            return self._submit_request(
+                prompt, style_config, height, width, init_image, image_type, seed, cfg_scale,
+                denoising_strength, ctrl_net_strength, steps, negative_prompt, credential
+            )
         
-        # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "POST", uri, {})
-        headers["Content-Type"] = "application/json"
+        result = self._post_json(build, "draw_submit", idempotent=False, deadline=deadline)
+        self._remember_task(result, used.get("credential"))
+        return result
         
-        # 调试输出
-        if self.debug_mode:
-            print("\n调试信息 - 取消绘画任务:")
-            print(f"请求URL: {url}")
-            print(f"请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
-            print(f"请求体: {json.dumps(data, ensure_ascii=False, indent=2)}")
+    def query_task_progress(self, task_id, deadline=None):
+        """查询绘画任务进度
+        
+        Args:
+            task_id: 任务ID
+            deadline: Deadline令牌
+            
+        Returns:
+            任务进度响应
+        """
+        progress = self._get_json(
+            lambda credential: self._progress_request(task_id, credential), "draw_progress", self._task_pool(task_id),
+            deadline
+        )
+        self._forget_task(task_id, progress)
+        return progress
+    
+    def cancel_task(self, task_id, deadline=None):
+        """取消绘画任务
         
-        # 发送请求
-        response = requests.post(url, headers=headers, json=data)
-        return response.json()
+        Args:
+            task_id: 任务ID
+            deadline: Deadline令牌
+            
+        Returns:
+            取消任务的响应
+        """
+        result = self._post_json(
+            lambda credential: self._cancel_request(task_id, credential), "draw_cancel",
+            credentials=self._task_pool(task_id), deadline=deadline
+        )
+        self._forget_task(task_id)
+        return result
     
     def submit_and_wait(self, prompt, style_config=None, height=None, width=None, 
                        init_image=None, image_type=0, seed=-1, cfg_scale=None,
                        denoising_strength=0.1, ctrl_net_strength=0.5, steps=None, 
-                       negative_prompt="", max_wait_time=600, poll_interval=5):
+                       negative_prompt="", max_wait_time=600, poll_interval=5, deadline=None):
         """提交绘画任务并等待结果
         
         Args:
@@ -264,17 +445,37 @@ class VivoArtAPI:
             ctrl_net_strength: 控制强度
             steps: 采样步数
             negative_prompt: 反向关键词
-            max_wait_time: 最大等待时间(秒)
+            max_wait_time: 最大等待时间(秒)，未提供 deadline 时使用
             poll_interval: 轮询间隔(秒)
+            deadline: Deadline令牌，覆盖提交和全部轮询；被取消时尝试取消任务后抛出 RequestCancelled
             
         Returns:
-            (finished, result) 元组，finished为是否成功完成，result为任务结果
+            (finished, result) 元组，finished为是否成功完成，result为任务结果；
+            启用绘画结果索引且命中时不提交任务，result 为 cached_result 的结果。
+            这里不下载图片，完成的任务只以图片地址记入绘画历史，不会成为之后的命中；
+            索引中的图片由 DrawScheduler 和下载图片的命令填充
         """
-        # 提交任务
-        response = self.submit_drawing_task(
-            prompt, style_config, height, width, init_image, image_type,
-            seed, cfg_scale, denoising_strength, ctrl_net_strength, steps, negative_prompt
-        )
+        # 相同参数生成过的结果直接返回
+        params = {
+            "style_config": style_config, "height": height, "width": width, "init_image": init_image,
+            "seed": seed, "cfg_scale": cfg_scale, "steps": steps, "negative_prompt": negative_prompt
+        }
+        cached = self.cached_result(prompt, **params)
+        if cached is not None:
+            return True, cached
+        
+        if deadline is None:
+            deadline = Deadline(max_wait_time)
+        
+        try:
+            # 提交任务
+            response = self.submit_drawing_task(
+                prompt, style_config, height, width, init_image, image_type,
+                seed, cfg_scale, denoising_strength, ctrl_net_strength, steps, negative_prompt,
+                deadline
+            )
+        except DeadlineExceeded:
+            return False, {"code": "TIMEOUT", "msg": "任务等待超时"}
         
         if response.get("code") != 200:
             return False, response
@@ -283,38 +484,53 @@ class VivoArtAPI:
         task_id = response["result"]["task_id"]
         
         # 轮询任务状态
-        start_time = time.time()
-        while time.time() - start_time < max_wait_time:
-            # 查询任务进度
-            progress = self.query_task_progress(task_id)
-            
-            if progress.get("code") != 200:
-                return False, progress
-            
-            # 任务完成
-            if progress["result"].get("finished") and progress["result"].get("status") == 2:
-                return True, progress
-            
-            # 任务失败
-            if progress["result"].get("status") == 3:
-                return False, progress
-            
-            time.sleep(poll_interval)
-        
-        # 超时
-        return False, {"code": "TIMEOUT", "msg": "任务等待超时"}
+        try:
+            while True:
+                # 查询任务进度
+                progress = self.query_task_progress(task_id, deadline)
+                
+                outcome = self._progress_outcome(progress)
+                if outcome is not None:
+                    if outcome:
+                        # 没有本地图片，只记入历史
+                        self.remember_result(task_id, prompt, params, progress["result"].get("images_url") or [])
+                    return outcome, progress
+                
+                deadline.sleep(poll_interval)
+        except DeadlineExceeded:
+            # 超时
+            return False, {"code": "TIMEOUT", "msg": "任务等待超时"}
+        except RequestCancelled:
+            # 调用方已放弃结果，尽量取消服务端任务
+            try:
+                self.cancel_task(task_id, Deadline(self.transport.connect_timeout))
+            except DeadlineExceeded:
+                pass
+            raise
     
-    def download_image(self, image_url, output_dir="./images", filename=None):
-        """下载生成的图像
-        
-        Args:
-            image_url: 图像URL
-            output_dir: 输出目录
-            filename: 文件名，如果未提供则从URL中提取
+    @staticmethod
+    def _progress_outcome(progress):
+        """判断任务进度响应是否已到终态
         
         Returns:
-            保存的文件路径
+            True 表示成功完成，False 表示失败，None 表示仍在进行中
         """
+        if progress.get("code") != 200:
+            return False
+        
+        # 任务完成
+        if progress["result"].get("finished") and progress["result"].get("status") == 2:
+            return True
+        
+        # 任务失败
+        if progress["result"].get("status") == 3:
+            return False
+        
+        return None
+    
+    @staticmethod
+    def _image_filepath(image_url, output_dir, filename):
+        """确定图片保存路径，必要时创建输出目录"""
         # 创建输出目录
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -324,17 +540,39 @@ class VivoArtAPI:
             filename = os.path.basename(image_url)
         
         # 构建完整的文件路径
-        filepath = os.path.join(output_dir, filename)
+        return os.path.join(output_dir, filename)
+    
+    def download_image(self, image_url, output_dir="./images", filename=None, deadline=None):
+        """下载生成的图像
         
-        # 下载文件
-        response = requests.get(image_url, stream=True)
-        if response.status_code != 200:
-            return None
+        先写入临时文件，完整下载后才重命名为目标文件；中断时保留临时文件，再次下载同一文件时断点续传。
+        
+        Args:
+            image_url: 图像URL
+            output_dir: 输出目录
+            filename: 文件名，如果未提供则从URL中提取
+            deadline: Deadline令牌，超时或取消时停止下载并抛出异常
+        
+        Returns:
+            保存的文件路径，下载失败时返回None
+        """
+        filepath = self._image_filepath(image_url, output_dir, filename)
+        result = self.downloader.download(image_url, filepath, deadline)
+        return result.filepath if result.ok else None
+    
+    def download_images(self, image_urls, output_dir="./images", filenames=None, deadline=None):
+        """并行下载一个任务的多张图像
         
-        # 保存文件
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        Args:
+            image_urls: 图像URL列表
+            output_dir: 输出目录
+            filenames: 与 image_urls 对应的文件名列表，未提供时从URL中提取
+            deadline: Deadline令牌，作用于全部下载
         
-        return filepath 
\ No newline at end of file
+        Returns:
+            与 image_urls 顺序对应的 DownloadResult 列表
+        """
+        filenames = filenames or [None] * len(image_urls)
+        downloads = [(url, self._image_filepath(url, output_dir, filename))
+                     for url, filename in zip(image_urls, filenames)]
+        return self.downloader.download_many(downloads, deadline) 
\ No newline at end of file
@@ -14,34 +14,68 @@ import queue
 import random
 import string
 from auth_utils import gen_sign_headers, gen_canonical_query_string
+from metrics import get_default_registry, RequestMetrics, timed_sign
+from credential_pool import signing_key
+from dns_cache import get_default_dns_cache
+from vivogpt_api import DEFAULT_BASE_URL
+import socket
 import ssl
+import urllib.parse
+
+DEFAULT_PREWARM_INTERVAL = 5.0   # 预热连接被关闭后重新预热的最短间隔(秒)
 
 class VivoSpeechAPI:
     """蓝心大模型语音识别API客户端"""
     
-    def __init__(self, app_id, app_key):
+    def __init__(self, app_id, app_key, metrics=None, credentials=None, dns_cache=None, base_url=None):
         """初始化API客户端
         
         Args:
             app_id: 应用ID
             app_key: 应用密钥
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            credentials: CredentialPool凭据池，提供时每个连接从池中选择凭据，断开时归还
+            dns_cache: DnsCache解析缓存，未提供时使用进程内共享的缓存，与HTTP客户端共用
+            base_url: 服务地址，与HTTP客户端相同，https 对应 wss，http 对应 ws；未提供时使用官方地址
         """
         self.app_id = app_id
         self.app_key = app_key
-        self.base_url = "api-ai.vivo.com.cn"
+        self.metrics = metrics or get_default_registry()
+        self.credentials = credentials
+        self.credential = None  # 当前连接占用的凭据
+        self.dns_cache = dns_cache or get_default_dns_cache()
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
         self.debug_mode = False
         self.ws = None
         self.is_connected = False
+        self._handshake = threading.Event()  # 会话建立或连接失败时置位，唤醒 connect
         self.result_queue = queue.Queue()  # 存储识别结果的队列
         self.session_id = None  # WebSocket会话ID
+        self._prewarm = False  # 是否在后台保持一个已建立的连接
+        self._prewarm_thread = None
+        self._prewarm_started = 0.0
+        self._prewarm_wake = threading.Event()  # 唤醒推迟中的预热
     
     def set_debug_mode(self, mode):
         """设置调试模式"""
         self.debug_mode = mode
     
-    def _generate_ws_url(self):
+    def _endpoint(self):
+        """解析 base_url，兼容只有主机名的写法
+
+        Returns:
+            (是否使用TLS, 主机名, 端口, host[:port])
+        """
+        url = urllib.parse.urlsplit(self.base_url if "://" in self.base_url else f"https://{self.base_url}")
+        secure = url.scheme in ("https", "wss")
+        return secure, url.hostname, url.port or (443 if secure else 80), url.netloc
+    
+    def _generate_ws_url(self, credential=None):
         """生成WebSocket连接URL
         
+        Args:
+            credential: 凭据池中选出的凭据，None表示使用客户端自己的凭据
+        
         Returns:
             完整的WebSocket URL
         """
@@ -62,10 +96,12 @@ class VivoSpeechAPI:
         
         # 生成签名
         uri = f"/asr/v2?{query_string}"
-        headers = gen_sign_headers(self.app_id, self.app_key, "GET", uri, query_params)
+        app_id, app_key = signing_key(credential, self)
+        headers = timed_sign(self.metrics, "speech", gen_sign_headers, app_id, app_key, "GET", uri, query_params)
         
         # 构建URL
-        url = f"wss://{self.base_url}{uri}"
+        secure, _, _, netloc = self._endpoint()
+        url = f"{'wss' if secure else 'ws'}://{netloc}{uri}"
         
         # 调试输出
         if self.debug_mode:
@@ -92,6 +128,7 @@ class VivoSpeechAPI:
             if result.get("action") == "started":
                 self.session_id = result.get("sid")
                 self.is_connected = True
+                self._handshake.set()
                 if self.debug_mode:
                     print(f"WebSocket连接成功，会话ID: {self.session_id}")
             
@@ -101,6 +138,12 @@ class VivoSpeechAPI:
                 is_last = result.get("data", {}).get("is_last", False)
                 is_finish = result.get("is_finish", False)
                 
+                # 最后一条结果之后服务端结束会话，下次识别重新连接，不在正在关闭的连接上发送音频
+                if is_last or is_finish:
+                    self.is_connected = False
+                    if self._prewarm:
+                        self._start_prewarm()
+                
                 # 将结果放入队列
                 self.result_queue.put({
                     "text": asr_text,
@@ -147,10 +190,15 @@ class VivoSpeechAPI:
         if self.debug_mode:
             print(f"\n连接错误: {error}")
         
+        # 重新连接后，旧连接关闭时报出的错误不属于当前识别
+        if ws is not self.ws:
+            return
+        
         # 将错误信息放入队列
         self.result_queue.put({
             "error": f"WebSocket错误: {str(error)}"
         })
+        self._handshake.set()
     
     def _on_close(self, ws, close_status_code, close_msg):
         """WebSocket关闭回调
@@ -163,7 +211,17 @@ class VivoSpeechAPI:
         if self.debug_mode:
             print(f"\n连接已关闭: 状态码={close_status_code}, 消息={close_msg}")
         
+        # 重新连接后，旧连接的关闭回调不影响当前连接
+        if ws is not self.ws:
+            return
+        
+        was_connected = self.is_connected
         self.is_connected = False
+        self._handshake.set()
+        
+        # 预热的会话被服务端关闭后在后台重新建立，握手失败时不重试
+        if self._prewarm and was_connected:
+            self._start_prewarm()
         
         # 将关闭信息放入队列
         self.result_queue.put({
@@ -207,21 +265,103 @@ class VivoSpeechAPI:
         # 启动线程发送初始化消息
         threading.Thread(target=send_init).start()
     
-    def connect(self):
+    def _release_credential(self, dropped=False):
+        """归还当前连接占用的凭据"""
+        if self.credential is not None:
+            self.credentials.release(self.credential, dropped=dropped)
+            self.credential = None
+    
+    def _open_socket(self, timeout):
+        """通过共享DNS缓存建立连接，wss 地址再完成TLS握手，交给WebSocketApp使用
+        
+        证书校验选项与原先传给 run_forever 的 sslopt 相同。
+        """
+        secure, host, port, _ = self._endpoint()
+        sock = self.dns_cache.connect(host, port, lambda address: socket.create_connection(address, timeout))
+        if not secure:
+            sock.settimeout(None)
+            return sock
+        try:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=host)
+        except BaseException:
+            sock.close()
+            raise
+        # 连接建立后由WebSocketApp阻塞读取
+        sock.settimeout(None)
+        return sock
+    
+    def prewarm(self):
+        """在后台建立WebSocket连接并等待服务端确认会话
+        
+        预热期间调用识别方法会等待预热完成后复用连接；会话被服务端关闭后自动重新预热，
+        调用 disconnect 后停止。
+        """
+        self._prewarm = True
+        self._start_prewarm()
+    
+    def _start_prewarm(self):
+        """启动后台连接线程，已有预热进行中时跳过
+        
+        距上次预热不足 DEFAULT_PREWARM_INTERVAL 秒时推迟到间隔期满，
+        避免服务端反复关闭会话时不停重连。
+        """
+        if self._prewarm_thread is not None and self._prewarm_thread.is_alive():
+            return
+        now = time.monotonic()
+        delay = max(0.0, self._prewarm_started + DEFAULT_PREWARM_INTERVAL - now)
+        self._prewarm_started = now + delay
+        self._prewarm_wake.clear()
+        
+        def run():
+            self._prewarm_wake.wait(delay)
+            if self._prewarm and not self.is_connected:
+                self.connect()
+        
+        self._prewarm_thread = threading.Thread(target=run, daemon=True)
+        self._prewarm_thread.start()
+    
+    def _await_prewarm(self, deadline=None):
+        """等待进行中的预热完成，推迟中的预热立即开始"""
+        thread = self._prewarm_thread
+        if thread is not None and thread is not threading.current_thread():
+            self._prewarm_wake.set()
+            thread.join(deadline.remaining() if deadline is not None else None)
+    
+    def connect(self, timeout=15.0, deadline=None):
         """创建WebSocket连接
         
+        Args:
+            timeout: 等待服务端确认会话的最长时间(秒)
+            deadline: Deadline令牌，等待不超过剩余时间，被取消时立即返回
+        
         Returns:
             成功连接返回True，否则返回False
         """
+        connect_start = time.perf_counter()
+        # 先解除旧连接，服务端关闭旧会话时的回调不会唤醒本次握手等待
+        self.ws = None
+        self._handshake.clear()
+        self._release_credential()
+        if self.credentials is not None:
+            self.credential = self.credentials.acquire()
         try:
             # 生成WebSocket URL和头信息
-            url, headers = self._generate_ws_url()
+            url, headers = self._generate_ws_url(self.credential)
             
             # 创建WebSocket连接
             websocket.enableTrace(self.debug_mode)
             
-            # SSL选项 - 禁用证书验证以解决可能的SSL问题
-            ssl_options = {"cert_reqs": ssl.CERT_NONE}
+            # 建立TLS连接，禁用证书验证以解决可能的SSL问题
+            if deadline is not None:
+                remaining = deadline.remaining()
+                if remaining is not None:
+                    timeout = min(timeout, remaining)
+            start_time = time.monotonic()
+            sock = self._open_socket(timeout)
+            timeout = max(0.0, timeout - (time.monotonic() - start_time))
             
             self.ws = websocket.WebSocketApp(
                 url,
@@ -229,25 +369,34 @@ class VivoSpeechAPI:
                 on_open=self._on_open,
                 on_message=self._on_message,
                 on_error=self._on_error,
-                on_close=self._on_close
+                on_close=self._on_close,
+                socket=sock
             )
             
-            # 启动WebSocket连接线程，传入SSL选项
+            # 启动WebSocket连接线程
             self.ws_thread = threading.Thread(
-                target=lambda: self.ws.run_forever(sslopt=ssl_options)
+                target=self.ws.run_forever
             )
             self.ws_thread.daemon = True
             self.ws_thread.start()
             
-            # 等待连接建立
-            start_time = time.time()
-            while not self.is_connected and time.time() - start_time < 15.0:  # 增加等待时间到15秒
-                time.sleep(0.1)
-                if self.debug_mode and (time.time() - start_time) % 2 < 0.1:
-                    print(f"等待连接... {int(time.time() - start_time)}秒")
+            # 等待服务端确认会话，连接出错或关闭时提前返回
+            if deadline is not None:
+                remove = deadline.on_cancel(self._handshake.set)
+            else:
+                remove = None
+            try:
+                self._handshake.wait(timeout)
+            finally:
+                if remove is not None:
+                    remove()
             
             # 检查是否成功连接
             if not self.is_connected:
+                if self.ws is not None:
+                    self.ws.close()
+                self.metrics.inc("vivo_ws_connect_failures_total", host=self._endpoint()[1])
+                self._release_credential(dropped=True)
                 if self.debug_mode:
                     print("连接超时 - 可能原因：")
                     print("1. 网络连接问题")
@@ -256,9 +405,12 @@ class VivoSpeechAPI:
                     print("4. SSL/证书问题")
                 return False
             
+            # 握手加上服务端确认会话的耗时
+            self.metrics.observe("vivo_ws_connect_seconds", time.perf_counter() - connect_start, host=self._endpoint()[1])
             return True
         
         except Exception as e:
+            self._release_credential(dropped=True)
             if self.debug_mode:
                 print(f"创建连接失败: {str(e)}")
                 print(f"异常类型: {type(e).__name__}")
@@ -274,7 +426,10 @@ class VivoSpeechAPI:
             return False
     
     def disconnect(self):
-        """断开WebSocket连接"""
+        """断开WebSocket连接，同时停止预热"""
+        self._prewarm = False
+        self._await_prewarm()
+        self._release_credential()
         if self.ws and self.is_connected:
             try:
                 # 发送关闭命令
@@ -358,19 +513,74 @@ class VivoSpeechAPI:
         except queue.Empty:
             return {"error": "获取结果超时"}
     
-    def record_and_recognize(self, duration=5, sample_rate=16000, chunk_size=1024):
+    def _wait_for_result(self, tracker, deadline=None):
+        """等待识别结果
+        
+        Args:
+            tracker: 本次识别的RequestMetrics，记录首个结果时间和从结束发送到最终结果的耗时
+            deadline: Deadline令牌，被取消时立即停止等待
+            
+        Returns:
+            识别文本，如果失败则返回错误信息
+        """
+        result_text = ""
+        start_time = time.time()
+        finalize_start = time.perf_counter()
+        # 被取消时放入标记，唤醒阻塞在队列上的等待
+        remove = None
+        if deadline is not None:
+            remove = deadline.on_cancel(lambda: self.result_queue.put({"cancelled": True}))
+        
+        try:
+            while time.time() - start_time < 10.0:  # 最多等待10秒
+                timeout = 1.0
+                if deadline is not None:
+                    if deadline.expired():
+                        tracker.finish(api_code="cancelled" if deadline.cancelled else "timeout")
+                        return "识别已取消" if deadline.cancelled else "识别超时"
+                    remaining = deadline.remaining()
+                    if remaining is not None:
+                        timeout = min(timeout, remaining)
+                result = self.get_result(timeout=timeout)
+                
+                if "cancelled" in result:
+                    continue
+                
+                if "text" in result:
+                    tracker.token()
+                    result_text = result["text"]
+                    if result.get("is_last", False) or result.get("is_finish", False):
+                        break
+                
+                if "error" in result:
+                    tracker.finish(api_code=result.get("code") or "error")
+                    return f"识别出错: {result['error']}"
+                
+                if "closed" in result:
+                    break
+        finally:
+            if remove is not None:
+                remove()
+        
+        self.metrics.observe("vivo_asr_finalize_seconds", time.perf_counter() - finalize_start)
+        tracker.finish()
+        return result_text
+    
+    def record_and_recognize(self, duration=5, sample_rate=16000, chunk_size=1024, deadline=None):
         """录音并识别
         
         Args:
             duration: 录音时长，单位秒
             sample_rate: 采样率，服务要求16k
             chunk_size: 每次读取的音频数据大小
+            deadline: Deadline令牌，被取消时停止录音和等待结果
             
         Returns:
             识别文本，如果失败则返回错误信息
         """
-        # 检查是否已连接
-        if not self.is_connected and not self.connect():
+        # 检查是否已连接，预热进行中时等待其完成
+        self._await_prewarm(deadline)
+        if not self.is_connected and not self.connect(deadline=deadline):
             return "连接语音识别服务失败"
         
         # 录音并发送
@@ -379,6 +589,7 @@ class VivoSpeechAPI:
             while not self.result_queue.empty():
                 self.result_queue.get_nowait()
             
+            tracker = RequestMetrics(self.metrics, "asr_record")
             p = pyaudio.PyAudio()
             
             # 打开音频流
@@ -390,18 +601,23 @@ class VivoSpeechAPI:
                 frames_per_buffer=chunk_size
             )
             
-            print("开始录音...")
+            if self.debug_mode:
+                print("开始录音...")
             
             # 录音
             frames = []
             for i in range(0, int(sample_rate / chunk_size * duration)):
+                if deadline is not None and deadline.cancelled:
+                    break
                 data = stream.read(chunk_size)
                 frames.append(data)
                 
                 # 发送音频数据
                 self.send_audio_data(data)
+                tracker.add_bytes(len(data))
             
-            print("录音结束，正在处理...")
+            if self.debug_mode:
+                print("录音结束，正在处理...")
             
             # 停止录音
             stream.stop_stream()
@@ -412,24 +628,7 @@ class VivoSpeechAPI:
             self.end_audio()
             
             # 等待识别结果
-            result_text = ""
-            start_time = time.time()
-            
-            while time.time() - start_time < 10.0:  # 最多等待10秒
-                result = self.get_result(timeout=1.0)
-                
-                if "text" in result:
-                    result_text = result["text"]
-                    if result.get("is_last", False) or result.get("is_finish", False):
-                        break
-                
-                if "error" in result:
-                    return f"识别出错: {result['error']}"
-                
-                if "closed" in result:
-                    break
-            
-            return result_text
+            return self._wait_for_result(tracker, deadline)
         
         except Exception as e:
             return f"录音或识别过程出错: {str(e)}"
@@ -437,12 +636,13 @@ class VivoSpeechAPI:
             # 结束音频发送
             self.end_audio()
     
-    def recognize_wav_file(self, file_path, chunk_size=1024):
+    def recognize_wav_file(self, file_path, chunk_size=1024, deadline=None):
         """识别WAV文件
         
         Args:
             file_path: WAV文件路径
             chunk_size: 每次读取的音频数据大小
+            deadline: Deadline令牌，被取消时停止等待结果
             
         Returns:
             识别文本，如果失败则返回错误信息
@@ -455,8 +655,9 @@ class VivoSpeechAPI:
         if not file_path.lower().endswith(".wav"):
             return f"不支持的文件格式，仅支持WAV: {file_path}"
         
-        # 检查是否已连接
-        if not self.is_connected and not self.connect():
+        # 检查是否已连接，预热进行中时等待其完成
+        self._await_prewarm(deadline)
+        if not self.is_connected and not self.connect(deadline=deadline):
             return "连接语音识别服务失败"
         
         # 读取并发送WAV文件
@@ -465,6 +666,8 @@ class VivoSpeechAPI:
             while not self.result_queue.empty():
                 self.result_queue.get_nowait()
             
+            tracker = RequestMetrics(self.metrics, "asr_file")
+            
             # 读取WAV文件
             wf = wave.open(file_path, 'rb')
             
@@ -476,6 +679,7 @@ class VivoSpeechAPI:
             data = wf.readframes(chunk_size)
             while data:
                 self.send_audio_data(data)
+                tracker.add_bytes(len(data))
                 data = wf.readframes(chunk_size)
             
             wf.close()
@@ -484,24 +688,7 @@ class VivoSpeechAPI:
             self.end_audio()
             
             # 等待识别结果
-            result_text = ""
-            start_time = time.time()
-            
-            while time.time() - start_time < 10.0:  # 最多等待10秒
-                result = self.get_result(timeout=1.0)
-                
-                if "text" in result:
-                    result_text = result["text"]
-                    if result.get("is_last", False) or result.get("is_finish", False):
-                        break
-                
-                if "error" in result:
-                    return f"识别出错: {result['error']}"
-                
-                if "closed" in result:
-                    break
-            
-            return result_text
+            return self._wait_for_result(tracker, deadline)
         
         except Exception as e:
             return f"文件识别过程出错: {str(e)}"
@@ -533,7 +720,8 @@ class VivoSpeechAPI:
                 frames_per_buffer=chunk_size
             )
             
-            print("开始录音...")
+            if self.debug_mode:
+                print("开始录音...")
             
             # 录音
             frames = []
@@ -541,7 +729,8 @@ class VivoSpeechAPI:
                 data = stream.read(chunk_size)
                 frames.append(data)
             
-            print("录音结束...")
+            if self.debug_mode:
+                print("录音结束...")
             
             # 停止录音
             stream.stop_stream()
@@ -1,27 +1,39 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 import json
 import uuid
 import time
 import os
 import base64
 from auth_utils import gen_sign_headers, gen_canonical_query_string
+from http_transport import get_default_transport, response_json
+from sse_parser import iter_stream_events, DELTA, ANTISPAM, ERROR, CLOSE
+from metrics import get_default_registry, RequestMetrics, timed_sign
+from chat_history import estimate_tokens
+from credential_pool import signing_key
+from vivogpt_api import DEFAULT_BASE_URL
 
 class VivoVisionAPI:
     """蓝心大模型图片分析API客户端"""
     
-    def __init__(self, app_id, app_key):
+    def __init__(self, app_id, app_key, transport=None, metrics=None, credentials=None, base_url=None):
         """初始化API客户端
         
         Args:
             app_id: 应用ID
             app_key: 应用密钥
+            transport: 共享的HttpTransport，未提供时使用进程内默认连接池
+            metrics: MetricsRegistry指标注册表，未提供时使用进程内默认注册表
+            credentials: CredentialPool凭据池，提供时每次请求从池中选择凭据签名
+            base_url: 服务地址，未提供时使用官方地址，可指向本地模拟网关
         """
         self.app_id = app_id
         self.app_key = app_key
-        self.base_url = "https://api-ai.vivo.com.cn"
+        self.transport = transport or get_default_transport()
+        self.metrics = metrics or get_default_registry()
+        self.credentials = credentials
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
         self.debug_mode = False
         self.model = "BlueLM-Vision-prd"  # 默认模型
     
@@ -40,29 +52,39 @@ class VivoVisionAPI:
         else:
             print(f"不支持的模型: {model}，使用默认模型 BlueLM-Vision-prd")
     
-    def analyze_image(self, image_path, prompt, stream=False):
-        """分析图片
+    def _prepare_request(self, image_path, prompt, stream):
+        """构建图片分析请求的URL、鉴权头和请求体
         
         Args:
             image_path: 图片路径
-            prompt: 分析提示，例如"描述图片的内容"
+            prompt: 分析提示
             stream: 是否使用流式输出
             
         Returns:
-            分析结果响应
+            (url_with_params, headers, data) 元组
+        """
+        return self._sign_request(self._build_messages(image_path, prompt), stream)
+    
+    def _build_messages(self, image_path, prompt):
+        """读取并编码图片，构建消息内容
+        
+        Args:
+            image_path: 图片路径
+            prompt: 分析提示
+            
+        Returns:
+            消息列表
         """
         # 读取并编码图片
+        encode_start = time.perf_counter()
         with open(image_path, "rb") as f:
             image_data = f.read()
         
         image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
-        # 生成请求ID和会话ID
-        request_id = str(uuid.uuid4())
-        session_id = str(uuid.uuid4())
+        self.metrics.observe("vivo_image_encode_seconds", time.perf_counter() - encode_start)
         
         # 构建消息内容
-        messages = [
+        return [
             {
                 "role": "user",
                 "content": f"data:image/JPEG;base64,{image_base64}",
@@ -74,6 +96,21 @@ class VivoVisionAPI:
                 "contentType": "text"
             }
         ]
+    
+    def _sign_request(self, messages, stream, credential=None):
+        """生成请求ID并签名，重试时重新调用，不必重新编码图片
+        
+        Args:
+            messages: _build_messages 构建的消息列表
+            stream: 是否使用流式输出
+            credential: 凭据池中选出的凭据，None表示使用客户端自己的凭据
+            
+        Returns:
+            (url_with_params, headers, data) 元组
+        """
+        # 生成请求ID和会话ID
+        request_id = str(uuid.uuid4())
+        session_id = str(uuid.uuid4())
         
         # 构建请求数据
         data = {
@@ -99,7 +136,8 @@ class VivoVisionAPI:
         url_with_params = f"{url}?{gen_canonical_query_string(query)}"
         
         # 生成请求头
-        headers = gen_sign_headers(self.app_id, self.app_key, "POST", uri, query)
+        app_id, app_key = signing_key(credential, self)
+        headers = timed_sign(self.metrics, "vision", gen_sign_headers, app_id, app_key, "POST", uri, query)
         headers["Content-Type"] = "application/json"
         
         # 调试输出
@@ -112,57 +150,93 @@ class VivoVisionAPI:
             print(f"请求ID: {request_id}")
             print(f"会话ID: {session_id}")
         
+        return url_with_params, headers, data
+    
+    def analyze_image(self, image_path, prompt, stream=False, deadline=None):
+        """分析图片
+        
+        Args:
+            image_path: 图片路径
+            prompt: 分析提示，例如"描述图片的内容"
+            stream: 是否使用流式输出
+            deadline: Deadline令牌，限制含重试和流式读取在内的总耗时，可随时取消
+            
+        Returns:
+            分析结果响应
+        """
+        messages = self._build_messages(image_path, prompt)
+        
         # 发送请求
         start_time = time.time()
         
         if stream:
-            return self._process_stream_request(url_with_params, headers, data, start_time)
+            return self._process_stream_request(messages, start_time, deadline)
         else:
-            return self._process_sync_request(url_with_params, headers, data, start_time)
+            return self._process_sync_request(messages, start_time, deadline)
     
-    def _process_sync_request(self, url, headers, data, start_time):
+    def _send(self, endpoint, messages, stream, deadline=None):
+        """按重试策略发送请求，每次尝试都重新签名
+        
+        Returns:
+            流式请求返回响应对象，request_metrics 属性为记录指标的 RequestMetrics；
+            否则返回响应字典，指标已记录
+        """
+        def run(run_deadline):
+            # 对冲时每次运行使用各自的 Deadline 和指标记录，落后的一方被取消后单独结束
+            tracker = RequestMetrics(self.metrics, endpoint)
+            
+            def attempt(credential):
+                url, headers, data = self._sign_request(messages, stream, credential)
+                response = tracker.send(self.transport.post, url, headers=headers, json=data,
+                                        stream=stream, deadline=run_deadline)
+                return response if stream else response_json(response)
+            
+            result = self.transport.retry_policy.call(endpoint, attempt, tracker, credentials=self.credentials,
+                                                      deadline=run_deadline)
+            if stream:
+                result.request_metrics = tracker
+                return result
+            return tracker.finish_result(result, tokens=True)
+        
+        hedge = self.transport.hedge_policy
+        return run(deadline) if stream or hedge is None else hedge.call(endpoint, run, deadline)
+    
+    def _process_sync_request(self, messages, start_time, deadline=None):
         """处理同步请求
         
         Args:
-            url: 请求URL
-            headers: 请求头
-            data: 请求数据
+            messages: 消息列表
             start_time: 开始时间
+            deadline: Deadline令牌
             
         Returns:
             (response_data, time_cost) 元组
         """
-        response = requests.post(url, headers=headers, json=data)
+        result = self._send("vision", messages, False, deadline)
         end_time = time.time()
         time_cost = end_time - start_time
         
         if self.debug_mode:
             print(f"请求耗时: {time_cost:.2f}秒")
         
-        if response.status_code == 200:
-            return response.json(), time_cost
-        else:
-            error_msg = {
-                "code": response.status_code,
-                "msg": response.text
-            }
-            return error_msg, time_cost
+        return result, time_cost
     
-    def _process_stream_request(self, url, headers, data, start_time):
+    def _process_stream_request(self, messages, start_time, deadline=None):
         """处理流式请求
         
         Args:
-            url: 请求URL
-            headers: 请求头
-            data: 请求数据
+            messages: 消息列表
             start_time: 开始时间
+            deadline: Deadline令牌，每个事件之前检查
             
         Returns:
             生成器，产生流式响应的消息
         """
-        response = requests.post(url, headers=headers, json=data, stream=True)
+        response = self._send("vision_stream", messages, True, deadline)
+        tracker = response.request_metrics
         
         if response.status_code != 200:
+            tracker.finish()
             error_msg = {
                 "code": response.status_code,
                 "msg": response.text
@@ -170,72 +244,95 @@ class VivoVisionAPI:
             yield error_msg
             return
         
-        first_chunk = True
-        for line in response.iter_lines():
-            if line:
-                line_text = line.decode('utf-8', errors='ignore')
-                
+        api_code = None
+        try:
+            first_chunk = True
+            for event in iter_stream_events(response.iter_content(chunk_size=None)):
+                if deadline is not None:
+                    deadline.check()
                 if first_chunk:
                     first_chunk = False
-                    first_time = time.time()
-                    first_time_cost = first_time - start_time
+                    first_time_cost = time.time() - start_time
                     
                     if self.debug_mode:
                         print(f"首个响应耗时: {first_time_cost:.2f}秒")
                 
-                # 处理事件行
-                if line_text.startswith("event:"):
-                    event_type = line_text.replace("event:", "").strip()
-                    yield {"event": event_type}
-                
-                # 处理数据行
-                elif line_text.startswith("data:"):
-                    data_text = line_text.replace("data:", "").strip()
-                    
-                    if data_text == "[DONE]":
-                        end_time = time.time()
-                        time_cost = end_time - start_time
-                        
-                        if self.debug_mode:
-                            print(f"总请求耗时: {time_cost:.2f}秒")
-                        
-                        yield {"done": True, "time_cost": time_cost}
-                    else:
-                        try:
-                            data_json = json.loads(data_text)
-                            yield {"data": data_json}
-                        except json.JSONDecodeError:
-                            yield {"error": "JSON解析错误", "raw": data_text}
+                if event.type == DELTA and event.text:
+                    tracker.token(estimate_tokens(event.text))
+                elif event.type == ERROR:
+                    api_code = (event.data or {}).get("code", "error")
+                yield self._stream_message(event, start_time)
+        except Exception:
+            # 取消时连接已被关闭，读取报出的错误换成取消或超时异常
+            if deadline is not None:
+                deadline.check()
+            raise
+        finally:
+            # 提前中断迭代时也要释放连接
+            response.close()
+            tracker.finish(api_code=api_code)
     
-    def analyze_image_sync(self, image_path, prompt):
-        """同步方式分析图片
+    def _stream_message(self, event, start_time):
+        """把类型化流式事件转换为消息字典
         
         Args:
-            image_path: 图片路径
-            prompt: 分析提示，例如"描述图片的内容"
+            event: sse_parser.StreamEvent
+            start_time: 请求开始时间
             
         Returns:
-            分析结果文本
+            消息字典
         """
-        response, _ = self.analyze_image(image_path, prompt, stream=False)
+        if event.type == DELTA:
+            return {"data": event.data}
+        
+        if event.type == CLOSE:
+            time_cost = time.time() - start_time
+            
+            if self.debug_mode:
+                print(f"总请求耗时: {time_cost:.2f}秒")
+            
+            return {"done": True, "time_cost": time_cost}
         
+        if event.type in (ERROR, ANTISPAM):
+            return {"event": event.type, "data": event.data}
+        
+        return {"error": "JSON解析错误", "raw": event.data}
+    
+    @staticmethod
+    def _extract_text(response):
+        """从同步分析响应中提取结果文本"""
         if response.get("code") == 0 and "data" in response:
             return response["data"].get("content", "")
         else:
             error_msg = response.get("msg", "未知错误")
             return f"图片分析失败: {error_msg}"
     
-    def analyze_image_stream(self, image_path, prompt):
+    def analyze_image_sync(self, image_path, prompt, deadline=None):
+        """同步方式分析图片
+        
+        Args:
+            image_path: 图片路径
+            prompt: 分析提示，例如"描述图片的内容"
+            deadline: Deadline令牌
+            
+        Returns:
+            分析结果文本
+        """
+        response, _ = self.analyze_image(image_path, prompt, stream=False, deadline=deadline)
+        return self._extract_text(response)
+    
+    def analyze_image_stream(self, image_path, prompt, deadline=None):
         """流式方式分析图片
         
         Args:
             image_path: 图片路径
             prompt: 分析提示，例如"描述图片的内容"
+            deadline: Deadline令牌
             
         Returns:
             生成器，产生分析结果的片段
         """
-        for chunk in self.analyze_image(image_path, prompt, stream=True):
+        for chunk in self.analyze_image(image_path, prompt, stream=True, deadline=deadline):
             if "data" in chunk and "message" in chunk["data"]:
                 yield chunk["data"]["message"]
             elif "done" in chunk: